@@ -139,6 +139,76 @@ def run_benchmark(iterations=50):
     print("\n--- Benchmark Complete ---")
     return keygen_results, encrypt_results, decrypt_results, plaintext_sizes
 
+def run_batch_encrypt_benchmark(item_counts=(100, 1000), policy_counts=(1, 10, 100), item_size=256):
+    print(f"\n--- /encrypt/batch vs /encrypt, items per second ({item_size}-byte items) ---")
+
+    plaintext_b64 = base64.b64encode(b"L" * item_size).decode("utf-8")
+    results = {}
+    for num_items in item_counts:
+        for num_policies in policy_counts:
+            # Land assets of num_policies owners, each owner's assets under the same policy
+            items = [{"policy": f"(owner{i % num_policies} and registry) or admin", "plaintext": plaintext_b64}
+                     for i in range(num_items)]
+
+            start_time = time.perf_counter()
+            for item in items:
+                requests.post(f"{BASE_URL}/encrypt", json=item)
+            single_rate = num_items / (time.perf_counter() - start_time)
+
+            start_time = time.perf_counter()
+            r = requests.post(f"{BASE_URL}/encrypt/batch", json={"items": items})
+            batch_ok = sum(item["status"] == "success" for item in r.json()["results"])
+            batch_rate = num_items / (time.perf_counter() - start_time)
+
+            ndjson_body = "\n".join(json.dumps(item) for item in items) + "\n"
+            start_time = time.perf_counter()
+            r = requests.post(f"{BASE_URL}/encrypt/batch", data=ndjson_body,
+                              headers={"Content-Type": "application/x-ndjson"}, stream=True)
+            ndjson_ok = sum(json.loads(line)["status"] == "success" for line in r.iter_lines() if line)
+            ndjson_rate = num_items / (time.perf_counter() - start_time)
+
+            results[(num_items, num_policies)] = {"single": single_rate, "batch": batch_rate, "ndjson": ndjson_rate}
+            print(f"  {num_items} items, {num_policies} policies: /encrypt {single_rate:.1f} items/s, "
+                  f"batch {batch_rate:.1f} items/s ({batch_rate / single_rate:.1f}x, {batch_ok} ok), "
+                  f"NDJSON batch {ndjson_rate:.1f} items/s ({ndjson_ok} ok)")
+
+    return results
+
+def run_batch_decrypt_benchmark(record_counts=(50, 200), item_size=256):
+    print(f"\n--- /decrypt/batch vs /decrypt, records per second ({item_size}-byte records) ---")
+
+    key_data = requests.post(f"{BASE_URL}/keygen", json={"attributes": ["owner0", "registry"]}).json()["key_data"]
+    plaintext_b64 = base64.b64encode(b"R" * item_size).decode("utf-8")
+    results = {}
+    for num_records in record_counts:
+        # A listing page: records of four owners, one in four of them readable with this key
+        items = [{"policy": f"(owner{i % 4} and registry) or admin", "plaintext": plaintext_b64}
+                 for i in range(num_records)]
+        # Records encrypted one by one carry a header each; /encrypt/batch records share one per owner
+        listings = {
+            "own headers": [requests.post(f"{BASE_URL}/encrypt", json=item).json()["encrypted_data"]
+                            for item in items],
+            "shared headers": [item["encrypted_data"] for item in
+                               requests.post(f"{BASE_URL}/encrypt/batch", json={"items": items}).json()["results"]],
+        }
+
+        for label, envelopes in listings.items():
+            start_time = time.perf_counter()
+            for envelope in envelopes:
+                requests.post(f"{BASE_URL}/decrypt", json={"secret_key": key_data, "encrypted_data": envelope})
+            single_rate = num_records / (time.perf_counter() - start_time)
+
+            start_time = time.perf_counter()
+            r = requests.post(f"{BASE_URL}/decrypt/batch", json={"secret_key": key_data, "items": envelopes})
+            decrypted = sum(item.get("decrypted", False) for item in r.json()["results"])
+            batch_rate = num_records / (time.perf_counter() - start_time)
+
+            results[(num_records, label)] = {"single": single_rate, "batch": batch_rate}
+            print(f"  {num_records} records, {label}: /decrypt {single_rate:.1f} records/s, "
+                  f"batch {batch_rate:.1f} records/s ({batch_rate / single_rate:.1f}x, {decrypted} decrypted)")
+
+    return results
+
 # --- Plotting ---
 def plot_benchmarks(keygen_data, encrypt_data, decrypt_data, plaintext_sizes):
     if not os.path.exists(PLOTS_DIR):
@@ -251,3 +321,5 @@ if __name__ == "__main__":
 
     keygen_data, encrypt_data, decrypt_data, plaintext_sizes = run_benchmark(iterations=50)
     plot_benchmarks(keygen_data, encrypt_data, decrypt_data, plaintext_sizes)
+    run_batch_encrypt_benchmark()
+    run_batch_decrypt_benchmark()
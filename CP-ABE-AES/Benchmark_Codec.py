@@ -0,0 +1,100 @@
+import base64
+import json
+import time
+import statistics
+
+from cpabe_schemes import CPABEScheme, SchemaCodec, LazyElementMap
+
+cpabe_instance = CPABEScheme()
+cpabe_instance.setup()
+
+# --- Fixtures ---
+def make_fixtures(num_attrs=100, num_leaves=50):
+    attributes = [f"attr{i}" for i in range(num_attrs)]
+    key_data = cpabe_instance.keygen(attributes)
+    policy = ' and '.join(attributes[:num_leaves])
+    encrypted_data = cpabe_instance.encrypt_data(policy, b"A" * 1024)
+    header = json.loads(base64.b64decode(encrypted_data["cpabe_cipher"]))
+    return key_data["secret_key"], header
+
+# --- Legacy codec paths (trial-and-error per value) ---
+def legacy_decode(serialized):
+    decoded = {}
+    for key, value in serialized.items():
+        if isinstance(value, dict):
+            decoded[key] = {k: cpabe_instance.deserialize_element(v) for k, v in value.items()}
+        else:
+            decoded[key] = cpabe_instance.deserialize_element(value)
+    return decoded
+
+def legacy_encode(components):
+    encoded = {}
+    for key, value in components.items():
+        if isinstance(value, dict):
+            encoded[key] = {k: cpabe_instance.serialize_element(v) for k, v in value.items()}
+        else:
+            encoded[key] = cpabe_instance.serialize_element(value)
+    return encoded
+
+# --- Schema codec paths ---
+def schema_decode(schema, serialized):
+    decoded = cpabe_instance.codec.decode(schema, serialized)
+    # Touch every lazily decoded entry so both paths do the same work
+    return {key: dict(value) if isinstance(value, LazyElementMap) else value for key, value in decoded.items()}
+
+def schema_encode(schema, components):
+    return cpabe_instance.codec.encode(schema, components)
+
+# --- Benchmarking Logic ---
+def time_codec(func, payload_bytes, iterations):
+    times = []
+    for _ in range(iterations):
+        start_time = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start_time)
+    mean = statistics.mean(times)
+    return {"mean": mean, "ops_per_sec": 1 / mean if mean else 0,
+            "mb_per_sec": payload_bytes / mean / (1024 * 1024) if mean else 0}
+
+def run_codec_benchmark(iterations=50):
+    print(f"\n--- Codec Throughput, 100-attribute Key / 50-leaf Header ({iterations} iterations) ---")
+
+    sk_serialized, header_serialized = make_fixtures()
+    sk = schema_decode(SchemaCodec.SECRET_KEY_SCHEMA, sk_serialized)
+    header = schema_decode(SchemaCodec.CIPHER_SCHEMA, header_serialized)
+
+    cases = {
+        "Secret key decode": (
+            len(json.dumps(sk_serialized)),
+            lambda: legacy_decode(sk_serialized),
+            lambda: schema_decode(SchemaCodec.SECRET_KEY_SCHEMA, sk_serialized)),
+        "Secret key encode": (
+            len(json.dumps(sk_serialized)),
+            lambda: legacy_encode(sk),
+            lambda: schema_encode(SchemaCodec.SECRET_KEY_SCHEMA, sk)),
+        "Header decode": (
+            len(json.dumps(header_serialized)),
+            lambda: legacy_decode(header_serialized),
+            lambda: schema_decode(SchemaCodec.CIPHER_SCHEMA, header_serialized)),
+        "Header encode": (
+            len(json.dumps(header_serialized)),
+            lambda: legacy_encode(header),
+            lambda: schema_encode(SchemaCodec.CIPHER_SCHEMA, header)),
+    }
+
+    results = {}
+    for label, (payload_bytes, legacy, schema) in cases.items():
+        results[label] = {
+            "legacy": time_codec(legacy, payload_bytes, iterations),
+            "schema": time_codec(schema, payload_bytes, iterations)
+        }
+        legacy_stats, schema_stats = results[label]["legacy"], results[label]["schema"]
+        speedup = legacy_stats["mean"] / schema_stats["mean"] if schema_stats["mean"] else 0
+        print(f"  {label} ({payload_bytes / 1024:.1f} KB): "
+              f"legacy {legacy_stats['mb_per_sec']:.2f} MB/s, schema {schema_stats['mb_per_sec']:.2f} MB/s "
+              f"({speedup:.2f}x)")
+
+    return results
+
+if __name__ == "__main__":
+    run_codec_benchmark(iterations=50)
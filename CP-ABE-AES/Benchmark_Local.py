@@ -4,8 +4,11 @@ import time
 import statistics
 import matplotlib.pyplot as plt
 import os
+import tracemalloc
+import tempfile
 
-from cpabe_schemes import CPABEScheme
+from cpabe_schemes import CPABEScheme, KEY_WRAPS, DATA_CIPHERS
+from Crypto.Cipher import AES
 
 cpabe_instance = CPABEScheme()
 cpabe_instance.setup()
@@ -73,6 +76,10 @@ def run_benchmark(iterations=50):
             keygen_results[num_attrs] = keygen_times
             print(f"  Keygen ({num_attrs} attrs, avg): {statistics.mean(keygen_times):.6f} seconds")
 
+    hash_stats = cpabe_instance.attribute_hash_cache_stats()
+    print(f"  Attribute hash cache: {hash_stats['hits']} hits, {hash_stats['misses']} misses "
+          f"(hit ratio {hash_stats['hit_ratio']:.2%})")
+
     comprehensive_key_data = test_keygen(all_possible_attributes)
     if not comprehensive_key_data:
         print("Failed to generate key for full attribute set.")
@@ -136,6 +143,520 @@ def run_benchmark(iterations=50):
     print("\n--- Benchmark Complete ---")
     return keygen_results, encrypt_results, decrypt_results, plaintext_sizes, ciphertext_sizes
 
+def run_precompute_comparison(iterations=20):
+    print(f"\n--- Fixed-base Precomputation Before/After ({iterations} iterations) ---")
+
+    # Both instances load the keys saved by cpabe_instance.setup()
+    baseline = CPABEScheme(precompute=False)
+    precomputed = CPABEScheme(precompute=True)
+    if not baseline.load_keys() or not precomputed.load_keys():
+        print("Failed to load keys for precomputation comparison.")
+        return {}
+
+    attributes = ["admin", "it", "dev", "hr", "finance", "support", "manager", "engineer", "designer", "qa"]
+    policy_str = '((admin and finance) or (it and support)) and manager and (qa or designer)'
+    plaintext_bytes = b"A" * 1024
+
+    cases = {
+        "Keygen (10 attrs)": lambda inst: inst.keygen(attributes),
+        "Encrypt (P3, 1KB)": lambda inst: inst.encrypt_data(policy_str, plaintext_bytes),
+    }
+
+    results = {}
+    for label, op in cases.items():
+        timings = {}
+        for name, inst in (("before", baseline), ("after", precomputed)):
+            times = []
+            for _ in range(iterations):
+                start_time = time.perf_counter()
+                op(inst)
+                times.append(time.perf_counter() - start_time)
+            timings[name] = statistics.mean(times)
+        results[label] = timings
+        speedup = timings["before"] / timings["after"] if timings["after"] else 0
+        print(f"  {label}: before {timings['before']:.6f}s, after {timings['after']:.6f}s ({speedup:.2f}x)")
+
+    return results
+
+def run_attribute_hash_comparison(iterations=20):
+    print(f"\n--- Attribute Hash Cache Cold/Warm Keygen ({iterations} iterations) ---")
+
+    attributes = [f"attr{i}" for i in range(100)]
+    results = {}
+    for num_attrs in [50, 100]:
+        current_attributes = attributes[:num_attrs]
+        timings = {}
+        for mode in ("cold", "warm"):
+            times = []
+            for _ in range(iterations):
+                if mode == "cold":
+                    cpabe_instance.attribute_hash_cache.clear()
+                start_time = time.perf_counter()
+                test_keygen(current_attributes)
+                times.append(time.perf_counter() - start_time)
+            timings[mode] = statistics.mean(times)
+        results[num_attrs] = timings
+        speedup = timings["cold"] / timings["warm"] if timings["warm"] else 0
+        print(f"  Keygen ({num_attrs} attrs): cold {timings['cold']:.6f}s, warm {timings['warm']:.6f}s ({speedup:.2f}x)")
+
+    return results
+
+def run_secret_key_cache_comparison(iterations=20):
+    print(f"\n--- Secret Key Cache, 100-attribute Key Decrypt ({iterations} iterations) ---")
+
+    uncached = CPABEScheme(secret_key_cache_size=0)
+    if not uncached.load_keys():
+        print("Failed to load keys for secret key cache comparison.")
+        return {}
+
+    key_data = test_keygen([f"attr{i}" for i in range(100)])
+    policy_str = '(attr0 and attr1) or attr99'
+    encrypted_data = test_encrypt(policy_str, b"A" * 1024)
+
+    timings = {}
+    for name, inst in (("uncached", uncached), ("cached", cpabe_instance)):
+        times = []
+        for _ in range(iterations):
+            start_time = time.perf_counter()
+            inst.decrypt_data(key_data, encrypted_data)
+            times.append(time.perf_counter() - start_time)
+        timings[name] = statistics.mean(times)
+
+    speedup = timings["uncached"] / timings["cached"] if timings["cached"] else 0
+    print(f"  Decrypt: uncached {timings['uncached']:.6f}s, cached {timings['cached']:.6f}s ({speedup:.2f}x)")
+    print(f"  Secret key cache: {cpabe_instance.secret_key_cache_stats()}")
+    return timings
+
+def run_pairing_benchmark(iterations=20):
+    print(f"\n--- Satisfying-set Selection, 100-attribute Key ({iterations} iterations) ---")
+
+    attributes = [f"attr{i}" for i in range(100)]
+    key_data = test_keygen(attributes)
+    sk = cpabe_instance.load_secret_key(key_data["secret_key"])
+    # Charm's decrypt prunes against the key's attribute list and type-checks for plain dicts
+    charm_sk = dict(sk, Dj=dict(sk['Dj']), Djp=dict(sk['Djp']), S=list(sk['Dj'].keys()))
+
+    policies = {
+        "P3 (Complex)": '((attr0 and attr1) or (attr2 and attr3)) and attr4 and (attr5 or attr6)',
+        "Wide OR (4-and | 1)": '(attr0 and attr1 and attr2 and attr3) or attr99',
+        "Wide OR (8 pairs | 1)": ' or '.join(f"(attr{2 * i} and attr{2 * i + 1})" for i in range(8)) + ' or attr99',
+        "Wide OR (16-and | 2-and)": '(' + ' and '.join(f"attr{i}" for i in range(16)) + ') or (attr98 and attr99)',
+    }
+
+    results = {}
+    for label, policy_str in policies.items():
+        encrypted_data = test_encrypt(policy_str, b"A" * 1024)
+        header = json.loads(base64.b64decode(encrypted_data["cpabe_cipher"]))
+        ct = cpabe_instance.deserialize_cpabe_cipher(header)
+        charm_ct = dict(ct, Cy=dict(ct['Cy']), Cyp=dict(ct['Cyp']))
+        compiled_policy = cpabe_instance.compile_header_policy(ct['policy'])
+
+        charm_leaves = cpabe_instance.util.prune(compiled_policy.tree, charm_sk['S'])
+        selected_leaves = cpabe_instance.select_decryption_leaves(compiled_policy, sk['Dj'])
+
+        timings = {}
+        for name, decrypt in (("charm", lambda: cpabe_instance.cpabe.decrypt(cpabe_instance.public_key, charm_sk, charm_ct)),
+                              ("selected", lambda: cpabe_instance._bsw07_decrypt(sk, ct))):
+            times = []
+            for _ in range(iterations):
+                start_time = time.perf_counter()
+                decrypt()
+                times.append(time.perf_counter() - start_time)
+            timings[name] = statistics.mean(times)
+
+        # Each leaf costs two pairings, plus e(C, D)
+        results[label] = {
+            "charm_pairings": 2 * len(charm_leaves) + 1,
+            "selected_pairings": 2 * len(selected_leaves) + 1,
+            **timings
+        }
+        print(f"  {label}: pairings {results[label]['charm_pairings']} -> {results[label]['selected_pairings']}, "
+              f"latency {timings['charm']:.6f}s -> {timings['selected']:.6f}s")
+
+    return results
+
+def run_lazy_deserialization_benchmark(iterations=20):
+    print(f"\n--- Lazy Deserialization, 60-leaf Policy / 100-attribute Key ({iterations} iterations) ---")
+
+    uncached = CPABEScheme(secret_key_cache_size=0)
+    if not uncached.load_keys():
+        print("Failed to load keys for lazy deserialization benchmark.")
+        return {}
+
+    key_data = test_keygen([f"attr{i}" for i in range(100)])
+    sk_components = key_data["secret_key"]
+    policy_str = ' or '.join(f"(attr{2 * i} and attr{2 * i + 1})" for i in range(30))
+    encrypted_data = test_encrypt(policy_str, b"A" * 1024)
+    header = json.loads(base64.b64decode(encrypted_data["cpabe_cipher"]))
+
+    def decrypt(eager):
+        sk = uncached.load_secret_key(sk_components)
+        ct = uncached.deserialize_cpabe_cipher(header)
+        if eager:
+            # Touch every per-leaf component, as the old eager deserialization did
+            for components in (sk['Dj'], sk['Djp'], ct['Cy'], ct['Cyp']):
+                for name in components:
+                    components[name]
+        uncached._bsw07_decrypt(sk, ct)
+        return sk, ct
+
+    results = {}
+    for mode in ("eager", "lazy"):
+        eager = mode == "eager"
+        times = []
+        for _ in range(iterations):
+            start_time = time.perf_counter()
+            decrypt(eager)
+            times.append(time.perf_counter() - start_time)
+
+        tracemalloc.start()
+        sk, ct = decrypt(eager)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        decoded = sum(m.decoded_count() for m in (sk['Dj'], sk['Djp'], ct['Cy'], ct['Cyp']))
+        total = sum(len(m) for m in (sk['Dj'], sk['Djp'], ct['Cy'], ct['Cyp']))
+        results[mode] = {"time": statistics.mean(times), "peak_bytes": peak, "decoded": decoded}
+        print(f"  {mode}: {results[mode]['time']:.6f}s, peak {peak / 1024:.1f} KiB, "
+              f"{decoded}/{total} per-leaf elements decoded")
+
+    return results
+
+def run_pairing_product_sweep(iterations=20, leaf_counts=(1, 5, 10, 25, 50)):
+    print(f"\n--- Pairing Product Decrypt, Leaf Count Sweep ({iterations} iterations) ---")
+
+    separate = CPABEScheme(pairing_product=False)
+    if not separate.load_keys():
+        print("Failed to load keys for pairing product sweep.")
+        return {}
+
+    key_data = test_keygen([f"attr{i}" for i in range(100)])
+    results = {}
+    for leaf_count in leaf_counts:
+        policy_str = ' and '.join(f"attr{i}" for i in range(leaf_count))
+        encrypted_data = test_encrypt(policy_str, b"A" * 1024)
+        timings = {}
+        for name, inst in (("separate", separate), ("product", cpabe_instance)):
+            inst.decrypt_data(key_data, encrypted_data)  # warm the key and policy caches
+            times = []
+            for _ in range(iterations):
+                start_time = time.perf_counter()
+                inst.decrypt_data(key_data, encrypted_data)
+                times.append(time.perf_counter() - start_time)
+            timings[name] = statistics.mean(times)
+        results[leaf_count] = timings
+        speedup = timings["separate"] / timings["product"] if timings["product"] else 0
+        print(f"  {leaf_count} leaves: separate {timings['separate']:.6f}s, "
+              f"product {timings['product']:.6f}s ({speedup:.2f}x)")
+
+    return results
+
+def run_encryption_pool_benchmark(burst_size=50, pool_size=64):
+    print(f"\n--- Online/Offline Encryption, Burst of {burst_size} ---")
+
+    pooled = CPABEScheme(encryption_pool_size=pool_size)
+    if not pooled.load_keys():
+        print("Failed to load keys for encryption pool benchmark.")
+        return {}
+    # Let the background worker fill the pool before the burst arrives
+    deadline = time.time() + 10
+    while pooled.encryption_pool_stats()["depth"] < pooled.encryption_pool.target and time.time() < deadline:
+        time.sleep(0.05)
+
+    policy_str = '((attr0 and attr1) or (attr2 and attr3)) and attr4 and (attr5 or attr6)'
+    data = b"A" * 1024
+    results = {}
+    for name, inst in (("inline", cpabe_instance), ("pooled", pooled)):
+        times = []
+        for _ in range(burst_size):
+            start_time = time.perf_counter()
+            inst.encrypt_data(policy_str, data)
+            times.append(time.perf_counter() - start_time)
+        times.sort()
+        results[name] = {
+            "mean": statistics.mean(times),
+            "p99": times[min(len(times) - 1, int(len(times) * 0.99))]
+        }
+        print(f"  {name}: mean {results[name]['mean']:.6f}s, p99 {results[name]['p99']:.6f}s")
+
+    print(f"  Encryption pool: {pooled.encryption_pool_stats()}")
+    pooled.stop_encryption_pool()
+    return results
+
+def run_session_benchmark(batch_size=100):
+    print(f"\n--- Encapsulation Session, Batch of {batch_size} Payloads ---")
+
+    policy_str = '((attr0 and attr1) or (attr2 and attr3)) and attr4 and (attr5 or attr6)'
+    payloads = [os.urandom(1024) for _ in range(batch_size)]
+
+    start_time = time.perf_counter()
+    per_payload = [test_encrypt(policy_str, data) for data in payloads]
+    per_payload_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    with cpabe_instance.open_session(policy_str, max_messages=batch_size) as session:
+        batched = [session.encrypt(data) for data in payloads]
+    session_time = time.perf_counter() - start_time
+
+    # Decrypters cache the session root, so only the first payload pays for pairings
+    decrypter = CPABEScheme(session_key_cache_bytes=64 * 1024)
+    decrypter.load_keys()
+    key_data = test_keygen([f"attr{i}" for i in range(7)])
+    timings = {}
+    for name, envelopes in (("per-payload", per_payload), ("session", batched)):
+        start_time = time.perf_counter()
+        for envelope in envelopes:
+            decrypter.decrypt_data(key_data, envelope)
+        timings[name] = time.perf_counter() - start_time
+
+    print(f"  Encrypt: per-payload {per_payload_time:.4f}s, session {session_time:.4f}s")
+    print(f"  Decrypt: per-payload {timings['per-payload']:.4f}s, session {timings['session']:.4f}s")
+    return {
+        "encrypt": {"per-payload": per_payload_time, "session": session_time},
+        "decrypt": timings
+    }
+
+def run_multi_header_benchmark(data_size=1024 * 1024, policy_counts=(1, 2, 3, 5)):
+    print(f"\n--- Multi-header Envelope, {data_size // 1024} KB Payload ---")
+
+    all_policies = ['attr0 and attr1', 'attr2', 'attr3 and (attr4 or attr5)', 'attr6 or attr7', 'attr8 and attr9']
+    data = os.urandom(data_size)
+    results = {}
+    for count in policy_counts:
+        policies = all_policies[:count]
+
+        start_time = time.perf_counter()
+        copies = [test_encrypt(policy, data) for policy in policies]
+        copies_time = time.perf_counter() - start_time
+        copies_size = sum(len(json.dumps(envelope)) for envelope in copies)
+
+        start_time = time.perf_counter()
+        envelope = cpabe_instance.encrypt_data_multi(policies, data)
+        multi_time = time.perf_counter() - start_time
+        multi_size = len(json.dumps(envelope))
+
+        results[count] = {"copies_time": copies_time, "copies_size": copies_size,
+                          "multi_time": multi_time, "multi_size": multi_size}
+        print(f"  {count} policies: copies {copies_time:.4f}s / {copies_size / 1024:.0f} KB, "
+              f"multi-header {multi_time:.4f}s / {multi_size / 1024:.0f} KB")
+
+    return results
+
+def run_envelope_format_comparison(iterations=20):
+    print(f"\n--- Binary vs JSON Envelope ({iterations} iterations) ---")
+
+    policy_str = '((attr0 and attr1) or (attr2 and attr3)) and attr4 and (attr5 or attr6)'
+    key_data = test_keygen([f"attr{i}" for i in range(7)])
+    results = {}
+    for size_label, data_size in (("1KB", 1024), ("100KB", 100 * 1024), ("1MB", 1024 * 1024)):
+        data = os.urandom(data_size)
+        stats = {}
+        for fmt in ("json", "binary"):
+            binary = fmt == "binary"
+            encrypt_times, decrypt_times = [], []
+            for _ in range(iterations):
+                start_time = time.perf_counter()
+                envelope = cpabe_instance.encrypt_data(policy_str, data, binary=binary)
+                wire = envelope if binary else json.dumps(envelope).encode('utf-8')
+                encrypt_times.append(time.perf_counter() - start_time)
+
+                start_time = time.perf_counter()
+                received = wire if binary else json.loads(wire)
+                cpabe_instance.decrypt_data(key_data, received)
+                decrypt_times.append(time.perf_counter() - start_time)
+            stats[fmt] = {"size": len(wire), "encrypt": statistics.mean(encrypt_times),
+                          "decrypt": statistics.mean(decrypt_times)}
+        results[size_label] = stats
+
+        saved = 100 * (1 - stats["binary"]["size"] / stats["json"]["size"])
+        print(f"  {size_label}: size {stats['json']['size']} -> {stats['binary']['size']} bytes ({saved:.1f}% smaller), "
+              f"encrypt {stats['json']['encrypt']:.6f}s -> {stats['binary']['encrypt']:.6f}s, "
+              f"decrypt {stats['json']['decrypt']:.6f}s -> {stats['binary']['decrypt']:.6f}s")
+
+    return results
+
+def run_stream_benchmark(size_mb=32, chunk_size=64 * 1024):
+    print(f"\n--- Streaming Encryption, {size_mb} MB Object, {chunk_size // 1024} KB Chunks ---")
+
+    policy_str = '((attr0 and attr1) or (attr2 and attr3)) and attr4 and (attr5 or attr6)'
+    key_data = test_keygen([f"attr{i}" for i in range(7)])
+    block = os.urandom(chunk_size)
+    total = size_mb * 1024 * 1024
+
+    def source():
+        for _ in range(total // chunk_size):
+            yield block
+
+    with tempfile.TemporaryFile() as encrypted_file:
+        tracemalloc.start()
+        start_time = time.perf_counter()
+        for piece in cpabe_instance.encrypt_stream(policy_str, source(), chunk_size=chunk_size):
+            encrypted_file.write(piece)
+        encrypt_time = time.perf_counter() - start_time
+        _, encrypt_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        encrypted_file.seek(0)
+        tracemalloc.start()
+        start_time = time.perf_counter()
+        decrypted = 0
+        for chunk in cpabe_instance.decrypt_stream(key_data, encrypted_file):
+            decrypted += len(chunk)
+        decrypt_time = time.perf_counter() - start_time
+        _, decrypt_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    if decrypted != total:
+        print(f"  Stream round trip mismatch: {decrypted} of {total} bytes")
+    results = {"encrypt": encrypt_time, "decrypt": decrypt_time,
+               "encrypt_peak": encrypt_peak, "decrypt_peak": decrypt_peak}
+    print(f"  Encrypt: {size_mb / encrypt_time:.1f} MB/s, peak {encrypt_peak / 1024:.0f} KiB")
+    print(f"  Decrypt: {size_mb / decrypt_time:.1f} MB/s, peak {decrypt_peak / 1024:.0f} KiB")
+    return results
+
+def run_range_read_benchmark(object_sizes_mb=(4, 16, 64), range_sizes=(1024, 64 * 1024, 1024 * 1024),
+                             iterations=10, chunk_size=64 * 1024):
+    print(f"\n--- Range Reads from Seekable Streams, {chunk_size // 1024} KB Chunks ({iterations} iterations) ---")
+
+    policy_str = '((attr0 and attr1) or (attr2 and attr3)) and attr4 and (attr5 or attr6)'
+    key_data = test_keygen([f"attr{i}" for i in range(7)])
+    block = os.urandom(chunk_size)
+
+    results = {}
+    for size_mb in object_sizes_mb:
+        total = size_mb * 1024 * 1024
+        source = (block for _ in range(total // chunk_size))
+        with tempfile.TemporaryFile() as encrypted_file:
+            for piece in cpabe_instance.encrypt_stream(policy_str, source, chunk_size=chunk_size, seekable=True):
+                encrypted_file.write(piece)
+
+            results[size_mb] = {}
+            for range_size in range_sizes:
+                times = []
+                for i in range(iterations):
+                    # Spread offsets across the object so no read benefits from a warm page
+                    offset = (i * 7919 * chunk_size + 123) % max(total - range_size, 1)
+                    start_time = time.perf_counter()
+                    plaintext = cpabe_instance.decrypt_range(key_data, encrypted_file, offset, range_size)
+                    times.append(time.perf_counter() - start_time)
+                    if len(plaintext) != range_size:
+                        print(f"  Range read mismatch: {len(plaintext)} of {range_size} bytes")
+                results[size_mb][range_size] = statistics.mean(times)
+                print(f"  {size_mb} MB object, {range_size / 1024:.0f} KiB range: "
+                      f"{results[size_mb][range_size] * 1000:.3f} ms")
+
+    return results
+
+def run_record_log_benchmark(history_lengths=(10, 100, 1000), record_size=256):
+    print(f"\n--- Ownership History: Record Log Append vs Full Re-encryption, {record_size} B Records ---")
+
+    policy_str = '((attr0 and attr1) or (attr2 and attr3)) and attr4 and (attr5 or attr6)'
+    key_data = test_keygen([f"attr{i}" for i in range(7)])
+    record = os.urandom(record_size)
+
+    results = {}
+    for length in history_lengths:
+        history = record * length
+        start_time = time.perf_counter()
+        cpabe_instance.encrypt_data(policy_str, history + record)
+        reencrypt_time = time.perf_counter() - start_time
+
+        writer = cpabe_instance.open_log(policy_str)
+        log = bytearray(writer.header)
+        for _ in range(length):
+            log += writer.append(record)
+        _, offset = cpabe_instance.decrypt_log(key_data, log)
+        start_time = time.perf_counter()
+        log += writer.append(record)
+        append_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        tail, _ = cpabe_instance.decrypt_log(key_data, log, offset)
+        tail_time = time.perf_counter() - start_time
+        writer.close()
+        if len(tail) != 1 or tail[0][1] != record:
+            print(f"  Record log tail mismatch at {length} records")
+
+        results[length] = {"reencrypt": reencrypt_time, "append": append_time, "tail": tail_time}
+        print(f"  {length} records: re-encrypt {reencrypt_time * 1000:.3f} ms, "
+              f"append {append_time * 1000:.3f} ms, read tail {tail_time * 1000:.3f} ms")
+
+    return results
+
+def run_parallel_aead_benchmark(payload_sizes_mb=(1, 4, 16, 64), worker_counts=(1, 2, 4, 8, 16, 32), iterations=5):
+    print(f"\n--- Parallel Segmented AES-GCM Throughput, {os.cpu_count()} CPUs ({iterations} iterations) ---")
+
+    policy_str = '((attr0 and attr1) or (attr2 and attr3)) and attr4 and (attr5 or attr6)'
+    key_data = test_keygen([f"attr{i}" for i in range(7)])
+    aes_key = os.urandom(32)
+
+    results = {}
+    for size_mb in payload_sizes_mb:
+        payload = os.urandom(size_mb * 1024 * 1024)
+        # Baseline: the single AES-GCM call encrypt_data makes, without the CP-ABE header
+        times = []
+        for _ in range(iterations):
+            start_time = time.perf_counter()
+            AES.new(aes_key, AES.MODE_GCM, nonce=os.urandom(12)).encrypt_and_digest(payload)
+            times.append(time.perf_counter() - start_time)
+        baseline = size_mb / statistics.mean(times)
+        results[size_mb] = {"single_call": baseline}
+        print(f"  {size_mb} MB, single encrypt_and_digest: {baseline:.1f} MB/s")
+
+        for workers in worker_counts:
+            encrypt_times, decrypt_times = [], []
+            for _ in range(iterations):
+                start_time = time.perf_counter()
+                encrypted = cpabe_instance.encrypt_parallel(policy_str, payload, workers=workers)
+                encrypt_times.append(time.perf_counter() - start_time)
+                start_time = time.perf_counter()
+                decrypted = cpabe_instance.decrypt_parallel(key_data, encrypted, workers=workers)
+                decrypt_times.append(time.perf_counter() - start_time)
+            if decrypted != payload:
+                print(f"  Parallel round trip mismatch at {size_mb} MB, {workers} workers")
+            encrypt_rate = size_mb / statistics.mean(encrypt_times)
+            decrypt_rate = size_mb / statistics.mean(decrypt_times)
+            results[size_mb][workers] = {"encrypt": encrypt_rate, "decrypt": decrypt_rate}
+            print(f"  {size_mb} MB, {workers} workers: encrypt {encrypt_rate:.1f} MB/s, decrypt {decrypt_rate:.1f} MB/s")
+
+    cpabe_instance.stop_aead_pool()
+    return results
+
+def run_key_wrap_cipher_matrix(iterations=20, payload_sizes=(1024, 1024 * 1024)):
+    print(f"\n--- Key Wrap x Data Cipher Matrix ({iterations} iterations) ---")
+
+    policy_str = '((attr0 and attr1) or (attr2 and attr3)) and attr4 and (attr5 or attr6)'
+    key_data = test_keygen([f"attr{i}" for i in range(7)])
+    # Every combination encrypts the same payloads under the same policy
+    payloads = {size: os.urandom(size) for size in payload_sizes}
+
+    results = {}
+    for key_wrap in KEY_WRAPS:
+        for data_cipher in DATA_CIPHERS:
+            try:
+                cpabe_instance.get_data_cipher(data_cipher)
+            except ValueError as e:
+                print(f"  {key_wrap} / {data_cipher}: skipped ({e})")
+                continue
+            for size, payload in payloads.items():
+                encrypt_times, decrypt_times = [], []
+                for _ in range(iterations):
+                    start_time = time.perf_counter()
+                    encrypted = cpabe_instance.encrypt_data(policy_str, payload, key_wrap=key_wrap,
+                                                            data_cipher=data_cipher)
+                    encrypt_times.append(time.perf_counter() - start_time)
+                    start_time = time.perf_counter()
+                    decrypted = cpabe_instance.decrypt_data(key_data, encrypted)
+                    decrypt_times.append(time.perf_counter() - start_time)
+                if decrypted != payload:
+                    print(f"  Round trip mismatch for {key_wrap} / {data_cipher} at {size} bytes")
+                encrypt_mean, decrypt_mean = statistics.mean(encrypt_times), statistics.mean(decrypt_times)
+                results[(key_wrap, data_cipher, size)] = {"encrypt": encrypt_mean, "decrypt": decrypt_mean}
+                print(f"  {key_wrap} / {data_cipher}, {size / 1024:.0f} KB: "
+                      f"encrypt {encrypt_mean * 1000:.2f} ms, decrypt {decrypt_mean * 1000:.2f} ms")
+
+    return results
+
 # --- Plotting ---
 def plot_benchmarks(keygen_data, encrypt_data, decrypt_data, plaintext_sizes, ciphertext_sizes):
     if not os.path.exists(PLOTS_DIR):
@@ -267,5 +788,21 @@ if __name__ == "__main__":
     if encrypted_data2:
         test_decrypt(key_data, encrypted_data2, show=1)
 
+    run_precompute_comparison(iterations=20)
+    run_attribute_hash_comparison(iterations=20)
+    run_secret_key_cache_comparison(iterations=20)
+    run_pairing_benchmark(iterations=20)
+    run_lazy_deserialization_benchmark(iterations=20)
+    run_pairing_product_sweep(iterations=20)
+    run_encryption_pool_benchmark(burst_size=50)
+    run_session_benchmark(batch_size=100)
+    run_multi_header_benchmark()
+    run_envelope_format_comparison(iterations=20)
+    run_stream_benchmark(size_mb=32)
+    run_range_read_benchmark(iterations=10)
+    run_record_log_benchmark()
+    run_parallel_aead_benchmark()
+    run_key_wrap_cipher_matrix(iterations=20)
+
     keygen_data, encrypt_data, decrypt_data, plaintext_sizes, ciphertext_sizes = run_benchmark(iterations=50)
     plot_benchmarks(keygen_data, encrypt_data, decrypt_data, plaintext_sizes, ciphertext_sizes)
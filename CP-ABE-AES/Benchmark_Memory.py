@@ -0,0 +1,97 @@
+import argparse
+import base64
+import json
+import logging
+import os
+import tracemalloc
+
+from app import app, cpabe_instance
+
+BASELINE_FILE = "memory_baseline.json"
+# A peak more than this fraction above the baseline counts as a regression
+REGRESSION_TOLERANCE = 0.10
+PAYLOAD_SIZES = {
+    "1KB": 1024, "100KB": 100 * 1024, "1MB": 1024 * 1024, "10MB": 10 * 1024 * 1024
+}
+
+logging.getLogger().setLevel(logging.WARNING)
+client = app.test_client()
+
+# --- Measurement ---
+def peak_bytes(func):
+    """Peak traced allocation while func runs, excluding memory held before it started"""
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+def post_and_drain(path, body):
+    # Stream the response and drop each chunk, so only the server side is measured
+    response = client.post(path, data=body, content_type='application/json', buffered=False)
+    for _ in response.iter_encoded():
+        pass
+    response.close()
+
+def make_operations(payload, key_data, policy):
+    encrypt_body = json.dumps({"policy": policy, "plaintext": base64.b64encode(payload).decode('utf-8')}).encode()
+    encrypted_data = json.loads(client.post('/encrypt', data=encrypt_body, content_type='application/json')
+                                .get_data())["encrypted_data"]
+    decrypt_body = json.dumps({"secret_key": key_data, "encrypted_data": encrypted_data}).encode()
+    library_envelope = cpabe_instance.encrypt_data(policy, payload)
+    return {
+        "api_encrypt": lambda: post_and_drain('/encrypt', encrypt_body),
+        "api_decrypt": lambda: post_and_drain('/decrypt', decrypt_body),
+        "encrypt_data": lambda: cpabe_instance.encrypt_data(policy, payload),
+        "encrypt_data_base64_buffer": lambda: cpabe_instance.encrypt_data(policy, payload, base64_buffer=True),
+        "decrypt_data": lambda: cpabe_instance.decrypt_data(key_data, library_envelope),
+    }
+
+def run_memory_benchmark():
+    print("\n--- Peak Memory per Operation (tracemalloc) ---")
+
+    policy = '(admin and it)'
+    key_data = cpabe_instance.keygen(["admin", "it"])
+
+    results = {}
+    for label, size in PAYLOAD_SIZES.items():
+        payload = os.urandom(size)
+        for operation, func in make_operations(payload, key_data, policy).items():
+            peak = peak_bytes(func)
+            results.setdefault(operation, {})[label] = peak
+            print(f"  {operation} {label}: peak {peak / 1024:.1f} KiB ({peak / size:.2f}x payload)")
+    return results
+
+# --- Regression check ---
+def check_regressions(results, baseline):
+    regressions = []
+    for operation, sizes in results.items():
+        for label, peak in sizes.items():
+            expected = baseline.get(operation, {}).get(label)
+            if expected and peak > expected * (1 + REGRESSION_TOLERANCE):
+                regressions.append((operation, label, expected, peak))
+
+    if not regressions:
+        print("\nNo peak memory regressions against the baseline")
+    for operation, label, expected, peak in regressions:
+        print(f"  REGRESSION {operation} {label}: {expected / 1024:.1f} KiB -> {peak / 1024:.1f} KiB "
+              f"(+{(peak / expected - 1) * 100:.0f}%)")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Peak memory benchmark for the encrypt/decrypt paths")
+    parser.add_argument("--update-baseline", action="store_true", help=f"Write the results to {BASELINE_FILE}")
+    args = parser.parse_args()
+
+    results = run_memory_benchmark()
+    if args.update_baseline or not os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"\nBaseline written to {BASELINE_FILE}")
+    else:
+        with open(BASELINE_FILE) as f:
+            baseline = json.load(f)
+        if check_regressions(results, baseline):
+            raise SystemExit(1)
@@ -0,0 +1,246 @@
+import base64
+import http.client
+import json
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+HOST = "127.0.0.1"
+PORT = 6100
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "serve.py")
+ASGI_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "asgi.py")
+ATTRIBUTES = ["admin", "it", "dev", "hr", "finance", "support", "manager", "engineer", "designer", "qa"]
+POLICY = '((admin and finance) or (it and support)) and manager and (qa or designer)'
+
+# --- Server control ---
+def start_server(workers, script=SERVER_SCRIPT, env=None):
+    server = subprocess.Popen([sys.executable, script, "--host", HOST, "--port", str(PORT),
+                               "--workers", str(workers), "--log-level", "WARNING"],
+                              env=dict(os.environ, **(env or {})),
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            if request("GET", "/")[0] == 200:
+                return server
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError(f"Server with {workers} workers did not start")
+
+def stop_server(server):
+    server.send_signal(signal.SIGTERM)
+    server.wait(timeout=60)
+
+# --- Client ---
+def request(method, path, body=None):
+    # One request per connection, as the pre-fork workers serve them
+    conn = http.client.HTTPConnection(HOST, PORT, timeout=60)
+    try:
+        conn.request(method, path, body=body, headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        return response.status, response.read()
+    finally:
+        conn.close()
+
+def make_bodies():
+    plaintext_b64 = base64.b64encode(b"A" * 1024).decode('utf-8')
+    key_data = json.loads(request("POST", "/keygen", json.dumps({"attributes": ATTRIBUTES}))[1])["key_data"]
+    encrypt_body = json.dumps({"policy": POLICY, "plaintext": plaintext_b64})
+    encrypted_data = json.loads(request("POST", "/encrypt", encrypt_body)[1])["encrypted_data"]
+    return {
+        "keygen": ("/keygen", json.dumps({"attributes": ATTRIBUTES})),
+        "encrypt": ("/encrypt", encrypt_body),
+        "decrypt": ("/decrypt", json.dumps({"secret_key": key_data, "encrypted_data": encrypted_data})),
+    }
+
+def client_loop(path, body, duration):
+    """Issue requests back to back for duration seconds; returns (latencies, errors)"""
+    latencies, errors = [], 0
+    end_time = time.perf_counter() + duration
+    while time.perf_counter() < end_time:
+        start_time = time.perf_counter()
+        try:
+            status, _ = request("POST", path, body)
+        except OSError:
+            status = None
+        if status == 200:
+            latencies.append(time.perf_counter() - start_time)
+        else:
+            errors += 1
+    return latencies, errors
+
+def run_load(path, body, clients, duration, during=None):
+    """Drive the server from client processes; during() runs in this process while the load is on"""
+    with ProcessPoolExecutor(clients) as executor:
+        futures = [executor.submit(client_loop, path, body, duration) for _ in range(clients)]
+        if during is not None:
+            during()
+        latencies, errors = [], 0
+        for future in futures:
+            client_latencies, client_errors = future.result()
+            latencies.extend(client_latencies)
+            errors += client_errors
+    return latencies, errors
+
+def summarize(latencies, errors, duration):
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1] if latencies else 0
+    return {"rps": len(latencies) / duration, "errors": errors,
+            "p50": statistics.median(latencies) if latencies else 0, "p99": p99}
+
+# --- Benchmarking Logic ---
+def default_worker_counts():
+    cpus = os.cpu_count() or 1
+    counts = [1]
+    while counts[-1] * 2 < cpus:
+        counts.append(counts[-1] * 2)
+    if cpus > 1:
+        counts.append(cpus)
+    return counts
+
+def run_scaling_benchmark(worker_counts=None, operations=("keygen", "encrypt", "decrypt"), duration=10,
+                          clients_per_worker=2):
+    worker_counts = worker_counts or default_worker_counts()
+    print(f"\n--- Pre-fork Throughput Scaling, {os.cpu_count()} CPUs ({duration}s per run, "
+          f"{clients_per_worker} clients per worker) ---")
+    print("  Load clients share the machine with the server; run them from another host for exact numbers")
+
+    results = {}
+    for workers in worker_counts:
+        server = start_server(workers)
+        try:
+            bodies = make_bodies()
+            for operation in operations:
+                path, body = bodies[operation]
+                latencies, errors = run_load(path, body, workers * clients_per_worker, duration)
+                stats = summarize(latencies, errors, duration)
+                results.setdefault(operation, {})[workers] = stats
+                single = results[operation].get(worker_counts[0])
+                efficiency = stats["rps"] / (single["rps"] * workers / worker_counts[0]) if single["rps"] else 0
+                print(f"  {operation}, {workers} workers: {stats['rps']:.1f} req/s "
+                      f"(p50 {stats['p50'] * 1000:.1f} ms, p99 {stats['p99'] * 1000:.1f} ms, "
+                      f"{stats['errors']} errors, scaling efficiency {efficiency:.0%})")
+        finally:
+            stop_server(server)
+
+    return results
+
+def run_restart_under_load(workers=None, duration=10, clients_per_worker=2):
+    workers = workers or os.cpu_count() or 1
+    print(f"\n--- Graceful Restart Under Load, {workers} workers ({duration}s, SIGHUP halfway) ---")
+
+    server = start_server(workers)
+    try:
+        path, body = make_bodies()["encrypt"]
+
+        def reload_halfway():
+            time.sleep(duration / 2)
+            server.send_signal(signal.SIGHUP)
+
+        latencies, errors = run_load(path, body, workers * clients_per_worker, duration, during=reload_halfway)
+        stats = summarize(latencies, errors, duration)
+        print(f"  encrypt: {stats['rps']:.1f} req/s, {stats['errors']} failed requests across the restart "
+              f"(p99 {stats['p99'] * 1000:.1f} ms)")
+    finally:
+        stop_server(server)
+
+    return stats
+
+def resident_kb(pid):
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+def run_keep_alive_benchmark(idle_counts=(0, 1000, 5000), workers=None, duration=5, clients=4):
+    workers = workers or os.cpu_count() or 1
+    print(f"\n--- ASGI Front End With Idle Keep-alive Connections, {workers} pool workers ---")
+
+    results = {}
+    server = start_server(workers, script=ASGI_SCRIPT)
+    try:
+        path, body = make_bodies()["encrypt"]
+        base_rss = resident_kb(server.pid)
+        for idle in idle_counts:
+            idle_sockets = []
+            try:
+                for _ in range(idle):
+                    sock = socket.create_connection((HOST, PORT))
+                    # A complete keep-alive exchange leaves the connection open and idle on the server
+                    sock.sendall(b"GET / HTTP/1.1\r\nHost: bench\r\n\r\n")
+                    idle_sockets.append(sock)
+                for sock in idle_sockets:
+                    sock.recv(4096)
+                rss = resident_kb(server.pid)
+                latencies, errors = run_load(path, body, clients, duration)
+                stats = summarize(latencies, errors, duration)
+            finally:
+                for sock in idle_sockets:
+                    sock.close()
+            stats["rss_kb"] = rss
+            results[idle] = stats
+            per_connection = (rss - base_rss) / idle if idle else 0
+            print(f"  {idle} idle connections: front end RSS {rss / 1024:.1f} MB "
+                  f"({per_connection:.1f} KB per connection), encrypt {stats['rps']:.1f} req/s, "
+                  f"p99 {stats['p99'] * 1000:.1f} ms, {stats['errors']} errors")
+    finally:
+        stop_server(server)
+
+    return results
+
+def run_keygen_batch_scaling(worker_counts=None, num_users=1000):
+    worker_counts = worker_counts or default_worker_counts()
+    print(f"\n--- /keygen/batch Onboarding Throughput, {os.cpu_count()} CPUs ({num_users} users) ---")
+
+    # An organization's users: a role and a department each, all in the organization
+    roles, departments = ["officer", "auditor", "clerk", "manager"], ["loans", "claims", "compliance", "it"]
+    users = [{"user_id": f"user{i}", "attributes": ["bank", roles[i % 4], departments[i // 4 % 4]]}
+             for i in range(num_users)]
+    body = "".join(json.dumps(user) + "\n" for user in users)
+
+    results = {}
+    for workers in worker_counts:
+        # One server process; the keys come from its batch pool of the given size
+        server = start_server(1, env={"CPABE_BATCH_WORKERS": str(workers)})
+        try:
+            # Warm the pool, so its start-up is not counted
+            request("POST", "/keygen/batch", json.dumps({"items": users[:workers]}))
+
+            conn = http.client.HTTPConnection(HOST, PORT, timeout=600)
+            try:
+                start_time = time.perf_counter()
+                conn.request("POST", "/keygen/batch", body=body, headers={"Content-Type": "application/x-ndjson"})
+                response = conn.getresponse()
+                first_key, errors, completed = None, 0, 0
+                for line in response:
+                    if first_key is None:
+                        first_key = time.perf_counter() - start_time
+                    item = json.loads(line)
+                    errors += item["status"] != "success"
+                    completed = item["completed"]
+                elapsed = time.perf_counter() - start_time
+            finally:
+                conn.close()
+        finally:
+            stop_server(server)
+
+        rate = completed / elapsed
+        results[workers] = {"keys_per_second": rate, "first_key": first_key, "errors": errors}
+        speedup = rate / results[worker_counts[0]]["keys_per_second"]
+        print(f"  {workers} batch workers: {rate:.1f} keys/s ({speedup:.1f}x), {elapsed:.1f}s for {completed} users, "
+              f"first key after {first_key * 1000:.0f} ms, {errors} errors")
+
+    return results
+
+if __name__ == "__main__":
+    run_scaling_benchmark(duration=10)
+    run_restart_under_load(duration=10)
+    run_keep_alive_benchmark()
+    run_keygen_batch_scaling()
@@ -0,0 +1,351 @@
+from flask import Flask, Response, request, jsonify, stream_with_context
+from cpabe_schemes import CPABEScheme
+import base64
+import itertools
+import json
+import logging
+import atexit
+import multiprocessing
+import os
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+app = Flask(__name__)
+cpabe_instance = None
+
+def init_scheme():
+    """Create the CPABEScheme the routes use and load its keys, once per process"""
+    global cpabe_instance
+    if cpabe_instance is not None:
+        return cpabe_instance
+
+    # Defaults for requests that do not choose a key wrap / data cipher; CPABE_KEYS_DIR=Xor/keys with
+    # CPABE_KEY_WRAP=xor serves the keys of the former Xor server
+    scheme = CPABEScheme(key_wrap=os.environ.get('CPABE_KEY_WRAP', 'hkdf'),
+                         data_cipher=os.environ.get('CPABE_DATA_CIPHER', 'aes-256-gcm'),
+                         keys_dir=os.environ.get('CPABE_KEYS_DIR'),
+                         batch_workers=int(os.environ.get('CPABE_BATCH_WORKERS', '0')))
+
+    # Initialize CP-ABE system
+    with app.app_context():
+        if not scheme.load_keys():
+            logger.error("Failed to load or initialize CP-ABE keys")
+            raise RuntimeError("Failed to initialize CP-ABE system")
+    cpabe_instance = scheme
+    return scheme
+
+# Spawned processes, such as the batch pool, re-import the entry script and with it this module; they
+# build their own scheme from the key files, or call init_scheme() when they serve the app themselves.
+# parent_process() is only set after that re-import, but the child's process name already is.
+if multiprocessing.current_process().name == 'MainProcess':
+    init_scheme()
+    # Persist attribute hashes learned while serving so a restart starts warm
+    atexit.register(cpabe_instance.save_attribute_hashes)
+
+# Longest NDJSON line of a batch request: a base64 MAX_PLAINTEXT_SIZE payload plus the item's other fields
+BATCH_LINE_LIMIT = (CPABEScheme.MAX_PLAINTEXT_SIZE + 2) // 3 * 4 + 64 * 1024
+
+@app.before_request
+def reload_changed_keys():
+    # With several server processes, /setup only runs in one of them; the others pick up its keys here
+    cpabe_instance.reload_keys_if_changed()
+
+# Stands in for a base64 field that is streamed into the response instead of built in memory
+BASE64_PLACEHOLDER = '\x00base64\x00'
+
+def read_json_body():
+    """Parse the request body without Flask keeping a cached copy; None if it is not valid JSON"""
+    try:
+        return json.loads(request.get_data(cache=False))
+    except ValueError:
+        return None
+
+def stream_json(payload, buffer):
+    """JSON response for payload with buffer base64-encoded, chunk by chunk, in place of BASE64_PLACEHOLDER"""
+    head, tail = json.dumps(payload).split(json.dumps(BASE64_PLACEHOLDER), 1)
+
+    def generate():
+        yield head + '"'
+        yield from cpabe_instance.b64encode_chunks(buffer)
+        yield '"' + tail
+    return Response(generate(), mimetype='application/json')
+
+@app.route('/')
+def home():
+    return "CP-ABE API is running with AES-GCM!"
+
+@app.route('/setup', methods=['POST'])
+def setup():
+    try:
+        success = cpabe_instance.setup()
+        if success:
+            return jsonify({"status": "success", "message": "CP-ABE system initialized successfully"})
+        else:
+            return jsonify({"status": "error", "message": "Failed to initialize CP-ABE system"}), 500
+    except Exception as e:
+        logger.error(f"Setup failed: {str(e)}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@app.route('/keygen', methods=['POST'])
+def keygen():
+    try:
+        data = request.get_json()
+        if not data or 'attributes' not in data:
+            return jsonify({"status": "error", "message": "Missing attributes in request"}), 400
+        
+        attributes = data['attributes']
+        if not isinstance(attributes, list) or not attributes:
+            return jsonify({"status": "error", "message": "Attributes must be a non-empty list"}), 400
+
+        key_data = cpabe_instance.keygen(attributes)
+        return jsonify({"status": "success", "key_data": key_data})
+    except Exception as e:
+        logger.error(f"Key generation failed: {str(e)}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@app.route('/encrypt', methods=['POST'])
+def encrypt():
+    try:
+        data = read_json_body()
+        if not isinstance(data, dict) or 'policy' not in data or 'plaintext' not in data:
+            return jsonify({"status": "error", "message": "Missing policy or plaintext in request"}), 400
+
+        policy = data['policy']
+        try:
+            cpabe_instance.get_key_wrap(data.get('key_wrap'))
+            cpabe_instance.get_data_cipher(data.get('data_cipher'))
+        except ValueError as e:
+            return jsonify({"status": "error", "message": str(e)}), 400
+
+        # Decode into one buffer and drop the base64 text; the buffer is then encrypted in place
+        try:
+            plaintext = cpabe_instance.b64decode_buffer(data.pop('plaintext'))
+        except Exception as e:
+            return jsonify({"status": "error", "message": "Invalid base64 plaintext"}), 400
+
+        encrypted_data = cpabe_instance.encrypt_data(policy, plaintext, in_place=True,
+                                                     key_wrap=data.get('key_wrap'),
+                                                     data_cipher=data.get('data_cipher'))
+        ciphertext = encrypted_data['ciphertext']
+        encrypted_data['ciphertext'] = BASE64_PLACEHOLDER
+        return stream_json({"status": "success", "encrypted_data": encrypted_data}, ciphertext)
+    except Exception as e:
+        logger.error(f"Encryption failed: {str(e)}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+def ndjson_items(stream, parse):
+    """Parse the items of a newline-delimited JSON body as it arrives; invalid lines become ValueErrors"""
+    while True:
+        line = stream.readline(BATCH_LINE_LIMIT)
+        if not line:
+            return
+        if not line.endswith(b'\n') and len(line) >= BATCH_LINE_LIMIT:
+            # Skip the rest of the oversized line so the next item starts on its own line
+            while line and not line.endswith(b'\n'):
+                line = stream.readline(BATCH_LINE_LIMIT)
+            yield ValueError("Item exceeds the maximum line length")
+            continue
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError:
+            yield ValueError("Invalid JSON item")
+            continue
+        yield parse(item)
+
+def stream_batch_results(results, ndjson, result_fields=lambda result: {"encrypted_data": result},
+                         item_fields=lambda index: {}):
+    """Stream (index, result or exception) pairs as NDJSON lines or as one JSON document
+
+    result_fields gives the fields of a successful result, item_fields extra fields of every item.
+    """
+    def item_json(index, result):
+        if isinstance(result, Exception):
+            return json.dumps({"index": index, **item_fields(index), "status": "error", "message": str(result)})
+        return json.dumps({"index": index, **item_fields(index), "status": "success", **result_fields(result)})
+
+    def generate():
+        if ndjson:
+            for index, result in results:
+                yield item_json(index, result) + '\n'
+            return
+        yield '{"status": "success", "results": ['
+        separator = ''
+        for index, result in results:
+            yield separator + item_json(index, result)
+            separator = ', '
+        yield ']}'
+    return Response(stream_with_context(generate()),
+                    mimetype='application/x-ndjson' if ndjson else 'application/json')
+
+def parse_keygen_item(item):
+    """(user id, attributes or a ValueError saying why they are invalid) of one /keygen/batch item"""
+    if not isinstance(item, dict) or item.get('user_id') is None or 'attributes' not in item:
+        return (item.get('user_id') if isinstance(item, dict) else None,
+                ValueError("Missing user_id or attributes in item"))
+    if not isinstance(item['attributes'], list) or not item['attributes']:
+        return item['user_id'], ValueError("Attributes must be a non-empty list")
+    return item['user_id'], item['attributes']
+
+@app.route('/keygen/batch', methods=['POST'])
+def keygen_batch():
+    try:
+        # A JSON body {"items": [...]} or, with Content-Type application/x-ndjson, one item per line
+        ndjson = request.mimetype == 'application/x-ndjson'
+        if ndjson:
+            total = None
+            items = ndjson_items(request.stream, parse_keygen_item)
+        else:
+            data = read_json_body()
+            if not isinstance(data, dict) or not isinstance(data.get('items'), list):
+                return jsonify({"status": "error", "message": "Missing items in request"}), 400
+            total = len(data['items'])
+            items = (parse_keygen_item(item) for item in data.pop('items'))
+
+        # Keys complete out of order; every result names its user and how many keys are done so far
+        user_ids = []
+        completed = itertools.count(1)
+
+        def attribute_lists():
+            for item in items:
+                # Lines that are not even JSON have no user id
+                user_id, attributes = (None, item) if isinstance(item, Exception) else item
+                user_ids.append(user_id)
+                yield attributes
+
+        def progress_fields(index):
+            fields = {"user_id": user_ids[index], "completed": next(completed)}
+            if total is not None:
+                fields["total"] = total
+            return fields
+
+        results = cpabe_instance.keygen_batch(attribute_lists())
+        return stream_batch_results(results, ndjson, lambda key_data: {"key_data": key_data}, progress_fields)
+    except Exception as e:
+        logger.error(f"Batch key generation failed: {str(e)}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+def parse_encrypt_item(item):
+    """(policy, plaintext) of one /encrypt/batch item, or a ValueError saying why it is invalid"""
+    if not isinstance(item, dict) or 'policy' not in item or 'plaintext' not in item:
+        return ValueError("Missing policy or plaintext in item")
+    try:
+        return item['policy'], cpabe_instance.b64decode_buffer(item['plaintext'])
+    except ValueError:
+        return ValueError("Invalid base64 plaintext")
+
+@app.route('/encrypt/batch', methods=['POST'])
+def encrypt_batch():
+    try:
+        # A JSON body {"items": [...]} or, with Content-Type application/x-ndjson, one item per line
+        ndjson = request.mimetype == 'application/x-ndjson'
+        if ndjson:
+            options = request.args
+            items = ndjson_items(request.stream, parse_encrypt_item)
+        else:
+            data = read_json_body()
+            if not isinstance(data, dict) or not isinstance(data.get('items'), list):
+                return jsonify({"status": "error", "message": "Missing items in request"}), 400
+            options = data
+            items = (parse_encrypt_item(item) for item in data.pop('items'))
+
+        try:
+            cpabe_instance.get_key_wrap(options.get('key_wrap'))
+            cpabe_instance.get_data_cipher(options.get('data_cipher'))
+        except ValueError as e:
+            return jsonify({"status": "error", "message": str(e)}), 400
+
+        # Items are grouped by policy and encrypted as they arrive; results stream back in input order
+        results = cpabe_instance.encrypt_batch(items, key_wrap=options.get('key_wrap'),
+                                               data_cipher=options.get('data_cipher'))
+        return stream_batch_results(results, ndjson)
+    except Exception as e:
+        logger.error(f"Batch encryption failed: {str(e)}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@app.route('/decrypt', methods=['POST'])
+def decrypt():
+    try:
+        data = read_json_body()
+        if not isinstance(data, dict) or 'secret_key' not in data or 'encrypted_data' not in data:
+            return jsonify({
+                "status": "error", 
+                "message": "Missing secret key or encrypted data in request"
+            }), 400
+
+        secret_key = data['secret_key']
+        encrypted_data = data['encrypted_data']
+
+        # Replace the base64 ciphertext with a decoded buffer that is decrypted in place
+        if isinstance(encrypted_data, dict) and isinstance(encrypted_data.get('ciphertext'), str):
+            try:
+                encrypted_data['ciphertext'] = cpabe_instance.b64decode_buffer(encrypted_data['ciphertext'])
+            except ValueError:
+                return jsonify({"status": "error", "message": "Invalid base64 ciphertext"}), 400
+
+        # Gọi hàm decrypt_data
+        decrypted_data = cpabe_instance.decrypt_data(secret_key, encrypted_data, in_place=True)
+        
+        # Kiểm tra kết quả None
+        if decrypted_data is None:
+            return jsonify({
+                "status": "success",  # Đổi thành success vì đây không phải lỗi
+                "decrypted": False,   # Flag cho biết không decrypt được
+                "message": "Cannot decrypt - Insufficient attributes"
+            }), 200  # HTTP 200 vì đây là kết quả hợp lệ
+            
+        # Nếu decrypt thành công
+        return stream_json({
+            "status": "success",
+            "decrypted": True,        # Flag cho biết decrypt thành công
+            "decrypted_plaintext_base64": BASE64_PLACEHOLDER
+        }, decrypted_data)
+        
+    except Exception as e:
+        logger.error(f"Decryption failed: {str(e)}")
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 500
+
+def decrypt_result_fields(plaintext):
+    """Fields of one /decrypt/batch item, shaped like a /decrypt response"""
+    if plaintext is None:
+        return {"decrypted": False, "message": "Cannot decrypt - Insufficient attributes"}
+    return {"decrypted": True, "decrypted_plaintext_base64": base64.b64encode(plaintext).decode('utf-8')}
+
+@app.route('/decrypt/batch', methods=['POST'])
+def decrypt_batch():
+    try:
+        data = read_json_body()
+        if not isinstance(data, dict) or 'secret_key' not in data or not isinstance(data.get('items'), list):
+            return jsonify({"status": "error", "message": "Missing secret key or items in request"}), 400
+
+        try:
+            results = cpabe_instance.decrypt_batch(data['secret_key'], data.pop('items'))
+        except ValueError as e:
+            return jsonify({"status": "error", "message": str(e)}), 400
+
+        # Per item: decrypted, insufficient attributes (decrypted: false) or an error, in input order
+        return stream_batch_results(enumerate(results), False, decrypt_result_fields)
+    except Exception as e:
+        logger.error(f"Batch decryption failed: {str(e)}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@app.route('/api/cpabe/keys/status', methods=['GET'])
+def keys_status_api():
+    try:
+        status = cpabe_instance.check_keys_status()
+        return jsonify(status), 200
+    except Exception as e:
+        logger.error(f"Failed to check keys status: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+if __name__ == '__main__':
+    # Development server; serve.py runs the pre-fork production mode
+    app.run(debug=True, host='0.0.0.0', port=6000)
+
+
@@ -0,0 +1,462 @@
+import argparse
+import asyncio
+import io
+import json
+import logging
+import multiprocessing
+import os
+import signal
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http import HTTPStatus
+from urllib.parse import unquote
+
+logger = logging.getLogger(__name__)
+
+# Largest request body accepted outside the batch routes: a base64 MAX_PLAINTEXT_SIZE payload plus its JSON envelope
+MAX_BODY_SIZE = 16 * 1024 * 1024
+READ_SIZE = 64 * 1024
+HOP_BY_HOP_HEADERS = (b'connection', b'keep-alive', b'transfer-encoding', b'te', b'expect', b'upgrade')
+# Routes that stream items in and results out; they run in the front end, whose scheme spreads
+# their pairing work over its batch pool, instead of as one buffered call in the process pool
+BATCH_ROUTES = ('/encrypt/batch', '/decrypt/batch', '/keygen/batch')
+
+# --- Pool workers ---
+_flask_app = None
+
+def _init_worker():
+    """Load the keys once per pool process by importing the Flask app"""
+    global _flask_app
+    # Batch routes run in the front end, so these processes never need a batch pool of their own
+    os.environ.setdefault('CPABE_BATCH_WORKERS', '1')
+    from app import app, init_scheme
+    init_scheme()
+    _flask_app = app
+
+def _ping():
+    return os.getpid()
+
+def _handle_request(method, path, query_string, headers, body):
+    """Run one request through the Flask app; returns (status, headers, body) exactly as it would serve them"""
+    from werkzeug.test import EnvironBuilder, run_wsgi_app
+
+    builder = EnvironBuilder(method=method, path=path, query_string=query_string, headers=headers, data=body)
+    try:
+        app_iter, status, response_headers = run_wsgi_app(_flask_app, builder.get_environ())
+        try:
+            payload = b''.join(app_iter)
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
+    finally:
+        builder.close()
+    return int(status.split(' ', 1)[0]), response_headers.to_wsgi_list(), payload
+
+# --- Batch routes in the front end ---
+class ReceiveStream(io.RawIOBase):
+    """Request body for a Flask request run in a front end thread, pulled from the ASGI receive channel on demand"""
+
+    def __init__(self, receive, loop):
+        self._receive = receive
+        self._loop = loop
+        self._chunk = memoryview(b'')
+        self._more_body = True
+
+    @property
+    def finished(self):
+        """True once the client has sent the whole body"""
+        return not self._more_body
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._chunk and self._more_body:
+            message = asyncio.run_coroutine_threadsafe(self._receive(), self._loop).result()
+            if message['type'] == 'http.disconnect':
+                raise ConnectionError("Client disconnected")
+            self._chunk = memoryview(message.get('body', b''))
+            self._more_body = message.get('more_body', False)
+        size = min(len(buffer), len(self._chunk))
+        buffer[:size] = self._chunk[:size]
+        self._chunk = self._chunk[size:]
+        return size
+
+def _stream_request(flask_app, scope, receive, send, loop):
+    """Run one request through the Flask app in this thread, reading the body and sending the response
+    piece by piece as the app consumes and produces them"""
+    from werkzeug.test import EnvironBuilder
+
+    def call(coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, loop).result()
+
+    # Hop-by-hop headers stay with the connection; the body arrives de-chunked and ends when receive says so
+    headers = [(name.decode('latin-1'), value.decode('latin-1')) for name, value in scope['headers']
+               if name not in HOP_BY_HOP_HEADERS]
+    builder = EnvironBuilder(method=scope['method'], path=scope['path'],
+                             query_string=scope['query_string'].decode('latin-1'), headers=headers)
+    try:
+        environ = builder.get_environ()
+        # The builder would seek a given input stream to measure it, so the body stream is set here
+        body = ReceiveStream(receive, loop)
+        environ['wsgi.input'] = io.BufferedReader(body, READ_SIZE)
+        environ['wsgi.input_terminated'] = True
+        content_length = dict(headers).get('content-length')
+        if content_length is not None:
+            environ['CONTENT_LENGTH'] = content_length
+        response = {}
+
+        def start_response(status, response_headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                                   for name, value in response_headers
+                                   if name.lower().encode('latin-1') not in HOP_BY_HOP_HEADERS]
+
+        app_iter = flask_app(environ, start_response)
+        try:
+            call(send({'type': 'http.response.start', 'status': response['status'],
+                       'headers': response['headers']}))
+            # Most clients send the whole body before reading the response, so results finished during
+            # the upload are held (up to MAX_BODY_SIZE) rather than blocking on a socket nobody drains
+            held, held_size = [], 0
+            for chunk in app_iter:
+                if not chunk:
+                    continue
+                if not body.finished and held_size + len(chunk) <= MAX_BODY_SIZE:
+                    held.append(chunk)
+                    held_size += len(chunk)
+                    continue
+                if held:
+                    call(send({'type': 'http.response.body', 'body': b''.join(held), 'more_body': True}))
+                    held, held_size = [], 0
+                call(send({'type': 'http.response.body', 'body': chunk, 'more_body': True}))
+            if held:
+                call(send({'type': 'http.response.body', 'body': b''.join(held), 'more_body': True}))
+            call(send({'type': 'http.response.body', 'body': b'', 'more_body': False}))
+        finally:
+            # Closing a batch response stops its generator and cancels its pending work
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
+    finally:
+        builder.close()
+
+# --- ASGI application ---
+class CPABEAsgiApp:
+    """ASGI front end that streams request bodies in and runs the CP-ABE routes in a warm process pool
+
+    The event loop only moves bytes; JSON parsing, base64 and pairing work all run in the pool,
+    whose processes load the keys before the first request. Responses come from the Flask app
+    itself, so they are byte-compatible with the WSGI server.
+
+    Batch routes are the exception: they run in front end threads with the body streamed in and
+    results streamed out as they complete, without the MAX_BODY_SIZE limit, and their pairing work
+    fans out over the front end's batch pool (CPABE_BATCH_WORKERS, one process per CPU by default).
+    Results finished while the body is still uploading are held back, up to MAX_BODY_SIZE, so that
+    clients which only read after sending do not stall; beyond that, such clients must read the
+    response while they send.
+    """
+
+    def __init__(self, workers=None, max_pending=None, max_batches=None):
+        self.workers = workers or os.cpu_count() or 1
+        # Requests handed to the pool at once; the rest wait in the event loop, not in pool queues
+        self.max_pending = max_pending or self.workers * 4
+        # Batch requests served at once; more wait for a thread
+        self.max_batches = max_batches or 4
+        self._pool = None
+        self._batch_threads = None
+        self._flask_app = None
+        self._scheme = None
+        self._pending = None
+        self._pool_lock = None
+
+    async def startup(self):
+        self._pending = asyncio.Semaphore(self.max_pending)
+        self._pool_lock = asyncio.Lock()
+        # The front end serves the batch routes itself, so it loads the keys too
+        from app import app as flask_app, init_scheme
+        self._scheme = init_scheme()
+        self._flask_app = flask_app
+        self._batch_threads = ThreadPoolExecutor(self.max_batches, thread_name_prefix='cpabe-batch')
+        self._pool = await self._start_pool()
+
+    async def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+        if self._batch_threads is not None:
+            self._batch_threads.shutdown(wait=True)
+            self._batch_threads = None
+            self._scheme.stop_batch_pool()
+
+    async def _start_pool(self):
+        # Spawned, not forked: the front end runs batch threads by the time a broken pool is replaced
+        pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=_init_worker)
+        # Spawn every process and let it load the keys before any request is routed to the pool
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(pool, _ping) for _ in range(self.workers)))
+        logger.info(f"Process pool of {self.workers} workers ready")
+        return pool
+
+    async def _replace_pool(self, broken):
+        async with self._pool_lock:
+            if self._pool is broken:
+                logger.warning("Process pool broke, starting a new one")
+                self._pool = await self._start_pool()
+                broken.shutdown(wait=False)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await self.startup()
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _http(self, scope, receive, send):
+        if scope['method'] == 'POST' and scope['path'] in BATCH_ROUTES:
+            await self._http_batch(scope, receive, send)
+            return
+
+        body = bytearray()
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            body += message.get('body', b'')
+            more_body = message.get('more_body', False)
+            if len(body) > MAX_BODY_SIZE:
+                await self._send_json(send, 413, {"status": "error", "message": "Request body too large"})
+                return
+
+        # The body is already de-chunked and complete; hop-by-hop headers stay with this connection
+        headers = [(name.decode('latin-1'), value.decode('latin-1')) for name, value in scope['headers']
+                   if name not in HOP_BY_HOP_HEADERS]
+        async with self._pending:
+            pool = self._pool
+            try:
+                status, response_headers, payload = await asyncio.get_running_loop().run_in_executor(
+                    pool, _handle_request, scope['method'], scope['path'],
+                    scope['query_string'].decode('latin-1'), headers, bytes(body))
+            except BrokenProcessPool:
+                await self._replace_pool(pool)
+                await self._send_json(send, 500, {"status": "error", "message": "Worker process failed"})
+                return
+
+        # Streamed Flask responses arrive here complete, so they can always carry a Content-Length
+        response_headers = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                            for name, value in response_headers
+                            if name.lower() != 'content-length'
+                            and name.lower().encode('latin-1') not in HOP_BY_HOP_HEADERS]
+        response_headers.append((b'content-length', str(len(payload)).encode('latin-1')))
+        await send({'type': 'http.response.start', 'status': status, 'headers': response_headers})
+        await send({'type': 'http.response.body', 'body': payload})
+
+    async def _http_batch(self, scope, receive, send):
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(self._batch_threads, _stream_request, self._flask_app,
+                                       scope, receive, send, loop)
+        except ConnectionError:
+            logger.info(f"Client left during {scope['path']}, its remaining items were dropped")
+        except Exception as e:
+            # Before the response started, the server answers 500; after, the response is cut short
+            logger.error(f"Batch request {scope['path']} failed: {str(e)}")
+
+    async def _send_json(self, send, status, payload):
+        body = json.dumps(payload).encode('utf-8') + b'\n'
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(b'content-type', b'application/json'),
+                                (b'content-length', str(len(body)).encode('latin-1'))]})
+        await send({'type': 'http.response.body', 'body': body})
+
+app = CPABEAsgiApp()
+
+# --- Minimal HTTP/1.1 server for running without an ASGI server installed ---
+class HTTPError(Exception):
+    pass
+
+class ASGIConnection:
+    """One client connection: parses HTTP/1.1 requests and bridges them to an ASGI app, with keep-alive"""
+
+    def __init__(self, asgi_app, reader, writer, keep_alive_timeout=75):
+        self.app = asgi_app
+        self.reader = reader
+        self.writer = writer
+        self.keep_alive_timeout = keep_alive_timeout
+
+    async def serve(self):
+        try:
+            while await self._serve_one():
+                pass
+        except (HTTPError, ValueError):
+            await self._write_simple(400, b"Bad Request")
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.writer.close()
+
+    async def _serve_one(self):
+        # An idle keep-alive connection costs one suspended coroutine and its buffers
+        try:
+            request_line = await asyncio.wait_for(self.reader.readline(), self.keep_alive_timeout)
+        except asyncio.TimeoutError:
+            return False
+        if not request_line:
+            return False
+        method, target, version = request_line.decode('latin-1').rstrip('\r\n').split(' ')
+        if version not in ('HTTP/1.0', 'HTTP/1.1'):
+            raise HTTPError(version)
+
+        headers = []
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers.append((name.strip().lower().encode('latin-1'), value.strip().encode('latin-1')))
+            if len(headers) > 100:
+                raise HTTPError("Too many headers")
+        header_map = {name: value.lower() for name, value in headers}
+
+        connection = header_map.get(b'connection', b'')
+        keep_alive = connection != b'close' if version == 'HTTP/1.1' else connection == b'keep-alive'
+        chunked = header_map.get(b'transfer-encoding') == b'chunked'
+        remaining = 0 if chunked else int(header_map.get(b'content-length', b'0'))
+        expect_continue = header_map.get(b'expect') == b'100-continue'
+
+        path, _, query = target.partition('?')
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': version[5:],
+            'method': method, 'scheme': 'http', 'path': unquote(path), 'raw_path': path.encode('latin-1'),
+            'query_string': query.encode('latin-1'), 'root_path': '', 'headers': headers,
+            'client': self.writer.get_extra_info('peername'), 'server': self.writer.get_extra_info('sockname'),
+        }
+        state = {'body_done': not chunked and remaining == 0, 'started': False, 'chunked_response': False,
+                 'keep_alive': keep_alive}
+
+        async def receive():
+            nonlocal remaining, expect_continue
+            if state['body_done']:
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            if expect_continue:
+                expect_continue = False
+                self.writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+            # Hand the body to the app piece by piece as it arrives
+            if chunked:
+                size = int((await self.reader.readline()).split(b';', 1)[0], 16)
+                if size == 0:
+                    # Skip any trailers up to the blank line that ends the body
+                    while (await self.reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    state['body_done'] = True
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                chunk = await self.reader.readexactly(size + 2)
+                return {'type': 'http.request', 'body': chunk[:-2], 'more_body': True}
+            chunk = await self.reader.read(min(remaining, READ_SIZE))
+            if not chunk:
+                raise asyncio.IncompleteReadError(b'', remaining)
+            remaining -= len(chunk)
+            state['body_done'] = remaining == 0
+            return {'type': 'http.request', 'body': chunk, 'more_body': remaining > 0}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                response_headers = list(message.get('headers', []))
+                names = {name.lower() for name, _ in response_headers}
+                if b'content-length' not in names:
+                    # HTTP/1.0 clients cannot read chunked bodies; the end of the connection ends theirs
+                    if version == 'HTTP/1.1':
+                        state['chunked_response'] = True
+                        response_headers.append((b'transfer-encoding', b'chunked'))
+                    else:
+                        state['keep_alive'] = False
+                if not state['keep_alive']:
+                    response_headers.append((b'connection', b'close'))
+                head = [f"HTTP/1.1 {message['status']} {_reason(message['status'])}\r\n".encode('latin-1')]
+                head += [name + b': ' + value + b'\r\n' for name, value in response_headers]
+                self.writer.write(b''.join(head) + b'\r\n')
+                state['started'] = True
+            elif message['type'] == 'http.response.body':
+                body = message.get('body', b'')
+                more_body = message.get('more_body', False)
+                if state['chunked_response']:
+                    if body:
+                        self.writer.write(f"{len(body):x}\r\n".encode('latin-1') + body + b'\r\n')
+                    if not more_body:
+                        self.writer.write(b'0\r\n\r\n')
+                else:
+                    self.writer.write(body)
+                await self.writer.drain()
+
+        await self.app(scope, receive, send)
+        if not state['started']:
+            await self._write_simple(500, b"Internal Server Error")
+            return False
+        # Discard any body the app did not read so the next request starts at its request line
+        while not state['body_done']:
+            await receive()
+        return state['keep_alive']
+
+    async def _write_simple(self, status, text):
+        try:
+            self.writer.write(f"HTTP/1.1 {status} {_reason(status)}\r\nContent-Type: text/plain\r\n"
+                              f"Content-Length: {len(text)}\r\nConnection: close\r\n\r\n".encode('latin-1') + text)
+            await self.writer.drain()
+        except ConnectionError:
+            pass
+
+def _reason(status):
+    try:
+        return HTTPStatus(status).phrase
+    except ValueError:
+        return ''
+
+async def serve(asgi_app, host='0.0.0.0', port=6000, keep_alive_timeout=75):
+    """Serve asgi_app until SIGINT/SIGTERM, running its startup/shutdown around the server"""
+    await asgi_app.startup()
+    server = await asyncio.start_server(
+        lambda reader, writer: ASGIConnection(asgi_app, reader, writer, keep_alive_timeout).serve(),
+        host, port, backlog=2048, limit=READ_SIZE)
+    logger.info(f"ASGI front end listening on {host}:{port}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    async with server:
+        await stop.wait()
+    await asgi_app.shutdown()
+    logger.info("ASGI front end stopped")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Asyncio front end for the CP-ABE API (also served by "
+                                                 "any ASGI server as asgi:app)")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=6000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Process pool size")
+    parser.add_argument("--max-pending", type=int, default=0,
+                        help="Requests handed to the pool at once (0: four per worker)")
+    parser.add_argument("--max-batches", type=int, default=0,
+                        help="Batch requests served at once by the front end (0: four)")
+    parser.add_argument("--keep-alive-timeout", type=float, default=75)
+    parser.add_argument("--log-level", default="INFO")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level.upper())
+    app = CPABEAsgiApp(workers=args.workers, max_pending=args.max_pending, max_batches=args.max_batches)
+    asyncio.run(serve(app, args.host, args.port, args.keep_alive_timeout))
@@ -0,0 +1,3167 @@
+import base64
+import binascii
+from charm.toolbox.pairinggroup import PairingGroup, ZR, G2, GT, pair
+from charm.toolbox.secretutil import SecretUtil
+from charm.toolbox.node import OpType
+from charm.schemes.abenc.abenc_bsw07 import CPabe_BSW07
+from Crypto.Cipher import AES, ChaCha20_Poly1305
+from Crypto.Random import get_random_bytes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.backends import default_backend
+from cryptography.exceptions import InvalidTag
+try:
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCMSIV
+except ImportError:  # cryptography < 42
+    AESGCMSIV = None
+import logging
+import json
+import hashlib
+import time
+import os
+import re
+import threading
+import struct
+import tempfile
+import multiprocessing
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from collections.abc import Mapping
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+class LRUCache:
+    """Thread-safe bounded LRU mapping with hit/miss counters"""
+    def __init__(self, max_size=1024):
+        if max_size <= 0:
+            raise ValueError("Cache size must be positive")
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                _, evicted = self._data.popitem(last=False)
+                self.evictions += 1
+                self._on_evict(evicted)
+
+    def _on_evict(self, value):
+        """Hook called with each value dropped by the LRU policy"""
+        pass
+
+    def items(self):
+        with self._lock:
+            return list(self._data.items())
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def stats(self):
+        """Return size and hit/miss counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0
+            }
+
+class SessionKeyCache(LRUCache):
+    """Memory-bounded LRU+TTL cache of derived AES keys, zeroized on eviction"""
+    # Approximate bytes per entry: fingerprint/digest key tuple, key buffer and bookkeeping
+    ENTRY_OVERHEAD = 320
+
+    def __init__(self, max_bytes=1024 * 1024, ttl=300):
+        if ttl <= 0:
+            raise ValueError("Session key TTL must be positive")
+        super().__init__(max(1, max_bytes // self.ENTRY_OVERHEAD))
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.expirations = 0
+
+    @staticmethod
+    def _zeroize(buf):
+        buf[:] = bytes(len(buf))
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires_at, buf = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self._zeroize(buf)
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return bytes(buf)
+
+    def put(self, key, value):
+        with self._lock:
+            previous = self._data.pop(key, None)
+            if previous is not None:
+                self._zeroize(previous[1])
+        super().put(key, (time.monotonic() + self.ttl, bytearray(value)))
+
+    def _on_evict(self, value):
+        self._zeroize(value[1])
+
+    def items(self):
+        raise TypeError("Session keys cannot be enumerated")
+
+    def clear(self):
+        with self._lock:
+            for _, buf in self._data.values():
+                self._zeroize(buf)
+            self._data.clear()
+
+    def stats(self):
+        stats = super().stats()
+        stats.update({"expirations": self.expirations, "ttl": self.ttl, "max_bytes": self.max_bytes})
+        return stats
+
+class EncryptionPool:
+    """Bounded pool of policy-independent encryption material, refilled by a background thread"""
+
+    def __init__(self, generate_header, generate_share, max_headers=64, min_headers=4,
+                 shares_per_header=8, refill_horizon=2.0):
+        self._generate_header = generate_header
+        self._generate_share = generate_share
+        self.max_headers = max_headers
+        self.min_headers = min(min_headers, max_headers)
+        self.shares_per_header = shares_per_header
+        # Seconds of encrypt traffic the pool tries to keep in stock
+        self.refill_horizon = refill_horizon
+        self.target = self.min_headers
+        self._headers = deque()
+        self._shares = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        # Bumped by clear() so material generated under old keys is dropped
+        self._epoch = 0
+        self._rate = 0.0
+        self._last_take = None
+        self.hits = 0
+        self.misses = 0
+        self.share_hits = 0
+        self.share_misses = 0
+        self.generated = 0
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="cpabe-encryption-pool", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        with self._cond:
+            thread, self._thread = self._thread, None
+            self._stopping = True
+            self._cond.notify_all()
+        if thread is not None:
+            thread.join(timeout)
+
+    def clear(self):
+        with self._cond:
+            self._epoch += 1
+            self._headers.clear()
+            self._shares.clear()
+            self._cond.notify_all()
+
+    def _share_target(self):
+        return self.target * self.shares_per_header
+
+    def _record_take(self):
+        # Exponentially weighted encrypt rate drives how deep the pool is kept
+        now = time.monotonic()
+        if self._last_take is not None:
+            elapsed = max(now - self._last_take, 1e-6)
+            self._rate = 0.8 * self._rate + 0.2 / elapsed
+        self._last_take = now
+        self.target = max(self.min_headers, min(self.max_headers, int(self._rate * self.refill_horizon) + 1))
+
+    def take_header(self):
+        """Pop one precomputed header tuple, or None when the pool is empty"""
+        with self._cond:
+            self._record_take()
+            item = self._headers.popleft() if self._headers else None
+            if item is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            self._cond.notify()
+        return item
+
+    def take_share(self):
+        """Pop one precomputed share tuple, or None when the pool is empty"""
+        with self._cond:
+            item = self._shares.popleft() if self._shares else None
+            if item is None:
+                self.share_misses += 1
+            else:
+                self.share_hits += 1
+            self._cond.notify()
+        return item
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while (not self._stopping and len(self._headers) >= self.target
+                       and len(self._shares) >= self._share_target()):
+                    self._cond.wait()
+                if self._stopping:
+                    return
+                epoch = self._epoch
+                need_header = len(self._headers) < self.target
+
+            # Exponentiations run outside the lock so takers are never blocked on them
+            try:
+                item = self._generate_header() if need_header else self._generate_share()
+            except Exception as e:
+                logger.error(f"Encryption pool refill failed: {str(e)}")
+                with self._cond:
+                    self._cond.wait(1.0)
+                continue
+
+            with self._cond:
+                if epoch == self._epoch:
+                    (self._headers if need_header else self._shares).append(item)
+                    self.generated += 1
+
+    def __len__(self):
+        return len(self._headers)
+
+    def stats(self):
+        with self._cond:
+            takes = self.hits + self.misses
+            return {
+                "depth": len(self._headers),
+                "share_depth": len(self._shares),
+                "target": self.target,
+                "max_size": self.max_headers,
+                "encrypt_rate": self._rate,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / takes if takes else 0.0,
+                "share_hits": self.share_hits,
+                "share_misses": self.share_misses,
+                "generated": self.generated,
+            }
+
+class EncapsulationSession:
+    """One CP-ABE header shared by many payloads encrypted under the same policy"""
+
+    def __init__(self, scheme, root_key, header_fields, lifetime=300, max_messages=4096, binary=False,
+                 data_cipher=None):
+        self._scheme = scheme
+        self._root_key = bytearray(root_key)
+        # cpabe_cipher/key_wrap/policy (plus xor_key) copied into every envelope of the session
+        self.header_fields = header_fields
+        self.data_cipher = scheme.get_data_cipher(data_cipher)
+        self.policy = header_fields['policy']
+        self.expires_at = time.monotonic() + lifetime
+        self.max_messages = max_messages
+        self.messages = 0
+        # Emit binary envelopes (see CPABEScheme.pack_envelope) instead of JSON dicts
+        self.binary = binary
+        self._lock = threading.Lock()
+
+    @property
+    def active(self):
+        return (self._root_key is not None and self.messages < self.max_messages
+                and time.monotonic() < self.expires_at)
+
+    def _next_counter(self):
+        with self._lock:
+            if self._root_key is None:
+                raise RuntimeError("Encapsulation session is closed")
+            if time.monotonic() >= self.expires_at:
+                raise RuntimeError("Encapsulation session expired")
+            if self.messages >= self.max_messages:
+                raise RuntimeError("Encapsulation session reached its message limit")
+            counter = self.messages
+            self.messages += 1
+            return counter, bytes(self._root_key)
+
+    def encrypt(self, plaintext_bytes):
+        """Encrypt one payload under its own key derived from the session root and a fresh counter"""
+        if not isinstance(plaintext_bytes, bytes):
+            raise ValueError("Data must be bytes")
+        if len(plaintext_bytes) > self._scheme.MAX_PLAINTEXT_SIZE:
+            raise ValueError(f"Data size exceeds maximum limit of {self._scheme.MAX_PLAINTEXT_SIZE} bytes")
+
+        counter, root_key = self._next_counter()
+        aes_key = self._scheme.derive_payload_key(root_key, counter)
+        # The counter never repeats within a session, so neither does the nonce
+        nonce = counter.to_bytes(self.data_cipher.NONCE_SIZE, 'big')
+        cipher = self.data_cipher.new(aes_key, nonce)
+        ciphertext, tag = cipher.encrypt_and_digest(plaintext_bytes)
+        if self.binary:
+            return self._scheme.pack_envelope(self.header_fields, nonce, ciphertext, tag, session_counter=counter,
+                                              data_cipher=self.data_cipher.NAME)
+        return {
+            "nonce": base64.b64encode(nonce).decode('utf-8'),
+            "ciphertext": base64.b64encode(ciphertext).decode('utf-8'),
+            "tag": base64.b64encode(tag).decode('utf-8'),
+            "data_cipher": self.data_cipher.NAME,
+            **self.header_fields,
+            "session_counter": counter
+        }
+
+    def close(self):
+        with self._lock:
+            if self._root_key is not None:
+                SessionKeyCache._zeroize(self._root_key)
+                self._root_key = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+class RecordLogWriter:
+    """Append-only log of AES-GCM records under one CP-ABE header; appending costs no pairing"""
+
+    def __init__(self, scheme, root_key, log_id, header, next_index=0, size=None):
+        self._scheme = scheme
+        self._root_key = bytearray(root_key)
+        # Random salt of the per-record keys, stored in the log header
+        self.log_id = log_id
+        # Bytes the log object starts with; write them before the first record
+        self.header = header
+        self.next_index = next_index
+        # Length of the log object once every frame returned so far has been written
+        self.size = len(header) if size is None else size
+        self._lock = threading.Lock()
+
+    @property
+    def active(self):
+        return self._root_key is not None
+
+    def append(self, record):
+        """Seal one record under its own derived key; returns the frame to append to the log object"""
+        if not isinstance(record, bytes):
+            raise ValueError("Data must be bytes")
+        if len(record) > self._scheme.MAX_PLAINTEXT_SIZE:
+            raise ValueError(f"Data size exceeds maximum limit of {self._scheme.MAX_PLAINTEXT_SIZE} bytes")
+
+        # Sealing under the lock keeps frames in index order for concurrent appenders
+        with self._lock:
+            if self._root_key is None:
+                raise RuntimeError("Record log writer is closed")
+            if self.next_index >= 2 ** 64:
+                raise RuntimeError("Record log reached its record limit")
+            frame = self._scheme._seal_record(bytes(self._root_key), self.log_id, self.next_index, record)
+            self.next_index += 1
+            self.size += len(frame)
+            return frame
+
+    def close(self):
+        with self._lock:
+            if self._root_key is not None:
+                SessionKeyCache._zeroize(self._root_key)
+                self._root_key = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+class BinaryReader:
+    """Cursor over a length-prefixed binary envelope"""
+    __slots__ = ('view', 'offset')
+
+    def __init__(self, data):
+        self.view = memoryview(data)
+        self.offset = 0
+
+    def take(self, size):
+        end = self.offset + size
+        if end > len(self.view):
+            raise ValueError("Truncated binary envelope")
+        chunk = self.view[self.offset:end]
+        self.offset = end
+        return chunk
+
+    def unpack(self, fmt):
+        return struct.unpack(fmt, self.take(struct.calcsize(fmt)))
+
+    def prefixed(self, fmt='>H'):
+        (size,) = self.unpack(fmt)
+        return self.take(size)
+
+    def rest(self):
+        chunk = self.view[self.offset:]
+        self.offset = len(self.view)
+        return chunk
+
+class SchemaCodec:
+    """Schema-driven codec for the JSON ciphertext header and secret key formats"""
+    ELEMENT = 'element'
+    ELEMENT_MAP = 'element_map'
+    STRING = 'string'
+    # Field layouts of serialize_cpabe_cipher and keygen output
+    CIPHER_SCHEMA = {'C_tilde': ELEMENT, 'C': ELEMENT, 'Cy': ELEMENT_MAP, 'Cyp': ELEMENT_MAP,
+                     'policy': STRING, 'attributes': STRING}
+    SECRET_KEY_SCHEMA = {'D': ELEMENT, 'Dj': ELEMENT_MAP, 'Djp': ELEMENT_MAP, 'S': STRING}
+
+    def __init__(self, group):
+        self.group = group
+
+    def encode_element(self, element):
+        # Charm's serialize already yields b"<type>:<base64>"; the wire format base64-encodes it once more
+        return base64.b64encode(self.group.serialize(element)).decode('ascii')
+
+    def decode_element(self, value):
+        if not isinstance(value, str):
+            raise ValueError(f"Expected a base64 group element, got {type(value).__name__}")
+        # Restore padding arithmetically; a2b_base64 skips stray whitespace itself
+        element = self.group.deserialize(binascii.a2b_base64(value + '=' * (-len(value) % 4)))
+        if element is None:
+            raise ValueError("Invalid serialized group element")
+        return element
+
+    def encode(self, schema, components):
+        serialized = {}
+        for key, value in components.items():
+            if value is None:
+                continue
+            kind = schema.get(key, self.STRING)
+            if kind == self.ELEMENT:
+                serialized[key] = self.encode_element(value)
+            elif kind == self.ELEMENT_MAP:
+                serialized[key] = {sub_k: self.encode_element(sub_v) for sub_k, sub_v in value.items()
+                                   if sub_v is not None}
+            else:
+                serialized[key] = str(value)
+        return serialized
+
+    def decode(self, schema, serialized):
+        """Decode by schema; element maps come back as LazyElementMap, unknown fields are kept as-is"""
+        components = {}
+        for key, value in serialized.items():
+            if value is None:
+                continue
+            kind = schema.get(key)
+            if kind == self.ELEMENT:
+                components[key] = self.decode_element(value)
+            elif kind == self.ELEMENT_MAP:
+                if not isinstance(value, dict):
+                    raise ValueError(f"Component '{key}' must be a mapping")
+                components[key] = LazyElementMap({sub_k: sub_v for sub_k, sub_v in value.items() if sub_v is not None},
+                                                 self.decode_element)
+            elif kind == self.STRING:
+                components[key] = str(value)
+            else:
+                components[key] = value
+        return components
+
+class ChunkReader:
+    """Exact-size reads over a file object or an iterable of byte chunks, buffering at most one read ahead"""
+
+    def __init__(self, source, read_size=64 * 1024):
+        if hasattr(source, 'read'):
+            self._pieces = iter(lambda: source.read(read_size), b'')
+        else:
+            self._pieces = iter(source)
+        self._buffer = bytearray()
+        self._eof = False
+
+    def _fill(self, size):
+        while len(self._buffer) < size and not self._eof:
+            piece = next(self._pieces, None)
+            if piece is None:
+                self._eof = True
+            else:
+                self._buffer += piece
+
+    def has(self, size):
+        """True if at least size more bytes are available"""
+        self._fill(size)
+        return len(self._buffer) >= size
+
+    def peek(self, size):
+        """Up to size bytes without consuming them"""
+        self._fill(size)
+        return bytes(self._buffer[:size])
+
+    def read(self, size):
+        """Up to size bytes; fewer only at the end of the source"""
+        self._fill(size)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def read_exact(self, size):
+        data = self.read(size)
+        if len(data) != size:
+            raise ValueError("Truncated encrypted stream")
+        return data
+
+    def chunks(self, size):
+        """Split the remaining source into size-byte chunks, the last one possibly shorter"""
+        while self.has(1):
+            yield self.read(size)
+
+class CompiledPolicy:
+    """Normalized, parsed access policy reused across encryptions"""
+    __slots__ = ('normalized', 'tree', 'expression', 'leaves', 'attribute_ids', 'interned', 'coefficients')
+
+    def __init__(self, normalized, tree, expression, leaves, attribute_ids, interned=True):
+        # Canonical policy string with explicit grouping, handed to Charm
+        self.normalized = normalized
+        # Charm BinNode tree with duplicate attributes already labelled
+        self.tree = tree
+        # ('ATTR', id) / ('AND', children) / ('OR', children) over interned ids, or names if not interned
+        self.expression = expression
+        # Leaf names (attribute plus duplicate index) in Charm's order
+        self.leaves = leaves
+        self.attribute_ids = attribute_ids
+        # False for policies read from ciphertext headers, whose expression and attribute_ids hold
+        # attribute names: interning names from untrusted input would grow the id table without bound
+        self.interned = interned
+        # Lagrange coefficients per leaf, computed on first decryption
+        self.coefficients = None
+
+    def __repr__(self):
+        return f"CompiledPolicy({self.normalized!r})"
+
+class LazyElementMap(Mapping):
+    """Read-only mapping of serialized group elements, deserialized on first access"""
+    __slots__ = ('_raw', '_elements', '_deserialize')
+
+    def __init__(self, raw, deserialize):
+        # Serialized values stay as they arrived until a leaf is actually used
+        self._raw = raw
+        self._elements = {}
+        self._deserialize = deserialize
+
+    def __getitem__(self, key):
+        try:
+            return self._elements[key]
+        except KeyError:
+            pass
+        element = self._deserialize(self._raw[key])
+        self._elements[key] = element
+        return element
+
+    def __contains__(self, key):
+        return key in self._raw
+
+    def __iter__(self):
+        return iter(self._raw)
+
+    def __len__(self):
+        return len(self._raw)
+
+    def decoded_count(self):
+        return len(self._elements)
+
+    def __repr__(self):
+        return f"LazyElementMap({len(self._elements)}/{len(self._raw)} decoded)"
+
+class KeyWrap(ABC):
+    """How the data key is bound to the GT element CP-ABE encrypts.
+
+    NAME identifies the wrap in JSON envelopes, MODE in the low nibble of the binary mode byte;
+    wraps that need per-envelope key material carry it in KEY_FIELD.
+    """
+    NAME = None
+    MODE = None
+    KEY_FIELD = None
+
+    @abstractmethod
+    def wrap(self, session_key_bytes):
+        """Return (data key, key material) for a serialized GT element"""
+
+    @abstractmethod
+    def unwrap(self, session_key_bytes, key_material):
+        """Return the data key from a serialized GT element and the envelope's key material"""
+
+class HKDFKeyWrap(KeyWrap):
+    """AES key derived from the GT element with HKDF-SHA256; no key material travels"""
+    NAME = 'hkdf'
+    MODE = 0x01
+    # The 'info' parameter MUST be identical during encryption and decryption
+    INFO = b'cpabe-hybrid-aes-key-derivation'
+
+    def _derive(self, session_key_bytes):
+        hkdf = HKDF(
+            algorithm=hashes.SHA256(),
+            length=32,
+            salt=None,
+            info=self.INFO,
+            backend=default_backend()
+        )
+        return hkdf.derive(session_key_bytes)
+
+    def wrap(self, session_key_bytes):
+        return self._derive(session_key_bytes), b''
+
+    def unwrap(self, session_key_bytes, key_material):
+        return self._derive(session_key_bytes)
+
+class XorKeyWrap(KeyWrap):
+    """Random AES key XORed with the first 32 bytes of the serialized GT element"""
+    NAME = 'xor'
+    MODE = 0x02
+    KEY_FIELD = 'xor_key'
+
+    def wrap(self, session_key_bytes):
+        if len(session_key_bytes) < 32:
+            raise ValueError("Insufficient key material length")
+        aes_key = get_random_bytes(32)
+        return aes_key, bytes(a ^ b for a, b in zip(aes_key, session_key_bytes[:32]))
+
+    def unwrap(self, session_key_bytes, key_material):
+        if len(session_key_bytes) < 32:
+            raise ValueError("Insufficient key material length")
+        if len(key_material) != 32:
+            raise ValueError("Invalid xor_key length")
+        return bytes(a ^ b for a, b in zip(key_material, session_key_bytes[:32]))
+
+class DataCipher(ABC):
+    """AEAD applied to payloads under the data key.
+
+    NAME identifies the cipher in JSON envelopes, ID in the high nibble of the binary mode byte.
+    new(key, nonce) returns an object with PyCryptodome's AEAD interface: encrypt/decrypt with an
+    optional output buffer, digest() and verify(tag).
+    """
+    NAME = None
+    ID = None
+    NONCE_SIZE = 12
+    TAG_SIZE = 16
+    # False when a payload must go through a single encrypt/decrypt call
+    INCREMENTAL = True
+
+    @abstractmethod
+    def new(self, key, nonce):
+        """Return an AEAD object for the data key and nonce"""
+
+class AESGCMCipher(DataCipher):
+    NAME = 'aes-256-gcm'
+    ID = 0x0
+
+    def new(self, key, nonce):
+        return AES.new(key, AES.MODE_GCM, nonce=nonce)
+
+class AESGCMSIVCipher(DataCipher):
+    """Nonce-misuse-resistant AES-GCM-SIV; two passes over the data, so not incremental"""
+    NAME = 'aes-256-gcm-siv'
+    ID = 0x1
+    INCREMENTAL = False
+
+    def new(self, key, nonce):
+        if AESGCMSIV is None:
+            raise ValueError("AES-GCM-SIV needs cryptography 42+ built against OpenSSL 3.2+")
+        return OneShotAEAD(AESGCMSIV(key), nonce, self.TAG_SIZE)
+
+class ChaCha20Poly1305Cipher(DataCipher):
+    NAME = 'chacha20-poly1305'
+    ID = 0x2
+
+    def new(self, key, nonce):
+        return ChaCha20_Poly1305.new(key=key, nonce=nonce)
+
+class OneShotAEAD:
+    """PyCryptodome-style AEAD interface over a one-shot cryptography AEAD.
+
+    encrypt and decrypt each take the whole payload; decrypt only writes plaintext once verify
+    has checked the tag.
+    """
+
+    def __init__(self, aead, nonce, tag_size):
+        self._aead = aead
+        self._nonce = nonce
+        self._tag_size = tag_size
+        self._tag = None
+        self._pending = None
+
+    def encrypt(self, plaintext, output=None):
+        sealed = self._aead.encrypt(self._nonce, bytes(plaintext), None)
+        self._tag = sealed[-self._tag_size:]
+        if output is None:
+            return sealed[:-self._tag_size]
+        memoryview(output)[:] = memoryview(sealed)[:-self._tag_size]
+
+    def digest(self):
+        return self._tag
+
+    def decrypt(self, ciphertext, output=None):
+        self._pending = (bytes(ciphertext), output)
+
+    def verify(self, tag):
+        ciphertext, output = self._pending
+        try:
+            plaintext = self._aead.decrypt(self._nonce, ciphertext + bytes(tag), None)
+        except InvalidTag:
+            raise ValueError("MAC check failed")
+        if output is not None:
+            memoryview(output)[:] = plaintext
+        return plaintext
+
+    def encrypt_and_digest(self, plaintext):
+        return self.encrypt(plaintext), self.digest()
+
+    def decrypt_and_verify(self, ciphertext, tag):
+        self.decrypt(ciphertext)
+        return self.verify(tag)
+
+# Registries of the strategies envelopes can name
+KEY_WRAPS = {wrap.NAME: wrap for wrap in (HKDFKeyWrap(), XorKeyWrap())}
+DATA_CIPHERS = {cipher.NAME: cipher for cipher in (AESGCMCipher(), AESGCMSIVCipher(), ChaCha20Poly1305Cipher())}
+
+class CPABEScheme:
+    POLICY_OPERATORS = ('AND', 'OR')
+    POLICY_TOKEN_RE = re.compile(r'\(|\)|[^\s()]+')
+    BASE64_INVALID_RE = re.compile(r'[^A-Za-z0-9+/=]')
+    # Base64 text handled per step by b64decode_buffer/b64encode_chunks (a multiple of 4 characters)
+    BASE64_CHUNK_SIZE = 64 * 1024
+    # Binary envelope layout version; the mode byte holds KeyWrap.MODE | DataCipher.ID << 4
+    ENVELOPE_VERSION = 1
+    ENVELOPE_FLAG_SESSION = 0x01
+    ENVELOPE_FLAG_STREAM = 0x02
+    ENVELOPE_FLAG_INDEX = 0x04
+    ENVELOPE_FLAG_LOG = 0x08
+    # Streamed objects: STREAM-style chunked AES-GCM, nonce = prefix || u32 chunk index || last-chunk flag
+    STREAM_CHUNK_SIZE = 64 * 1024
+    STREAM_NONCE_PREFIX_SIZE = 7
+    STREAM_TAG_SIZE = 16
+    STREAM_KEY_INFO = b'cpabe-stream-chunk-key'
+    # Seekable streams end in an index footer: u64 plaintext length, u32 chunk count, magic
+    STREAM_FOOTER = struct.Struct('>QI4s')
+    STREAM_FOOTER_MAGIC = b'CPIX'
+    # Segment size of encrypt_parallel; each segment is one task for the AEAD thread pool
+    PARALLEL_SEGMENT_SIZE = 1024 * 1024
+    # Record log frames: u64 record index, u32 ciphertext length, random nonce, then ciphertext and tag
+    LOG_FRAME = struct.Struct('>QI12s')
+    LOG_RECORD_INFO = b'cpabe-log-record-key'
+    # HKDF info for per-payload keys of an encapsulation session
+    SESSION_PAYLOAD_INFO = b'cpabe-session-payload-key'
+    # Envelope fields that, together with the secret key, determine the AES key
+    SESSION_KEY_FIELDS = ('cpabe_cipher', 'key_wrap', 'xor_key')
+    MAX_PLAINTEXT_SIZE = 1024 * 1024 * 10  # 10MB limit
+    # Random stamp written into both key files by save_keys; load_keys only pairs files that match
+    KEY_STAMP_FIELD = '_stamp'
+    # Items encrypt_batch holds while earlier items wait for their policy group's header, and keys
+    # keygen_batch has in flight
+    BATCH_WINDOW = 256
+
+    def __init__(self, precompute=True, attribute_hash_cache_size=1024, policy_cache_size=256,
+                 session_key_cache_bytes=0, session_key_cache_ttl=300, secret_key_cache_size=64,
+                 pairing_product=True, encryption_pool_size=0, aead_workers=0,
+                 key_wrap='hkdf', data_cipher='aes-256-gcm', keys_dir=None, batch_workers=0):
+        try:
+            # Initialize with SS512 curve
+            self.group = PairingGroup('SS512')
+            logger.debug("PairingGroup initialized successfully")
+            self.cpabe = CPabe_BSW07(self.group)
+            self.codec = SchemaCodec(self.group)
+            self.util = SecretUtil(self.group, verbose=False)
+            logger.debug("CPabe_BSW07 scheme initialized")
+            self.public_key = None
+            self.master_key = None
+            # mtime/size of the key files the current keys were loaded from or saved to
+            self._keys_signature = None
+            # Build fixed-base exponentiation tables once keys are available
+            self.precompute = precompute
+            # Evaluate decryption as one product of pairings with a shared final exponentiation
+            self.pairing_product = pairing_product
+            # Memoized group.hash(attr, G2) results for the attribute universe
+            self.attribute_hash_cache = LRUCache(attribute_hash_cache_size)
+            self._attribute_hashes_dirty = False
+            # Compiled policies keyed by the caller's policy string
+            self.policy_cache = LRUCache(policy_cache_size)
+            # Policies read back from ciphertext headers, compiled exactly as Charm parses them
+            self.header_policy_cache = LRUCache(policy_cache_size)
+            self._policy_lock = threading.Lock()
+            self._attribute_ids = {}
+            # Deserialized secret keys keyed by the fingerprint of their serialized form
+            self.secret_key_cache = LRUCache(secret_key_cache_size) if secret_key_cache_size else None
+            # Opt-in cache of AES keys recovered by decrypt_data
+            self.session_key_cache = None
+            if session_key_cache_bytes:
+                self.session_key_cache = SessionKeyCache(session_key_cache_bytes, session_key_cache_ttl)
+            # Opt-in background pool of precomputed, policy-independent encryption material
+            self.encryption_pool_size = encryption_pool_size
+            self.encryption_pool = None
+            # Threads sealing segments in encrypt_parallel/decrypt_parallel (0: one per CPU)
+            self.aead_workers = aead_workers or os.cpu_count() or 1
+            self._aead_executor = None
+            self._aead_lock = threading.Lock()
+            # Processes holding the keys for pairing work of batch operations (0: one per CPU, 1: in-process)
+            self.batch_workers = batch_workers or os.cpu_count() or 1
+            self._batch_executor = None
+            self._batch_lock = threading.Lock()
+            # Defaults for calls that do not pick a key wrap or data cipher themselves
+            self.key_wrap = self.get_key_wrap(key_wrap).NAME
+            self.data_cipher = self.get_data_cipher(data_cipher).NAME
+            
+            # Setup keys directory and file paths
+            self.KEYS_DIR = keys_dir or os.path.join(os.path.dirname(os.path.abspath(__file__)), "keys")
+            if not os.path.exists(self.KEYS_DIR):
+                os.makedirs(self.KEYS_DIR)
+                logger.debug(f"Created keys directory: {self.KEYS_DIR}")
+            
+            # Define key file paths
+            self.PUBLIC_KEY_FILE = os.path.join(self.KEYS_DIR, "public_key.pem")
+            self.MASTER_KEY_FILE = os.path.join(self.KEYS_DIR, "master_key.pem")
+            self.ATTRIBUTE_HASH_FILE = os.path.join(self.KEYS_DIR, "attribute_hashes.json")
+            # Constructor options a batch pool process needs to rebuild this scheme from the key files
+            self._batch_options = {
+                "precompute": precompute, "pairing_product": pairing_product,
+                "attribute_hash_cache_size": attribute_hash_cache_size, "policy_cache_size": policy_cache_size,
+                "secret_key_cache_size": secret_key_cache_size, "key_wrap": self.key_wrap,
+                "data_cipher": self.data_cipher, "keys_dir": self.KEYS_DIR, "batch_workers": 1,
+            }
+            
+        except Exception as e:
+            logger.error(f"Initialization error: {str(e)}")
+            raise
+
+    def get_key_wrap(self, name=None):
+        """KeyWrap registered under name, or the scheme default"""
+        wrap = KEY_WRAPS.get(name or self.key_wrap)
+        if wrap is None:
+            raise ValueError(f"Unknown key wrap: {name}. Choose from {sorted(KEY_WRAPS)}")
+        return wrap
+
+    def get_data_cipher(self, name=None):
+        """DataCipher registered under name, or the scheme default"""
+        cipher = DATA_CIPHERS.get(name or self.data_cipher)
+        if cipher is None:
+            raise ValueError(f"Unknown data cipher: {name}. Choose from {sorted(DATA_CIPHERS)}")
+        return cipher
+
+    def envelope_key_wrap(self, fields):
+        """KeyWrap an envelope or header was written with; envelopes predating the
+        key_wrap field are told apart by their xor_key"""
+        name = fields.get('key_wrap') or ('xor' if 'xor_key' in fields else 'hkdf')
+        return self.get_key_wrap(name)
+
+    def _to_pem_format(self, key_type, key_data):
+        """Convert key data to PEM format"""
+        # Convert dictionary to JSON and encode to base64
+        key_json = json.dumps(key_data, sort_keys=True)
+        key_b64 = base64.b64encode(key_json.encode()).decode()
+        
+        # Split into 64-character lines
+        lines = [key_b64[i:i+64] for i in range(0, len(key_b64), 64)]
+        
+        # Create PEM format
+        pem_lines = [
+            f"-----BEGIN {key_type} KEY-----",
+            *lines,
+            f"-----END {key_type} KEY-----"
+        ]
+        return "\n".join(pem_lines)
+
+    def _from_pem_format(self, pem_data):
+        """Extract key data from PEM format"""
+        try:
+            # Remove header and footer
+            lines = pem_data.strip().split('\n')
+            if len(lines) < 3:
+                raise ValueError("Invalid PEM format")
+                
+            # Extract base64 content
+            content = ''.join(lines[1:-1])
+            
+            # Decode base64 and parse JSON
+            json_data = base64.b64decode(content).decode()
+            return json.loads(json_data)
+        except Exception as e:
+            logger.error(f"Failed to parse PEM data: {str(e)}")
+            return None
+
+    def serialize_key_element(self, element):
+        """Serialize a single key element to base64"""
+        try:
+            if hasattr(element, 'initPP'):  # Check if it's a pairing element
+                element_bytes = self.group.serialize(element)
+                return base64.b64encode(element_bytes).decode('utf-8')
+            return str(element)
+        except Exception as e:
+            logger.error(f"Failed to serialize key element: {str(e)}")
+            return None
+
+    def deserialize_key_element(self, element_str):
+        """Deserialize a single key element from base64"""
+        try:
+            # Special handling for 'S' field which should remain as string
+            if isinstance(element_str, str) and element_str.startswith('[') and element_str.endswith(']'):
+                return element_str
+            
+            # For base64 encoded elements
+            if isinstance(element_str, str):
+                try:
+                    element_bytes = base64.b64decode(element_str)
+                    return self.group.deserialize(element_bytes)
+                except Exception as e:
+                    logger.debug(f"Not a serialized group element, returning as is: {str(e)}")
+                    return element_str
+        
+            # For numeric values, convert to string to maintain consistency
+            if isinstance(element_str, (int, float)):
+                return str(element_str)
+            
+            return element_str
+        except Exception as e:
+            logger.error(f"Failed to deserialize element: {str(e)}")
+            return None
+
+    def _replace_file(self, path, text):
+        """Write text to path atomically: readers see either the old file or the complete new one"""
+        directory = os.path.dirname(path)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path) + '.')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(text)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, path)
+        except BaseException:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            raise
+
+    def save_keys(self):
+        """Save public key and master key to separate PEM files"""
+        try:
+            if not self.public_key or not self.master_key:
+                logger.error("Keys not initialized")
+                return False
+
+            # Ensure keys directory exists
+            os.makedirs(self.KEYS_DIR, exist_ok=True)
+
+            # Serialize public key components
+            pk_data = {}
+            for k, v in self.public_key.items():
+                serialized = self.serialize_key_element(v)
+                if serialized:
+                    pk_data[k] = serialized
+
+            # Serialize master key components
+            mk_data = {}
+            for k, v in self.master_key.items():
+                serialized = self.serialize_key_element(v)
+                if serialized:
+                    mk_data[k] = serialized
+
+            # Both files carry the same stamp, so a reader never pairs keys from different setups
+            stamp = get_random_bytes(16).hex()
+            pk_data[self.KEY_STAMP_FIELD] = stamp
+            mk_data[self.KEY_STAMP_FIELD] = stamp
+
+            # Convert to PEM format and save
+            public_pem = self._to_pem_format("CP-ABE PUBLIC", pk_data)
+            master_pem = self._to_pem_format("CP-ABE MASTER", mk_data)
+
+            # Other processes reload on any change to the files, so each is replaced whole
+            self._replace_file(self.MASTER_KEY_FILE, master_pem)
+            self._replace_file(self.PUBLIC_KEY_FILE, public_pem)
+            self.save_attribute_hashes()
+            self._keys_signature = self._key_files_signature()
+
+            logger.debug(f"Keys saved successfully to {self.KEYS_DIR}")
+            return True
+
+        except Exception as e:
+            logger.error(f"Failed to save keys: {str(e)}")
+            return False
+
+    def load_keys(self):
+        """Load public key and master key from PEM files"""
+        try:
+            if not os.path.exists(self.PUBLIC_KEY_FILE) or not os.path.exists(self.MASTER_KEY_FILE):
+                if self.public_key:
+                    # A reload must never replace the keys in use with a fresh setup
+                    logger.error("Key files not found, keeping the current keys")
+                    return False
+                logger.debug("Key files not found, running setup")
+                return self.setup()
+
+            # Read PEM files
+            signature = self._key_files_signature()
+            with open(self.PUBLIC_KEY_FILE, 'r') as f:
+                public_pem = f.read()
+            with open(self.MASTER_KEY_FILE, 'r') as f:
+                master_pem = f.read()
+
+            # Parse PEM data
+            pk_data = self._from_pem_format(public_pem)
+            mk_data = self._from_pem_format(master_pem)
+
+            if not pk_data or not mk_data:
+                logger.error("Failed to parse key files")
+                return False
+            # Files saved before stamps existed have none on either side
+            if pk_data.pop(self.KEY_STAMP_FIELD, None) != mk_data.pop(self.KEY_STAMP_FIELD, None):
+                logger.error("Public and master key files come from different setups")
+                return False
+
+            # Deserialize public key
+            pk = {}
+            for k, v in pk_data.items():
+                pk[k] = self.deserialize_key_element(v)
+
+            # Deserialize master key
+            mk = {}
+            for k, v in mk_data.items():
+                mk[k] = self.deserialize_key_element(v)
+
+            # Set the keys
+            self.public_key = pk
+            self.master_key = mk
+            self._keys_signature = signature
+            self.precompute_tables()
+            self.load_attribute_hashes()
+            self.start_encryption_pool()
+
+            logger.debug("Keys loaded successfully")
+            return True
+
+        except Exception as e:
+            logger.error(f"Failed to load keys: {str(e)}")
+            return False
+
+    def _key_files_signature(self):
+        try:
+            return tuple((st.st_mtime_ns, st.st_size)
+                         for st in map(os.stat, (self.PUBLIC_KEY_FILE, self.MASTER_KEY_FILE)))
+        except OSError:
+            return None
+
+    def reload_keys_if_changed(self):
+        """Reload the keys if another process replaced the key files since they were loaded"""
+        signature = self._key_files_signature()
+        if signature is None or signature == self._keys_signature:
+            return False
+        logger.debug("Key files changed on disk, reloading keys")
+        return self.load_keys()
+
+    def precompute_tables(self):
+        """Build fixed-base exponentiation tables for public and master key elements"""
+        if not self.precompute:
+            return 0
+
+        # The bases never change between key rotations, so every later
+        # keygen/encrypt exponentiation reuses these tables through Charm's pow
+        count = 0
+        for key_name, key in (("public", self.public_key), ("master", self.master_key)):
+            if not key:
+                continue
+            for k, v in key.items():
+                if not hasattr(v, 'initPP') or getattr(v, 'preproc', 0):
+                    continue
+                try:
+                    # initPP returns False for ZR elements, which have no table
+                    if v.initPP():
+                        count += 1
+                except Exception as e:
+                    logger.warning(f"Failed to precompute table for {key_name} key element '{k}': {str(e)}")
+        logger.debug(f"Precomputed fixed-base tables for {count} key elements")
+        return count
+
+    def hash_attribute(self, attr):
+        """Hash a normalized attribute into G2, memoized in the attribute hash cache"""
+        element = self.attribute_hash_cache.get(attr)
+        if element is None:
+            element = self.group.hash(attr, G2)
+            if self.precompute:
+                # Hashed attributes are exponentiated on every keygen/encrypt
+                element.initPP()
+            self.attribute_hash_cache.put(attr, element)
+            self._attribute_hashes_dirty = True
+        return element
+
+    def attribute_hash_cache_stats(self):
+        """Return hit/miss counters of the attribute hash cache"""
+        return self.attribute_hash_cache.stats()
+
+    def save_attribute_hashes(self):
+        """Persist the attribute hash cache to the keys directory"""
+        try:
+            hashes = {}
+            for attr, element in self.attribute_hash_cache.items():
+                serialized = self.serialize_key_element(element)
+                if serialized:
+                    hashes[attr] = serialized
+
+            os.makedirs(self.KEYS_DIR, exist_ok=True)
+            self._replace_file(self.ATTRIBUTE_HASH_FILE,
+                               json.dumps({"group": "SS512", "hashes": hashes}, sort_keys=True))
+
+            self._attribute_hashes_dirty = False
+            logger.debug(f"Saved {len(hashes)} attribute hashes to {self.ATTRIBUTE_HASH_FILE}")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to save attribute hashes: {str(e)}")
+            return False
+
+    def load_attribute_hashes(self):
+        """Preload the attribute hash cache from the keys directory"""
+        try:
+            if not os.path.exists(self.ATTRIBUTE_HASH_FILE):
+                return 0
+
+            with open(self.ATTRIBUTE_HASH_FILE, 'r') as f:
+                data = json.load(f)
+
+            # Hashes depend only on the curve, not on the keys
+            if data.get("group") != "SS512":
+                logger.warning("Attribute hash file was built for a different group, ignoring it")
+                return 0
+
+            count = 0
+            for attr, serialized in data.get("hashes", {}).items():
+                if count >= self.attribute_hash_cache.max_size:
+                    break
+                element = self.deserialize_key_element(serialized)
+                if not hasattr(element, 'initPP'):
+                    logger.warning(f"Skipping invalid attribute hash for '{attr}'")
+                    continue
+                if self.precompute and not getattr(element, 'preproc', 0):
+                    element.initPP()
+                self.attribute_hash_cache.put(attr, element)
+                count += 1
+
+            logger.debug(f"Preloaded {count} attribute hashes")
+            return count
+        except Exception as e:
+            logger.error(f"Failed to load attribute hashes: {str(e)}")
+            return 0
+
+    def setup(self):
+        try:
+            logger.debug("Starting setup...")
+            (pk, mk) = self.cpabe.setup()
+            if pk and mk:
+                self.public_key = pk
+                self.master_key = mk
+                self.precompute_tables()
+                self.start_encryption_pool()
+                # Save keys after successful setup
+                if self.save_keys():
+                    logger.debug("Setup completed and keys saved successfully")
+                    return True
+                else:
+                    logger.error("Setup completed but failed to save keys")
+                    return False
+            else:
+                logger.error("Setup failed: public key or master key is None")
+                return False
+        except Exception as e:
+            logger.error(f"Setup failed with error: {str(e)}")
+            return False
+
+    def normalize_attribute(self, attr):
+        """Helper function to normalize attribute names"""
+        if not attr:
+            return None
+        # Convert to uppercase and replace spaces/special chars
+        return attr.strip().upper().replace(" ", "_")
+
+    def clean_base64(self, s):
+        """Clean and normalize base64 string"""
+        try:
+            if not isinstance(s, str):
+                return None
+            # Remove whitespace, newlines and any other non-base64 characters in one pass
+            return self.BASE64_INVALID_RE.sub('', s)
+        except Exception as e:
+            logger.error(f"Failed to clean base64 string: {str(e)}")
+            return None
+
+    def pad_base64(self, s):
+        """Helper function to ensure base64 string is properly padded"""
+        try:
+            if not isinstance(s, str):
+                return None
+            # Clean the string first
+            s = self.clean_base64(s)
+            if not s:
+                return None
+            # Remove any existing padding
+            s = s.rstrip('=')
+            # Add proper padding
+            mod = len(s) % 4
+            if mod:
+                s += '=' * (4 - mod)
+            return s
+        except Exception as e:
+            logger.error(f"Failed to pad base64 string: {str(e)}")
+            return None
+
+    def serialize_element(self, element):
+        """Helper function to safely serialize group elements"""
+        try:
+            if element is None:
+                return None
+
+            # Handle pairing elements
+            if hasattr(element, 'initPP'):
+                try:
+                    serialized = self.group.serialize(element)
+                    if not serialized:
+                        logger.error("Failed to serialize pairing element")
+                        return None
+                    encoded = base64.b64encode(serialized)
+                    return encoded.decode('utf-8')
+                except Exception as e:
+                    logger.error(f"Failed to serialize pairing element: {str(e)}")
+                    return None
+
+            # Handle bytes
+            if isinstance(element, bytes):
+                try:
+                    encoded = base64.b64encode(element)
+                    return encoded.decode('utf-8')
+                except Exception as e:
+                    logger.error(f"Failed to encode bytes: {str(e)}")
+                    return None
+
+            # Handle strings
+            if isinstance(element, str):
+                return element
+
+            # Handle other types
+            return str(element)
+
+        except Exception as e:
+            logger.error(f"Failed to serialize element: {str(e)}")
+            return None
+
+    def deserialize_element(self, element_str):
+        """Helper function to safely deserialize group elements"""
+        try:
+            if element_str is None:
+                return None
+
+            # Special handling for 'S' field which should remain as string
+            if isinstance(element_str, str) and element_str.startswith('[') and element_str.endswith(']'):
+                return element_str
+
+            # Handle numeric values (including lists of numbers)
+            if isinstance(element_str, (int, float, list)):
+                return element_str
+
+            # Handle string values
+            if isinstance(element_str, str):
+                try:
+                    # Clean and pad base64 string
+                    clean_str = self.pad_base64(element_str)
+                    if not clean_str:
+                        logger.debug("Invalid base64 string after cleaning")
+                        return element_str
+
+                    # Try to decode base64
+                    decoded = base64.b64decode(clean_str)
+                    if not decoded:
+                        logger.debug("Base64 decoding resulted in empty bytes")
+                        return element_str
+
+                    # Try to deserialize as a group element
+                    try:
+                        result = self.group.deserialize(decoded)
+                        if result is not None:
+                            return result
+                    except Exception as e:
+                        logger.debug(f"Group deserialization failed: {str(e)}")
+                        # If not a group element, return the original string
+                        return element_str
+
+                except Exception as e:
+                    logger.debug(f"Base64 decoding failed: {str(e)}")
+                    # If decoding fails, return the original string
+                    return element_str
+
+            return element_str
+
+        except Exception as e:
+            logger.error(f"Failed to deserialize element: {str(e)}")
+            return element_str
+
+    def serialize_cpabe_cipher(self, cpabe_cipher):
+        """Helper function to serialize CP-ABE ciphertext"""
+        try:
+            if not isinstance(cpabe_cipher, dict):
+                raise ValueError("CP-ABE cipher must be a dictionary")
+
+            serialized = self.codec.encode(SchemaCodec.CIPHER_SCHEMA, cpabe_cipher)
+
+            if not serialized:
+                raise ValueError("Failed to serialize any cipher components")
+
+            return serialized
+        except Exception as e:
+            logger.error(f"Failed to serialize CP-ABE cipher: {str(e)}")
+            raise
+
+    def deserialize_cpabe_cipher(self, serialized_cipher):
+        """Helper function to deserialize CP-ABE ciphertext"""
+        try:
+            if not isinstance(serialized_cipher, dict):
+                raise ValueError("Serialized cipher must be a dictionary")
+
+            # Per-leaf components (Cy, Cyp) are only decoded for the leaves decryption uses
+            deserialized = self.codec.decode(SchemaCodec.CIPHER_SCHEMA, serialized_cipher)
+
+            if not deserialized:
+                raise ValueError("Failed to deserialize any cipher components")
+
+            # Verify required components are present
+            required_components = {'C_tilde', 'C', 'Cy', 'Cyp', 'policy'}
+            missing = required_components - set(deserialized.keys())
+            if missing:
+                raise ValueError(f"Missing required cipher components: {missing}")
+
+            # Ensure policy is a string
+            if not isinstance(deserialized.get('policy'), str):
+                raise ValueError("Policy must be a string")
+
+            return deserialized
+        except Exception as e:
+            logger.error(f"Failed to deserialize CP-ABE cipher: {str(e)}")
+            raise
+
+    def keygen(self, attributes):
+        # Validate initialization
+        if not self.public_key or not self.master_key:
+            raise RuntimeError("CPABEScheme not initialized. Call setup() first")
+
+        # Validate attributes
+        if not attributes or not isinstance(attributes, list):
+            raise ValueError("Attributes must be a non-empty list")
+
+        try:
+            # Clean and normalize attributes
+            cleaned_attributes = []
+            for attr in attributes:
+                if isinstance(attr, str):
+                    normalized_attr = self.normalize_attribute(attr)
+                    if normalized_attr:
+                        cleaned_attributes.append(normalized_attr)
+                        logger.debug(f"Normalized attribute: {normalized_attr}")
+
+            if not cleaned_attributes:
+                raise ValueError("No valid attributes after cleaning")
+
+            # Log the attributes being used
+            logger.debug(f"Generating key for attributes: {cleaned_attributes}")
+
+            # Generate the secret key
+            try:
+                sk = self._bsw07_keygen(cleaned_attributes)
+                if not sk:
+                    raise ValueError("Key generation failed - empty key returned")
+                logger.debug(f"Generated key components: {list(sk.keys())}")
+            except Exception as e:
+                logger.error(f"Failed to generate key: {str(e)}")
+                raise ValueError(f"Key generation failed: {str(e)}")
+
+            # Validate key components
+            required_components = {'D', 'Dj', 'Djp'}
+            if not all(k in sk for k in required_components):
+                missing = required_components - set(sk.keys())
+                raise ValueError(f"Generated key missing required components: {missing}")
+
+            # Validate component types
+            if not isinstance(sk['D'], (bytes, object)) or not hasattr(sk['D'], 'initPP'):
+                raise ValueError("Invalid type for key component 'D'")
+            if not isinstance(sk['Dj'], dict):
+                raise ValueError("Invalid type for key component 'Dj'")
+            if not isinstance(sk['Djp'], dict):
+                raise ValueError("Invalid type for key component 'Djp'")
+            
+            # Serialize each component according to the secret key schema
+            serialized_sk = self.codec.encode(SchemaCodec.SECRET_KEY_SCHEMA, sk)
+
+            if not serialized_sk:
+                raise ValueError("Failed to serialize any key components")
+
+            # Validate serialized key components
+            if not all(k in serialized_sk for k in required_components):
+                missing = required_components - set(serialized_sk.keys())
+                raise ValueError(f"Serialized key missing required components: {missing}")
+
+            # Create the final key structure
+            result = {
+                "secret_key": serialized_sk
+            }
+
+            # Validate the final structure
+            if not isinstance(result["secret_key"], dict):
+                raise ValueError("Invalid secret key structure")
+
+            logger.debug("Key generation completed successfully")
+            logger.debug(f"Final key structure: secret_key components={list(serialized_sk.keys())}")
+            
+            return result
+
+        except Exception as e:
+            logger.error(f"Key generation failed: {str(e)}")
+            raise RuntimeError(f"Key generation failed: {str(e)}")
+
+    def _bsw07_keygen(self, attributes):
+        """BSW07 key generation using the memoized attribute hashes"""
+        pk, mk = self.public_key, self.master_key
+        r = self.group.random(ZR)
+        g_r = pk['g2'] ** r
+        D = (mk['g2_alpha'] * g_r) ** (1 / mk['beta'])
+        D_j, D_j_pr = {}, {}
+        for j in attributes:
+            r_j = self.group.random(ZR)
+            D_j[j] = g_r * (self.hash_attribute(j) ** r_j)
+            D_j_pr[j] = pk['g'] ** r_j
+        return {'D': D, 'Dj': D_j, 'Djp': D_j_pr, 'S': attributes}
+
+    def _bsw07_encrypt(self, msg, compiled_policy):
+        """BSW07 encryption of a GT element under a compiled policy"""
+        pk = self.public_key
+        s = self.group.random(ZR)
+        shares = self.util.calculateSharesDict(s, compiled_policy.tree)
+
+        C = pk['h'] ** s
+        C_y, C_y_pr = {}, {}
+        for i in shares.keys():
+            j = self.util.strip_index(i)
+            C_y[i] = pk['g'] ** shares[i]
+            C_y_pr[i] = self.hash_attribute(j) ** shares[i]
+
+        return {'C_tilde': (pk['e_gg_alpha'] ** s) * msg,
+                'C': C, 'Cy': C_y, 'Cyp': C_y_pr, 'policy': compiled_policy.normalized,
+                'attributes': list(compiled_policy.leaves)}
+
+    def _generate_header_material(self):
+        """Offline phase: session key, s and every header element that only depends on s"""
+        pk = self.public_key
+        msg = self.group.random(GT)
+        s = self.group.random(ZR)
+        return (msg, s, pk['h'] ** s, (pk['e_gg_alpha'] ** s) * msg, pk['g'] ** s)
+
+    def _generate_share_material(self):
+        """Offline phase: a random share a with g^a, consumed by one AND gate"""
+        a = self.group.random(ZR)
+        return (a, self.public_key['g'] ** a)
+
+    def start_encryption_pool(self):
+        """Start (or flush after a key change) the background encryption pool"""
+        if not self.encryption_pool_size:
+            return False
+        if self.encryption_pool is None:
+            self.encryption_pool = EncryptionPool(self._generate_header_material, self._generate_share_material,
+                                                  max_headers=self.encryption_pool_size)
+            self.encryption_pool.start()
+        else:
+            self.encryption_pool.clear()
+        return True
+
+    def stop_encryption_pool(self):
+        if self.encryption_pool is not None:
+            self.encryption_pool.stop()
+            self.encryption_pool = None
+
+    def _aead_pool(self):
+        with self._aead_lock:
+            if self._aead_executor is None:
+                self._aead_executor = ThreadPoolExecutor(self.aead_workers, thread_name_prefix='cpabe-aead')
+            return self._aead_executor
+
+    def stop_aead_pool(self):
+        with self._aead_lock:
+            if self._aead_executor is not None:
+                self._aead_executor.shutdown()
+                self._aead_executor = None
+
+    def _batch_pool(self):
+        with self._batch_lock:
+            if self._batch_executor is None:
+                # Spawned, not forked: the parent may be a threaded server holding locks at fork time
+                self._batch_executor = ProcessPoolExecutor(self.batch_workers,
+                                                           mp_context=multiprocessing.get_context('spawn'),
+                                                           initializer=_init_batch_worker,
+                                                           initargs=(self._batch_options,))
+            return self._batch_executor
+
+    def stop_batch_pool(self):
+        with self._batch_lock:
+            if self._batch_executor is not None:
+                self._batch_executor.shutdown()
+                self._batch_executor = None
+
+    def batch_submit(self, method, *args):
+        """Run a CPABEScheme method in the batch pool, or inline with one batch worker; returns a Future"""
+        if self.batch_workers <= 1:
+            future = Future()
+            try:
+                future.set_result(getattr(self, method)(*args))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        try:
+            return self._batch_pool().submit(_batch_call, method, *args)
+        except BrokenProcessPool:
+            logger.warning("Batch pool broke, starting a new one")
+            with self._batch_lock:
+                self._batch_executor = None
+            return self._batch_pool().submit(_batch_call, method, *args)
+
+    def encryption_pool_stats(self):
+        """Return depth, target and miss counters of the encryption pool"""
+        if self.encryption_pool is None:
+            return {"enabled": False}
+        stats = self.encryption_pool.stats()
+        stats["enabled"] = True
+        return stats
+
+    def _bsw07_encrypt_online(self, compiled_policy):
+        """Online phase: combine pooled material into a BSW07 ciphertext, returning (msg, ciphertext)"""
+        pool = self.encryption_pool
+        material = pool.take_header() if pool is not None else None
+        if material is None:
+            material = self._generate_header_material()
+        msg, s, C, C_tilde, g_s = material
+
+        # Walk the tree with (share, g^share) pairs. An AND gate splits v with
+        # q(x) = v + (a - v)x, so q(1) = a comes from the pool and g^q(2) = (g^a)^2 / g^v.
+        C_y, C_y_pr = {}, {}
+        stack = [(compiled_policy.tree, s, g_s)]
+        while stack:
+            node, v, g_v = stack.pop()
+            node_type = node.getNodeType()
+            if node_type == OpType.ATTR:
+                i = node.getAttributeAndIndex()
+                C_y[i] = g_v
+                C_y_pr[i] = self.hash_attribute(self.util.strip_index(i)) ** v
+            elif node_type == OpType.OR:
+                stack.append((node.getRight(), v, g_v))
+                stack.append((node.getLeft(), v, g_v))
+            else:
+                share = pool.take_share() if pool is not None else None
+                if share is None:
+                    share = self._generate_share_material()
+                a, g_a = share
+                stack.append((node.getRight(), a + a - v, (g_a * g_a) / g_v))
+                stack.append((node.getLeft(), a, g_a))
+
+        return msg, {'C_tilde': C_tilde, 'C': C, 'Cy': C_y, 'Cyp': C_y_pr,
+                     'policy': compiled_policy.normalized, 'attributes': list(compiled_policy.leaves)}
+
+    def _leaf_attribute(self, node):
+        """Key attribute name of a policy leaf; repeated attributes are labelled NAME_0, NAME_1, ..."""
+        return self.util.strip_index(node.getAttributeAndIndex())
+
+    def _min_cost_leaves(self, node, attributes):
+        """Return the smallest list of satisfied leaves under node, or None if unsatisfiable"""
+        node_type = node.getNodeType()
+        if node_type == OpType.ATTR:
+            return [node] if self._leaf_attribute(node) in attributes else None
+
+        left = self._min_cost_leaves(node.getLeft(), attributes)
+        right = self._min_cost_leaves(node.getRight(), attributes)
+        if node_type == OpType.AND:
+            if left is None or right is None:
+                return None
+            return left + right
+        # OR: keep the cheaper branch, preferring the left one on ties like Charm's prune()
+        if left is None:
+            return right
+        if right is None or len(left) <= len(right):
+            return left
+        return right
+
+    def select_decryption_leaves(self, compiled_policy, attributes):
+        """Choose the satisfying leaf set that needs the fewest pairings to decrypt"""
+        # Every leaf costs the same two pairings, so the cheapest set is the smallest one
+        return self._min_cost_leaves(compiled_policy.tree, attributes)
+
+    def _bsw07_decrypt(self, sk, ct):
+        """BSW07 decryption over the minimum-pairing satisfying leaf set"""
+        compiled_policy = self.compile_header_policy(ct['policy'])
+        leaves = self.select_decryption_leaves(compiled_policy, sk['Dj'])
+        if leaves is None:
+            return None
+
+        z = compiled_policy.coefficients
+        if z is None:
+            z = compiled_policy.coefficients = self.util.getCoefficients(compiled_policy.tree)
+
+        if self.pairing_product:
+            # C_tilde * e(C^-1, D) * prod e(Cy^z, Dj) * e(Djp^-z, Cyp)
+            lhs, rhs = [ct['C'] ** -1], [sk['D']]
+            for node in leaves:
+                j = node.getAttributeAndIndex()
+                k = self._leaf_attribute(node)
+                lhs += [ct['Cy'][j] ** z[j], sk['Djp'][k] ** -z[j]]
+                rhs += [sk['Dj'][k], ct['Cyp'][j]]
+            return ct['C_tilde'] * self.group.pair_prod(lhs, rhs)
+
+        A = None
+        for node in leaves:
+            j = node.getAttributeAndIndex()
+            k = self._leaf_attribute(node)
+            term = (pair(ct['Cy'][j], sk['Dj'][k]) / pair(sk['Djp'][k], ct['Cyp'][j])) ** z[j]
+            A = term if A is None else A * term
+
+        return ct['C_tilde'] / (pair(ct['C'], sk['D']) / A)
+
+    def intern_attribute(self, attr):
+        """Map a normalized attribute name to a small stable integer"""
+        attr_id = self._attribute_ids.get(attr)
+        if attr_id is None:
+            with self._policy_lock:
+                attr_id = self._attribute_ids.setdefault(attr, len(self._attribute_ids))
+        return attr_id
+
+    def _parse_policy_expression(self, policy):
+        """Parse a policy string into a nested (op, children) tuple; AND and OR may only be mixed
+        within one group when parenthesized"""
+        if not isinstance(policy, str) or not policy.strip():
+            raise ValueError("Policy must be a non-empty string")
+
+        tokens = self.POLICY_TOKEN_RE.findall(policy)
+        # Charm reads 'A or B and C' left to right as (A or B) and C; rather than give such policies
+        # a different meaning, mixed operators must be grouped explicitly
+        levels = [set()]
+        for token in tokens:
+            token = token.upper()
+            if token == '(':
+                levels.append(set())
+            elif token == ')':
+                if len(levels) > 1:
+                    levels.pop()
+            elif token in self.POLICY_OPERATORS:
+                levels[-1].add(token)
+                if len(levels[-1]) > 1:
+                    raise ValueError("Ambiguous policy: parenthesize mixed AND/OR, e.g. '(A or B) and C'")
+        pos = 0
+
+        def peek():
+            return tokens[pos].upper() if pos < len(tokens) else None
+
+        def parse_operator(op, parse_operand):
+            nonlocal pos
+            children = [parse_operand()]
+            while peek() == op:
+                pos += 1
+                children.append(parse_operand())
+            if len(children) == 1:
+                return children[0]
+            # Flatten nested nodes of the same operator, e.g. (A AND B) AND C
+            flat = []
+            for child in children:
+                flat.extend(child[1] if child[0] == op else (child,))
+            return (op, tuple(flat))
+
+        def parse_or():
+            return parse_operator('OR', parse_and)
+
+        def parse_and():
+            return parse_operator('AND', parse_atom)
+
+        def parse_atom():
+            nonlocal pos
+            token = peek()
+            if token is None:
+                raise ValueError("Unexpected end of policy")
+            if token == '(':
+                pos += 1
+                node = parse_or()
+                if peek() != ')':
+                    raise ValueError("Unbalanced parentheses in policy")
+                pos += 1
+                return node
+            if token == ')':
+                raise ValueError("Unexpected ')' in policy")
+            if token in self.POLICY_OPERATORS:
+                raise ValueError(f"Operator '{token}' is missing an operand")
+            if token == 'OF':
+                raise ValueError("Threshold policies are not supported by BSW07")
+            pos += 1
+            attr = self.normalize_attribute(tokens[pos - 1])
+            if not attr:
+                raise ValueError(f"Invalid attribute '{tokens[pos - 1]}'")
+            return ('ATTR', attr)
+
+        expression = parse_or()
+        if pos != len(tokens):
+            raise ValueError(f"Unexpected token '{tokens[pos]}' in policy")
+        return expression
+
+    def _format_policy_expression(self, node, top=True):
+        """Render a parsed policy as a canonical string with explicit grouping"""
+        if node[0] == 'ATTR':
+            return node[1]
+        text = f" {node[0]} ".join(self._format_policy_expression(child, top=False) for child in node[1])
+        return text if top else f"({text})"
+
+    def _intern_policy_expression(self, node):
+        """Replace attribute names in a parsed policy with interned ids"""
+        if node[0] == 'ATTR':
+            return ('ATTR', self.intern_attribute(node[1]))
+        return (node[0], tuple(self._intern_policy_expression(child) for child in node[1]))
+
+    def compile_policy(self, policy):
+        """Return the CompiledPolicy for a policy string, compiling it on first use"""
+        compiled = self.policy_cache.get(policy)
+        if compiled is not None:
+            return compiled
+
+        try:
+            expression = self._parse_policy_expression(policy)
+            normalized = self._format_policy_expression(expression)
+            # Charm's policy parser keeps global state, so compile one policy at a time
+            with self._policy_lock:
+                tree = self.util.createPolicy(normalized)
+            leaves = self.util.getAttributeList(tree)
+        except Exception as e:
+            raise ValueError(f"Invalid policy structure: {str(e)}")
+
+        interned = self._intern_policy_expression(expression)
+        compiled = CompiledPolicy(normalized, tree, interned, leaves, self._expression_attributes(interned))
+        self.policy_cache.put(policy, compiled)
+        logger.debug(f"Compiled policy: {normalized}")
+        return compiled
+
+    def _expression_attributes(self, expression):
+        """Return the set of attribute ids or names at the leaves of a parsed policy"""
+        attributes = []
+        stack = [expression]
+        while stack:
+            node = stack.pop()
+            if node[0] == 'ATTR':
+                attributes.append(node[1])
+            else:
+                stack.extend(node[1])
+        return frozenset(attributes)
+
+    def _expression_from_tree(self, node):
+        """Convert a Charm BinNode policy tree into an expression over attribute names"""
+        if node.getNodeType() == OpType.ATTR:
+            return ('ATTR', self._leaf_attribute(node))
+        op = 'AND' if node.getNodeType() == OpType.AND else 'OR'
+        children = []
+        for child in (node.getLeft(), node.getRight()):
+            expression = self._expression_from_tree(child)
+            children.extend(expression[1] if expression[0] == op else (expression,))
+        return (op, tuple(children))
+
+    def compile_header_policy(self, policy_str):
+        """Compile a policy string stored in a ciphertext header, keeping Charm's grouping"""
+        compiled = self.header_policy_cache.get(policy_str)
+        if compiled is not None:
+            return compiled
+
+        # Headers written before compile_policy() may rely on Charm's own grouping of
+        # unparenthesized operators, so the stored string is parsed by Charm rather than re-normalized
+        try:
+            with self._policy_lock:
+                tree = self.util.createPolicy(policy_str)
+        except Exception as e:
+            raise ValueError(f"Invalid policy structure: {str(e)}")
+        leaves = self.util.getAttributeList(tree)
+        expression = self._expression_from_tree(tree)
+        # The fast checks and the full evaluation must see the same names, so both come from the expression
+        compiled = CompiledPolicy(policy_str, tree, expression, leaves, self._expression_attributes(expression),
+                                  interned=False)
+        self.header_policy_cache.put(policy_str, compiled)
+        return compiled
+
+    def _evaluate_expression(self, node, attribute_ids):
+        if node[0] == 'ATTR':
+            return node[1] in attribute_ids
+        if node[0] == 'AND':
+            return all(self._evaluate_expression(child, attribute_ids) for child in node[1])
+        return any(self._evaluate_expression(child, attribute_ids) for child in node[1])
+
+    def evaluate_compiled_policy(self, compiled_policy, attributes):
+        """Evaluate if a set of normalized attribute names satisfies a compiled policy"""
+        if not compiled_policy.interned:
+            attribute_ids = set(attributes)
+        else:
+            # Attributes never seen in a policy cannot appear in this one, so they are not interned
+            attribute_ids = set()
+            for attr in attributes:
+                attr_id = self._attribute_ids.get(attr)
+                if attr_id is not None:
+                    attribute_ids.add(attr_id)
+
+        if compiled_policy.attribute_ids <= attribute_ids:
+            return True
+        if compiled_policy.attribute_ids.isdisjoint(attribute_ids):
+            return False
+        return self._evaluate_expression(compiled_policy.expression, attribute_ids)
+
+    def key_satisfies_policy(self, sk_components, encrypted_dict):
+        """Check a serialized key's attributes against an envelope's policy without any pairing work"""
+        key_attributes = sk_components.get('Dj')
+        if not isinstance(key_attributes, dict):
+            return True
+
+        policy_str = encrypted_dict.get('policy')
+        if not isinstance(policy_str, str) or not policy_str:
+            try:
+                header = json.loads(base64.b64decode(encrypted_dict['cpabe_cipher']))
+                policy_str = header['policy']
+            except Exception:
+                # Leave malformed envelopes to the full decryption path to report
+                return True
+
+        try:
+            compiled_policy = self.compile_header_policy(policy_str)
+        except ValueError:
+            return True
+        return self.evaluate_compiled_policy(compiled_policy, key_attributes.keys())
+
+    def parse_policy(self, policy):
+        """Parse a policy string into a structured format"""
+        def to_dict(node):
+            if node[0] == 'ATTR':
+                return {"type": "ATTR", "value": node[1]}
+            return {"type": node[0], "children": [to_dict(child) for child in node[1]]}
+
+        return to_dict(self._parse_policy_expression(policy))
+
+    def evaluate_policy(self, policy_tree, attributes):
+        """Evaluate if a set of attributes satisfies a policy tree"""
+        if not policy_tree:
+            return False
+            
+        if policy_tree["type"] == "ATTR":
+            return policy_tree["value"] in attributes
+            
+        if policy_tree["type"] == "AND":
+            return all(self.evaluate_policy(child, attributes) for child in policy_tree["children"])
+            
+        if policy_tree["type"] == "OR":
+            return any(self.evaluate_policy(child, attributes) for child in policy_tree["children"])
+            
+        return False
+
+    def validate_policy(self, policy):
+        """Validate policy format and structure"""
+        if not isinstance(policy, str) or not policy:
+            raise ValueError("Policy must be a non-empty string")
+
+        # Compiling parses the policy and checks it against Charm's grammar
+        self.compile_policy(policy)
+        return True
+
+
+    def encrypt_data(self, policy: str, plaintext_bytes: bytes, binary: bool = False, in_place: bool = False,
+                     key_wrap: str = None, data_cipher: str = None, base64_buffer: bool = False):
+        """
+        Encrypts plaintext data using a hybrid approach:
+        1. Generates a random session key (GT element).
+        2. Encrypts the session key using CP-ABE under the specified policy.
+        3. Binds a 256-bit data key to the session key with the key wrap (HKDF or XOR).
+        4. Encrypts the actual plaintext data with the data cipher (AES-256-GCM by default).
+
+        Args:
+            policy (str): The access policy string (e.g., "ROLE:DOCTOR AND LOCATION:HOSPITAL_A").
+            plaintext_bytes (bytes): The data to be encrypted, as bytes.
+            binary (bool): Return the compact binary envelope (see `pack_envelope`) instead of a dict.
+            in_place (bool): Encrypt a writable buffer (bytearray/memoryview) in place; the returned
+                dict then carries that buffer as a raw "ciphertext" rather than base64 text, for
+                callers that stream its encoding (see `b64encode_chunks`).
+            key_wrap (str): Key wrap name from KEY_WRAPS; defaults to the scheme's key_wrap.
+            data_cipher (str): Data cipher name from DATA_CIPHERS; defaults to the scheme's data_cipher.
+            base64_buffer (bool): Return the base64 "ciphertext" as an ASCII bytearray instead of a str,
+                skipping a payload-sized decode copy, for callers that write the text out as is.
+
+        Returns:
+            dict: A dictionary containing the encrypted data components (nonce, ciphertext, tag,
+                  CP-ABE ciphertext, key material, and the policy, key wrap and data cipher used),
+                  binary values base64-encoded.
+            bytes: The binary envelope, when `binary` is True.
+
+        Raises:
+            RuntimeError: If CPABEScheme is not initialized.
+            ValueError: If input data is invalid or encryption fails.
+        """
+        # Ensure the public key is loaded/set up
+        if not self.public_key:
+            raise RuntimeError("CPABEScheme not initialized. Call setup() first.")
+
+        # Validate plaintext data
+        if in_place:
+            if not isinstance(plaintext_bytes, (bytearray, memoryview)) or memoryview(plaintext_bytes).readonly:
+                raise TypeError("In-place encryption needs a writable bytearray or memoryview.")
+        elif not isinstance(plaintext_bytes, bytes):
+            raise TypeError("Plaintext data must be provided as bytes.")
+        if len(plaintext_bytes) > self.MAX_PLAINTEXT_SIZE:
+            raise ValueError(f"Data size ({len(plaintext_bytes)} bytes) exceeds maximum limit of {self.MAX_PLAINTEXT_SIZE} bytes.")
+
+        # Resolve the key wrap and data cipher up front so unknown names surface as ValueError
+        wrap = self.get_key_wrap(key_wrap)
+        dem = self.get_data_cipher(data_cipher)
+
+        try:
+            # Normalize, parse and validate the policy once per distinct policy string
+            compiled_policy = self.compile_policy(policy)
+            normalized_policy = compiled_policy.normalized
+            logger.debug(f"Policy normalized and validated for encryption: '{normalized_policy}'.")
+
+            # 1-3. Encrypt a fresh session key under the policy and bind the AES key to it
+            aes_key, header_fields = self._encapsulate(compiled_policy, binary, wrap.NAME)
+
+            # 4. Encrypt the actual plaintext data with the data cipher (an AEAD with a 96-bit nonce)
+            aes_nonce = get_random_bytes(dem.NONCE_SIZE)
+            aes_cipher = dem.new(aes_key, aes_nonce)
+            
+            if in_place:
+                # Overwrite the plaintext with the ciphertext; no second payload-sized buffer
+                ciphertext = plaintext_bytes
+                buffer = memoryview(plaintext_bytes).cast('B')
+                aes_cipher.encrypt(buffer, output=buffer)
+                tag = aes_cipher.digest()
+            elif binary:
+                # encrypt_and_digest returns the ciphertext and the authentication tag
+                ciphertext, tag = aes_cipher.encrypt_and_digest(plaintext_bytes)
+            else:
+                # Base64 is produced chunk by chunk, so the raw ciphertext is never held whole
+                ciphertext = self._encrypt_to_base64(aes_cipher, plaintext_bytes, dem.INCREMENTAL)
+                tag = aes_cipher.digest()
+                if not base64_buffer:
+                    ciphertext = ciphertext.decode('ascii')
+            logger.debug(f"Plaintext data encrypted with {dem.NAME}.")
+
+            if binary:
+                # Raw, length-prefixed fields with no base64 or JSON layers
+                return self.pack_envelope(header_fields, aes_nonce, ciphertext, tag, data_cipher=dem.NAME)
+
+            # Assemble all encrypted components, base64-encoded for easy transfer/storage
+            encrypted_result = {
+                "nonce": base64.b64encode(aes_nonce).decode('utf-8'),
+                "ciphertext": ciphertext,
+                "tag": base64.b64encode(tag).decode('utf-8'),
+                "data_cipher": dem.NAME,
+                **header_fields # CP-ABE ciphertext, key wrap and the policy used for encryption
+            }
+            logger.debug("Encryption process completed successfully.")
+            return encrypted_result
+
+        except Exception as e:
+            logger.error(f"Encryption failed: {str(e)}")
+            raise RuntimeError(f"Encryption failed: {str(e)}")
+
+    def _encapsulate(self, compiled_policy, binary=False, key_wrap=None):
+        """Encrypt a fresh session key under a compiled policy; returns (aes_key, envelope header fields)"""
+        wrap = self.get_key_wrap(key_wrap)
+        if self.encryption_pool is not None:
+            # 1+2. Take a precomputed session key and header from the pool and bind it to the policy
+            session_key_gt, cpabe_ciphertext_elements = self._bsw07_encrypt_online(compiled_policy)
+        else:
+            # 1. Generate a random element from the GT group to serve as the session key
+            session_key_gt = self.group.random(GT)
+            logger.debug("Random GT element (session key) generated for encryption.")
+
+            # 2. Encrypt the session key using CP-ABE under the specified policy
+            cpabe_ciphertext_elements = self._bsw07_encrypt(session_key_gt, compiled_policy)
+        if not cpabe_ciphertext_elements:
+            raise RuntimeError("CP-ABE encryption of session key failed.")
+
+        # Store the original policy string within the CP-ABE ciphertext structure for later use
+        cpabe_ciphertext_elements['policy'] = compiled_policy.normalized
+        logger.debug("CP-ABE encryption of session key successful.")
+
+        if binary:
+            cpabe_cipher = self.pack_cpabe_header(cpabe_ciphertext_elements)
+        else:
+            # Serialize the CP-ABE ciphertext components into a JSON-serializable dictionary
+            serialized_cpabe_cipher = self.serialize_cpabe_cipher(cpabe_ciphertext_elements)
+            # Convert the serialized dictionary to a JSON string, then base64 it for the envelope
+            cpabe_cipher_json_bytes = json.dumps(serialized_cpabe_cipher).encode('utf-8')
+            cpabe_cipher = base64.b64encode(cpabe_cipher_json_bytes).decode('utf-8')
+
+        # 3. Bind a fixed-length AES key to the session key (GT element) with the chosen key wrap
+        aes_key, key_material = wrap.wrap(self.group.serialize(session_key_gt))
+        logger.debug(f"AES key bound to session key using the '{wrap.NAME}' key wrap.")
+        header_fields = {"cpabe_cipher": cpabe_cipher, "key_wrap": wrap.NAME, "policy": compiled_policy.normalized}
+        if wrap.KEY_FIELD:
+            header_fields[wrap.KEY_FIELD] = key_material if binary else base64.b64encode(key_material).decode('utf-8')
+        return aes_key, header_fields
+
+    def _pack_element(self, element):
+        """Group element as type byte, u16 length and the raw compressed point"""
+        # Charm serializes to b"<type>:<base64 of the compressed encoding>"
+        group_type, encoded = self.group.serialize(element).split(b':', 1)
+        raw = base64.b64decode(encoded)
+        return struct.pack('>BH', int(group_type), len(raw)) + raw
+
+    def _read_element(self, reader):
+        group_type, size = reader.unpack('>BH')
+        return group_type, bytes(reader.take(size))
+
+    def _unpack_element(self, packed):
+        group_type, raw = packed
+        return self.group.deserialize(b'%d:%s' % (group_type, base64.b64encode(raw)))
+
+    def pack_cpabe_header(self, cpabe_cipher):
+        """Binary CP-ABE header: policy, C_tilde, C, then (leaf, Cy, Cyp) per leaf, all length-prefixed"""
+        policy = cpabe_cipher['policy'].encode('utf-8')
+        parts = [struct.pack('>H', len(policy)), policy,
+                 self._pack_element(cpabe_cipher['C_tilde']), self._pack_element(cpabe_cipher['C']),
+                 struct.pack('>H', len(cpabe_cipher['Cy']))]
+        for leaf, c_y in cpabe_cipher['Cy'].items():
+            name = leaf.encode('utf-8')
+            parts += [struct.pack('>H', len(name)), name,
+                      self._pack_element(c_y), self._pack_element(cpabe_cipher['Cyp'][leaf])]
+        return b''.join(parts)
+
+    def unpack_cpabe_header(self, data):
+        """Parse a binary CP-ABE header; per-leaf elements stay raw until decryption uses them"""
+        reader = BinaryReader(data)
+        policy = str(reader.prefixed(), 'utf-8')
+        c_tilde = self._unpack_element(self._read_element(reader))
+        c = self._unpack_element(self._read_element(reader))
+        (leaf_count,) = reader.unpack('>H')
+        c_y, c_y_pr = {}, {}
+        for _ in range(leaf_count):
+            leaf = str(reader.prefixed(), 'utf-8')
+            c_y[leaf] = self._read_element(reader)
+            c_y_pr[leaf] = self._read_element(reader)
+        if reader.offset != len(reader.view):
+            raise ValueError("Trailing bytes after CP-ABE header")
+        return {'C_tilde': c_tilde, 'C': c,
+                'Cy': LazyElementMap(c_y, self._unpack_element),
+                'Cyp': LazyElementMap(c_y_pr, self._unpack_element),
+                'policy': policy, 'attributes': list(c_y)}
+
+    def _envelope_mode(self, header_fields, data_cipher=None):
+        """Binary mode byte and key material for header fields written by _encapsulate"""
+        wrap = self.envelope_key_wrap(header_fields)
+        key_material = header_fields[wrap.KEY_FIELD] if wrap.KEY_FIELD else b''
+        return wrap.MODE | self.get_data_cipher(data_cipher).ID << 4, key_material
+
+    def _read_envelope_mode(self, mode):
+        """(KeyWrap, DataCipher) named by a binary mode byte"""
+        wrap = next((w for w in KEY_WRAPS.values() if w.MODE == mode & 0x0F), None)
+        dem = next((c for c in DATA_CIPHERS.values() if c.ID == mode >> 4), None)
+        if wrap is None or dem is None:
+            raise ValueError(f"Unsupported envelope mode: {mode:#04x}")
+        return wrap, dem
+
+    def pack_envelope(self, header_fields, nonce, ciphertext, tag, session_counter=None, data_cipher=None):
+        """Binary envelope: version, mode (key wrap | data cipher << 4), flags, [u64 session counter],
+        u32 header, u8 key material, u8 nonce, u8 tag, then the raw ciphertext"""
+        flags = self.ENVELOPE_FLAG_SESSION if session_counter is not None else 0
+        mode, key_material = self._envelope_mode(header_fields, data_cipher)
+        parts = [struct.pack('>BBB', self.ENVELOPE_VERSION, mode, flags)]
+        if session_counter is not None:
+            parts.append(struct.pack('>Q', session_counter))
+        header = header_fields['cpabe_cipher']
+        parts += [struct.pack('>I', len(header)), header,
+                  struct.pack('>B', len(key_material)), key_material,
+                  struct.pack('>B', len(nonce)), nonce,
+                  struct.pack('>B', len(tag)), tag,
+                  ciphertext]
+        return b''.join(parts)
+
+    def parse_envelope(self, data):
+        """Read a binary envelope into the fields decrypt_data uses, with raw bytes instead of base64"""
+        reader = BinaryReader(data)
+        version, mode, flags = reader.unpack('>BBB')
+        if version != self.ENVELOPE_VERSION:
+            raise ValueError(f"Unsupported envelope version: {version}")
+        wrap, dem = self._read_envelope_mode(mode)
+        if flags & self.ENVELOPE_FLAG_STREAM:
+            raise ValueError("Streamed object; read it with decrypt_stream")
+
+        envelope = {'key_wrap': wrap.NAME, 'data_cipher': dem.NAME}
+        if flags & self.ENVELOPE_FLAG_SESSION:
+            (envelope['session_counter'],) = reader.unpack('>Q')
+        header = bytes(reader.prefixed('>I'))
+        envelope['cpabe_cipher'] = header
+        envelope['policy'] = str(BinaryReader(header).prefixed(), 'utf-8')
+        key_material = bytes(reader.prefixed('>B'))
+        if wrap.KEY_FIELD:
+            envelope[wrap.KEY_FIELD] = key_material
+        envelope['nonce'] = bytes(reader.prefixed('>B'))
+        envelope['tag'] = bytes(reader.prefixed('>B'))
+        envelope['ciphertext'] = reader.rest()
+        return envelope
+
+    def _envelope_bytes(self, value):
+        """Raw bytes of an envelope field: binary envelopes carry them as-is, JSON ones in base64"""
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return value
+        return self.b64decode_buffer(value)
+
+    def _open_payload(self, aes_key, nonce, ciphertext, tag, in_place=False, data_cipher=None):
+        """AEAD decrypt; in_place decrypts a writable ciphertext buffer over itself and returns it"""
+        cipher = self.get_data_cipher(data_cipher).new(aes_key, nonce)
+        if not in_place:
+            return cipher.decrypt_and_verify(ciphertext, tag)
+        buffer = memoryview(ciphertext).cast('B')
+        if buffer.readonly:
+            raise ValueError("In-place decryption needs a writable ciphertext buffer")
+        cipher.decrypt(buffer, output=buffer)
+        try:
+            cipher.verify(tag)
+        except ValueError:
+            # Never leave unauthenticated plaintext in the caller's buffer
+            SessionKeyCache._zeroize(buffer)
+            raise
+        return ciphertext
+
+    def b64decode_buffer(self, value):
+        """Decode base64 text into one preallocated bytearray, a chunk at a time, without an
+        intermediate copy of the whole text or payload.
+
+        Text the fast path cannot take, such as MIME-wrapped lines, is decoded like base64.b64decode.
+        """
+        if not isinstance(value, (str, bytes, bytearray, memoryview)):
+            raise ValueError("Invalid base64 data")
+        try:
+            return self._b64decode_canonical(value)
+        except ValueError:
+            pass
+        try:
+            return bytearray(base64.b64decode(value))
+        except (binascii.Error, ValueError) as e:
+            raise ValueError(f"Invalid base64 data: {e}")
+
+    def _b64decode_canonical(self, value):
+        """Chunked decode of unwrapped, padded base64; ValueError for anything else"""
+        if len(value) % 4:
+            raise ValueError("Invalid base64 data")
+        padding = 0
+        if len(value):
+            padding = (value[-1] in ('=', 61)) + (value[-2] in ('=', 61))
+        output = bytearray(len(value) // 4 * 3 - padding)
+        position = 0
+        try:
+            for start in range(0, len(value), self.BASE64_CHUNK_SIZE):
+                piece = binascii.a2b_base64(value[start:start + self.BASE64_CHUNK_SIZE])
+                output[position:position + len(piece)] = piece
+                position += len(piece)
+        except (binascii.Error, ValueError) as e:
+            raise ValueError(f"Invalid base64 data: {e}")
+        if position != len(output):
+            raise ValueError("Invalid base64 data")
+        return output
+
+    def _encrypt_to_base64(self, cipher, plaintext, incremental=True):
+        """Encrypt plaintext with an AEAD cipher into base64 text held in an ASCII bytearray, one chunk
+        at a time through a reused scratch buffer; the caller takes the tag with cipher.digest()"""
+        view = memoryview(plaintext).cast('B')
+        # A multiple of 3 bytes for base64 and of 64 for the AEAD, so chunks can be encrypted separately;
+        # ciphers that are not incremental take the payload in one call
+        step = self.BASE64_CHUNK_SIZE // 4 * 3 if incremental else max(len(view), 1)
+        output = bytearray(-(-len(view) // 3) * 4)
+        scratch = memoryview(bytearray(min(step, len(view))))
+        position = 0
+        for start in range(0, len(view), step):
+            chunk = view[start:start + step]
+            cipher.encrypt(chunk, output=scratch[:len(chunk)])
+            encoded = binascii.b2a_base64(scratch[:len(chunk)], newline=False)
+            output[position:position + len(encoded)] = encoded
+            position += len(encoded)
+        return output
+
+    def b64encode_chunks(self, buffer):
+        """Yield the base64 encoding of buffer as ASCII strings of at most BASE64_CHUNK_SIZE characters"""
+        view = memoryview(buffer).cast('B')
+        step = self.BASE64_CHUNK_SIZE // 4 * 3
+        for start in range(0, len(view), step):
+            yield binascii.b2a_base64(view[start:start + step], newline=False).decode('ascii')
+
+    def encrypt_data_multi(self, policies, plaintext_bytes, key_wrap=None, data_cipher=None):
+        """Encrypt a payload once and wrap its data key under one CP-ABE header per policy"""
+        if not self.public_key:
+            raise RuntimeError("CPABEScheme not initialized. Call setup() first")
+        if not isinstance(policies, (list, tuple)) or not policies:
+            raise ValueError("Policies must be a non-empty list")
+        if not isinstance(plaintext_bytes, bytes):
+            raise ValueError("Data must be bytes")
+        if len(plaintext_bytes) > self.MAX_PLAINTEXT_SIZE:
+            raise ValueError(f"Data size exceeds maximum limit of {self.MAX_PLAINTEXT_SIZE} bytes")
+        self.get_key_wrap(key_wrap)
+        dem = self.get_data_cipher(data_cipher)
+
+        try:
+            compiled_policies = [self.compile_policy(policy) for policy in policies]
+
+            # The payload is encrypted exactly once under a random data key
+            data_key = get_random_bytes(32)
+            nonce = get_random_bytes(dem.NONCE_SIZE)
+            ciphertext, tag = dem.new(data_key, nonce).encrypt_and_digest(plaintext_bytes)
+
+            headers = []
+            for compiled_policy in compiled_policies:
+                # Each header's own key encrypts only the 32-byte data key
+                header_key, header_fields = self._encapsulate(compiled_policy, key_wrap=key_wrap)
+                key_nonce = get_random_bytes(12)
+                wrapped_key, key_tag = AES.new(header_key, AES.MODE_GCM, nonce=key_nonce).encrypt_and_digest(data_key)
+                headers.append({
+                    **header_fields,
+                    "key_nonce": base64.b64encode(key_nonce).decode('utf-8'),
+                    "wrapped_key": base64.b64encode(wrapped_key).decode('utf-8'),
+                    "key_tag": base64.b64encode(key_tag).decode('utf-8')
+                })
+
+            return {
+                "nonce": base64.b64encode(nonce).decode('utf-8'),
+                "ciphertext": base64.b64encode(ciphertext).decode('utf-8'),
+                "tag": base64.b64encode(tag).decode('utf-8'),
+                "data_cipher": dem.NAME,
+                "headers": headers
+            }
+        except Exception as e:
+            logger.error(f"Multi-policy encryption failed: {str(e)}")
+            raise RuntimeError(f"Multi-policy encryption failed: {str(e)}")
+
+    def select_header(self, sk_components, headers):
+        """First header of a multi-header envelope whose policy the key satisfies, found without pairings"""
+        if not isinstance(headers, list):
+            raise ValueError("Envelope 'headers' must be a list")
+        for header in headers:
+            if isinstance(header, dict) and self.key_satisfies_policy(sk_components, header):
+                return header
+        return None
+
+    def _unwrap_data_key(self, header_key, header):
+        """Recover the data key wrapped under a multi-header envelope header"""
+        try:
+            key_nonce = base64.b64decode(header['key_nonce'])
+            wrapped_key = base64.b64decode(header['wrapped_key'])
+            key_tag = base64.b64decode(header['key_tag'])
+            return AES.new(header_key, AES.MODE_GCM, nonce=key_nonce).decrypt_and_verify(wrapped_key, key_tag)
+        except Exception as e:
+            logger.error(f"Failed to unwrap data key: {str(e)}")
+            raise ValueError(f"Failed to unwrap data key: {str(e)}")
+
+    def open_session(self, policy, lifetime=300, max_messages=4096, binary=False, key_wrap=None, data_cipher=None):
+        """Create one CP-ABE header under policy for a batch of payloads; see EncapsulationSession"""
+        if not self.public_key:
+            raise RuntimeError("CPABEScheme not initialized. Call setup() first")
+        if lifetime <= 0 or not 0 < max_messages <= 2 ** 64:
+            raise ValueError("Session lifetime and max_messages must be positive")
+
+        compiled_policy = self.compile_policy(policy)
+        root_key, header_fields = self._encapsulate(compiled_policy, binary, key_wrap)
+        return EncapsulationSession(self, root_key, header_fields, lifetime, max_messages, binary, data_cipher)
+
+    def _derive_key(self, root_key, salt, info):
+        hkdf = HKDF(
+            algorithm=hashes.SHA256(),
+            length=32,
+            salt=salt,
+            info=info,
+            backend=default_backend()
+        )
+        return hkdf.derive(root_key)
+
+    def encapsulate_policy(self, policy, key_wrap=None):
+        """Fresh session key and JSON header fields under a policy string; the pairing work of a session"""
+        return self._encapsulate(self.compile_policy(policy), False, key_wrap)
+
+    def encrypt_batch(self, items, key_wrap=None, data_cipher=None, max_messages=4096):
+        """Encrypt (policy, plaintext) items, yielding (index, envelope or exception) in input order
+
+        Items are grouped by compiled policy: each group shares one encapsulation session, whose
+        header is built in the batch pool while earlier items are still being sealed, so the pairing
+        cost is paid per distinct policy rather than per item. Every envelope is self-contained and
+        decrypts with decrypt_data. Items are consumed lazily, up to BATCH_WINDOW ahead of the output;
+        an item that is itself an exception (input that failed to parse) is passed through as a failure.
+        """
+        if not self.public_key:
+            raise RuntimeError("CPABEScheme not initialized. Call setup() first")
+        wrap = self.get_key_wrap(key_wrap)
+        dem = self.get_data_cipher(data_cipher)
+
+        # normalized policy -> [header future, session once opened, items assigned to it]
+        groups = {}
+        sessions = []
+        pending = deque()
+
+        def seal(group, plaintext):
+            if group[1] is None:
+                root_key, header_fields = group[0].result()
+                group[1] = EncapsulationSession(self, root_key, header_fields, max_messages=max_messages,
+                                                data_cipher=dem.NAME)
+                sessions.append(group[1])
+            return group[1].encrypt(plaintext)
+
+        def emit(entry):
+            index, group, item = entry
+            if isinstance(item, Exception):
+                return index, item
+            try:
+                return index, seal(group, item)
+            except Exception as e:
+                return index, e
+
+        try:
+            for index, item in enumerate(items):
+                group = None
+                if not isinstance(item, Exception):
+                    try:
+                        policy, plaintext = item
+                        if not isinstance(plaintext, (bytes, bytearray)):
+                            raise ValueError("Data must be bytes")
+                        if len(plaintext) > self.MAX_PLAINTEXT_SIZE:
+                            raise ValueError(f"Data size exceeds maximum limit of {self.MAX_PLAINTEXT_SIZE} bytes")
+                        compiled_policy = self.compile_policy(policy)
+                        group = groups.get(compiled_policy.normalized)
+                        if group is None or group[2] >= max_messages:
+                            # First item of a policy, or its session is full: start building a header
+                            group = [self.batch_submit('encapsulate_policy', compiled_policy.normalized, wrap.NAME),
+                                     None, 0]
+                            groups[compiled_policy.normalized] = group
+                        group[2] += 1
+                        item = bytes(plaintext)
+                    except Exception as e:
+                        item = e
+                pending.append((index, group, item))
+
+                # Emit every item whose header is ready, and block on the oldest once the window is full
+                while pending and (len(pending) >= self.BATCH_WINDOW or pending[0][1] is None
+                                   or pending[0][1][0].done()):
+                    yield emit(pending.popleft())
+
+            while pending:
+                yield emit(pending.popleft())
+        finally:
+            for session in sessions:
+                session.close()
+
+    def keygen_batch(self, items):
+        """Generate a key per attribute list; iterates (index, keygen result or exception) as keys complete
+
+        Keys are generated in the batch pool, whose processes hold the master key, so throughput grows
+        with the number of batch workers. Results come in completion order, not input order, with at most
+        BATCH_WINDOW keys in flight; an item that is itself an exception (input that failed to parse) is
+        passed through as a failure.
+        """
+        if not self.public_key or not self.master_key:
+            raise RuntimeError("CPABEScheme not initialized. Call setup() first")
+
+        def generate():
+            # future -> index of the item it generates a key for
+            in_flight = {}
+
+            def collect(futures):
+                for future in sorted(futures, key=in_flight.get):
+                    index = in_flight.pop(future)
+                    try:
+                        yield index, future.result()
+                    except Exception as e:
+                        yield index, e
+
+            try:
+                for index, attributes in enumerate(items):
+                    if isinstance(attributes, Exception):
+                        yield index, attributes
+                        continue
+                    in_flight[self.batch_submit('keygen', attributes)] = index
+
+                    # Emit the keys finished so far, and wait for one once the window is full
+                    if len(in_flight) >= self.BATCH_WINDOW:
+                        yield from collect(wait(in_flight, return_when=FIRST_COMPLETED).done)
+                    yield from collect([future for future in in_flight if future.done()])
+
+                while in_flight:
+                    yield from collect(wait(in_flight, return_when=FIRST_COMPLETED).done)
+            finally:
+                # The caller stopped reading: drop the keys nobody will receive
+                for future in in_flight:
+                    future.cancel()
+
+        # Fail on an uninitialized scheme now, not at the first key
+        return generate()
+
+    def derive_payload_key(self, root_key, counter):
+        """AES key of one session payload: HKDF-SHA256 of the session root, salted with the counter"""
+        return self._derive_key(root_key, counter.to_bytes(8, 'big'), self.SESSION_PAYLOAD_INFO)
+
+    def _validate_secret_key(self, secret_key_dict):
+        """Serialized secret key components of a keygen result, checked for the required fields"""
+        if not isinstance(secret_key_dict, dict) or not isinstance(secret_key_dict.get("secret_key"), dict):
+            raise ValueError("Secret key must be a dictionary with a 'secret_key' field")
+        sk_components = secret_key_dict["secret_key"]
+        missing = {'D', 'Dj', 'Djp'} - set(sk_components.keys())
+        if missing:
+            raise ValueError(f"Missing required key components: {missing}")
+        return sk_components
+
+    def _header_key(self, sk_components, header, sk=None):
+        """Key protected by one CP-ABE header, from the session key cache or by decryption; None if unsatisfied"""
+        # Fingerprint the serialized key once for the secret and session key caches
+        fingerprint = None
+        if self.session_key_cache is not None or (sk is None and self.secret_key_cache is not None):
+            fingerprint = self.key_fingerprint(sk_components)
+
+        # Reuse the AES key recovered for this key and header, if cached
+        cache_key = None
+        if self.session_key_cache is not None:
+            cache_key = self._session_cache_key(fingerprint, header)
+            aes_key = self.session_key_cache.get(cache_key)
+            if aes_key is not None:
+                logger.debug("AES key served from the session key cache")
+                return aes_key
+
+        aes_key = self._recover_aes_key(sk_components, header, fingerprint, sk)
+        if aes_key is not None and cache_key is not None:
+            self.session_key_cache.put(cache_key, aes_key)
+        return aes_key
+
+    def _seal_chunk(self, stream_key, prefix, index, chunk, last):
+        nonce = prefix + struct.pack('>IB', index, last)
+        ciphertext, tag = AES.new(stream_key, AES.MODE_GCM, nonce=nonce).encrypt_and_digest(chunk)
+        return ciphertext + tag
+
+    def _open_chunk(self, stream_key, prefix, index, sealed, last):
+        if len(sealed) < self.STREAM_TAG_SIZE:
+            raise ValueError("Truncated encrypted stream")
+        nonce = prefix + struct.pack('>IB', index, last)
+        body = memoryview(sealed)[:-self.STREAM_TAG_SIZE]
+        try:
+            return AES.new(stream_key, AES.MODE_GCM, nonce=nonce).decrypt_and_verify(body, sealed[-self.STREAM_TAG_SIZE:])
+        except ValueError:
+            raise ValueError(f"Stream chunk {index} failed authentication (corrupted, reordered or truncated)")
+
+    def _stream_prelude(self, flags, header_fields, prefix, chunk_size):
+        header = header_fields['cpabe_cipher']
+        # Chunks are always AES-GCM (data cipher id 0); only the key wrap varies
+        mode, key_material = self._envelope_mode(header_fields, AESGCMCipher.NAME)
+        return b''.join([struct.pack('>BBB', self.ENVELOPE_VERSION, mode, flags),
+                         struct.pack('>I', len(header)), header,
+                         struct.pack('>B', len(key_material)), key_material,
+                         struct.pack('>B', len(prefix)), prefix,
+                         struct.pack('>I', chunk_size)])
+
+    def encrypt_stream(self, policy, source, chunk_size=None, seekable=False, key_wrap=None):
+        """Encrypt a file object or iterable of byte chunks under one CP-ABE header, yielding the
+        encrypted object piece by piece: the stream header, then one sealed chunk at a time.
+        With seekable=True an index footer is appended so decrypt_range can read any byte range."""
+        if not self.public_key:
+            raise RuntimeError("CPABEScheme not initialized. Call setup() first")
+        chunk_size = chunk_size or self.STREAM_CHUNK_SIZE
+        if not 0 < chunk_size < 2 ** 32:
+            raise ValueError("Chunk size must be between 1 byte and 4GB")
+
+        compiled_policy = self.compile_policy(policy)
+        root_key, header_fields = self._encapsulate(compiled_policy, binary=True, key_wrap=key_wrap)
+        prefix = get_random_bytes(self.STREAM_NONCE_PREFIX_SIZE)
+        stream_key = self._derive_key(root_key, prefix, self.STREAM_KEY_INFO)
+
+        flags = self.ENVELOPE_FLAG_STREAM | (self.ENVELOPE_FLAG_INDEX if seekable else 0)
+        yield self._stream_prelude(flags, header_fields, prefix, chunk_size)
+
+        # Hold one chunk back so the final one can be flagged; an empty source still gets a final chunk
+        chunks = ChunkReader(source).chunks(chunk_size)
+        current = next(chunks, b'')
+        index = 0
+        plaintext_length = 0
+        for following in chunks:
+            yield self._seal_chunk(stream_key, prefix, index, current, False)
+            plaintext_length += len(current)
+            current = following
+            index += 1
+            if index >= 2 ** 32:
+                raise ValueError("Stream exceeds the maximum number of chunks")
+        yield self._seal_chunk(stream_key, prefix, index, current, True)
+        if seekable:
+            yield self.STREAM_FOOTER.pack(plaintext_length + len(current), index + 1, self.STREAM_FOOTER_MAGIC)
+
+    def _read_stream_header(self, reader, log=False):
+        """Parse the stream (or record log) header; returns (header fields for _header_key,
+        nonce prefix, chunk size, flags, header length in bytes)"""
+        version, mode, flags = struct.unpack('>BBB', reader.read_exact(3))
+        if version != self.ENVELOPE_VERSION:
+            raise ValueError(f"Unsupported envelope version: {version}")
+        wrap, dem = self._read_envelope_mode(mode)
+        if dem.NAME != AESGCMCipher.NAME:
+            raise ValueError(f"Unsupported stream data cipher: {dem.NAME}")
+        if not flags & self.ENVELOPE_FLAG_STREAM:
+            raise ValueError("Not a streamed object; read it with decrypt_data")
+        if log and not flags & self.ENVELOPE_FLAG_LOG:
+            raise ValueError("Not a record log; read it with decrypt_stream")
+        if not log and flags & self.ENVELOPE_FLAG_LOG:
+            raise ValueError("Record log; read it with decrypt_log")
+
+        (header_size,) = struct.unpack('>I', reader.read_exact(4))
+        header = reader.read_exact(header_size)
+        key_material = reader.read_exact(reader.read_exact(1)[0])
+        prefix = reader.read_exact(reader.read_exact(1)[0])
+        (chunk_size,) = struct.unpack('>I', reader.read_exact(4))
+        if len(prefix) != self.STREAM_NONCE_PREFIX_SIZE or not chunk_size:
+            raise ValueError("Invalid stream header")
+
+        fields = {'cpabe_cipher': header, 'key_wrap': wrap.NAME,
+                  'policy': str(BinaryReader(header).prefixed(), 'utf-8')}
+        if wrap.KEY_FIELD:
+            fields[wrap.KEY_FIELD] = key_material
+        header_length = 3 + 4 + len(header) + 1 + len(key_material) + 1 + len(prefix) + 4
+        return fields, prefix, chunk_size, flags, header_length
+
+    def _stream_root_key(self, sk_components, fields):
+        """Root key of a streamed object or record log, recovering the header key once"""
+        if not self.key_satisfies_policy(sk_components, fields):
+            raise ValueError("Policy not satisfied by the provided attributes")
+        root_key = self._header_key(sk_components, fields)
+        if root_key is None:
+            raise ValueError("Policy not satisfied by the provided attributes")
+        return root_key
+
+    def decrypt_stream(self, secret_key_dict, source):
+        """Decrypt an object written by encrypt_stream from a file object or iterable of byte chunks,
+        yielding authenticated plaintext chunks; raises ValueError on tampering or truncation"""
+        sk_components = self._validate_secret_key(secret_key_dict)
+        reader = ChunkReader(source)
+        fields, prefix, chunk_size, flags, _ = self._read_stream_header(reader)
+        stream_key = self._derive_key(self._stream_root_key(sk_components, fields), prefix, self.STREAM_KEY_INFO)
+
+        footer_size = self.STREAM_FOOTER.size if flags & self.ENVELOPE_FLAG_INDEX else 0
+        sealed_size = chunk_size + self.STREAM_TAG_SIZE
+        index = 0
+        plaintext_length = 0
+        while True:
+            # Only the chunk with nothing but the footer after it may carry the final flag
+            if reader.has(sealed_size + footer_size + 1):
+                yield self._open_chunk(stream_key, prefix, index, reader.read(sealed_size), False)
+                plaintext_length += chunk_size
+                index += 1
+                continue
+
+            rest = reader.read(sealed_size + footer_size)
+            if len(rest) < footer_size + self.STREAM_TAG_SIZE:
+                raise ValueError("Truncated encrypted stream")
+            sealed = rest[:len(rest) - footer_size]
+            if footer_size:
+                length, count, magic = self.STREAM_FOOTER.unpack(rest[len(sealed):])
+                expected = plaintext_length + len(sealed) - self.STREAM_TAG_SIZE
+                if magic != self.STREAM_FOOTER_MAGIC or count != index + 1 or length != expected:
+                    raise ValueError("Index footer does not match the stream")
+            yield self._open_chunk(stream_key, prefix, index, sealed, True)
+            return
+
+    def _object_size(self, obj):
+        if isinstance(obj, (bytes, bytearray, memoryview)):
+            return len(obj)
+        return obj.seek(0, os.SEEK_END)
+
+    def _open_source(self, obj, position=0):
+        """Chunk source over a bytes-like object or seekable file, starting at position"""
+        if isinstance(obj, (bytes, bytearray, memoryview)):
+            view = memoryview(obj)
+            return (view[i:i + self.STREAM_CHUNK_SIZE] for i in range(position, len(view), self.STREAM_CHUNK_SIZE))
+        obj.seek(position)
+        return obj
+
+    def _read_at(self, obj, position, size):
+        if isinstance(obj, (bytes, bytearray, memoryview)):
+            return memoryview(obj)[position:position + size]
+        obj.seek(position)
+        return obj.read(size)
+
+    def _read_index(self, obj):
+        """Header and footer of a seekable streamed object; returns (header fields, nonce prefix,
+        chunk size, header length, plaintext length, chunk count)"""
+        size = self._object_size(obj)
+        fields, prefix, chunk_size, flags, header_length = self._read_stream_header(ChunkReader(self._open_source(obj)))
+        if not flags & self.ENVELOPE_FLAG_INDEX:
+            raise ValueError("Object has no index footer; read it with decrypt_stream")
+
+        # Locate chunks from the footer; a forged footer shows up as a size mismatch or a failed final tag
+        footer_size = self.STREAM_FOOTER.size
+        if size < header_length + self.STREAM_TAG_SIZE + footer_size:
+            raise ValueError("Truncated encrypted stream")
+        plaintext_length, count, magic = self.STREAM_FOOTER.unpack(self._read_at(obj, size - footer_size, footer_size))
+        last_size = plaintext_length - (count - 1) * chunk_size
+        if (magic != self.STREAM_FOOTER_MAGIC or count == 0 or not 0 <= last_size <= chunk_size
+                or header_length + plaintext_length + count * self.STREAM_TAG_SIZE + footer_size != size):
+            raise ValueError("Index footer does not match the stream")
+        return fields, prefix, chunk_size, header_length, plaintext_length, count
+
+    def decrypt_range(self, secret_key_dict, obj, offset, length):
+        """Decrypt plaintext bytes [offset, offset + length) of a seekable streamed object.
+
+        obj is a bytes-like object or a seekable binary file. Only the chunks covering the
+        range are read and authenticated, so the cost follows the range, not the object size.
+        """
+        if offset < 0 or length < 0:
+            raise ValueError("Offset and length must be non-negative")
+        sk_components = self._validate_secret_key(secret_key_dict)
+        fields, prefix, chunk_size, header_length, plaintext_length, count = self._read_index(obj)
+
+        end = min(offset + length, plaintext_length)
+        if offset >= end:
+            return b''
+        stream_key = self._derive_key(self._stream_root_key(sk_components, fields), prefix, self.STREAM_KEY_INFO)
+
+        first, final = offset // chunk_size, (end - 1) // chunk_size
+        sealed_size = chunk_size + self.STREAM_TAG_SIZE
+        parts = []
+        for index in range(first, final + 1):
+            last = index == count - 1
+            position = header_length + index * sealed_size
+            sealed = self._read_at(obj, position, min(chunk_size, plaintext_length - index * chunk_size) + self.STREAM_TAG_SIZE)
+            chunk = self._open_chunk(stream_key, prefix, index, sealed, last)
+            start = offset - index * chunk_size if index == first else 0
+            stop = end - index * chunk_size if index == final else len(chunk)
+            parts.append(chunk[start:stop])
+        return b''.join(parts)
+
+    def _run_segments(self, func, count, workers):
+        """Call func(index) for every segment, spread over contiguous batches on the AEAD pool"""
+        workers = min(workers or self.aead_workers, count)
+        if workers <= 1:
+            for index in range(count):
+                func(index)
+            return
+
+        def run_batch(batch):
+            for index in range(batch * count // workers, (batch + 1) * count // workers):
+                func(index)
+        # list() surfaces the first exception raised by any batch
+        list(self._aead_pool().map(run_batch, range(workers)))
+
+    def encrypt_parallel(self, policy, data, segment_size=None, workers=None, key_wrap=None):
+        """Encrypt an in-memory payload as a seekable streamed object, sealing its segments in parallel.
+
+        Segments are encrypted straight into one preallocated bytearray, which is returned; the
+        result reads back with decrypt_parallel, decrypt_stream or decrypt_range.
+        """
+        if not self.public_key:
+            raise RuntimeError("CPABEScheme not initialized. Call setup() first")
+        segment_size = segment_size or self.PARALLEL_SEGMENT_SIZE
+        if not 0 < segment_size < 2 ** 32:
+            raise ValueError("Segment size must be between 1 byte and 4GB")
+        data = memoryview(data).cast('B')
+        count = max(1, -(-len(data) // segment_size))
+        if count >= 2 ** 32:
+            raise ValueError("Stream exceeds the maximum number of chunks")
+
+        compiled_policy = self.compile_policy(policy)
+        root_key, header_fields = self._encapsulate(compiled_policy, binary=True, key_wrap=key_wrap)
+        prefix = get_random_bytes(self.STREAM_NONCE_PREFIX_SIZE)
+        stream_key = self._derive_key(root_key, prefix, self.STREAM_KEY_INFO)
+        prelude = self._stream_prelude(self.ENVELOPE_FLAG_STREAM | self.ENVELOPE_FLAG_INDEX,
+                                       header_fields, prefix, segment_size)
+
+        output = bytearray(len(prelude) + len(data) + count * self.STREAM_TAG_SIZE + self.STREAM_FOOTER.size)
+        view = memoryview(output)
+        view[:len(prelude)] = prelude
+        sealed_size = segment_size + self.STREAM_TAG_SIZE
+
+        def seal(index):
+            chunk = data[index * segment_size:(index + 1) * segment_size]
+            position = len(prelude) + index * sealed_size
+            nonce = prefix + struct.pack('>IB', index, index == count - 1)
+            cipher = AES.new(stream_key, AES.MODE_GCM, nonce=nonce)
+            cipher.encrypt(chunk, output=view[position:position + len(chunk)])
+            view[position + len(chunk):position + len(chunk) + self.STREAM_TAG_SIZE] = cipher.digest()
+
+        self._run_segments(seal, count, workers)
+        view[len(output) - self.STREAM_FOOTER.size:] = self.STREAM_FOOTER.pack(len(data), count, self.STREAM_FOOTER_MAGIC)
+        return output
+
+    def decrypt_parallel(self, secret_key_dict, obj, workers=None):
+        """Decrypt a bytes-like seekable streamed object into one preallocated bytearray,
+        authenticating its segments in parallel; raises ValueError on tampering"""
+        sk_components = self._validate_secret_key(secret_key_dict)
+        obj = memoryview(obj).cast('B')
+        fields, prefix, chunk_size, header_length, plaintext_length, count = self._read_index(obj)
+        stream_key = self._derive_key(self._stream_root_key(sk_components, fields), prefix, self.STREAM_KEY_INFO)
+
+        output = bytearray(plaintext_length)
+        view = memoryview(output)
+        sealed_size = chunk_size + self.STREAM_TAG_SIZE
+
+        def open_segment(index):
+            start = index * chunk_size
+            length = min(chunk_size, plaintext_length - start)
+            position = header_length + index * sealed_size
+            nonce = prefix + struct.pack('>IB', index, index == count - 1)
+            cipher = AES.new(stream_key, AES.MODE_GCM, nonce=nonce)
+            cipher.decrypt(obj[position:position + length], output=view[start:start + length])
+            try:
+                cipher.verify(obj[position + length:position + length + self.STREAM_TAG_SIZE])
+            except ValueError:
+                raise ValueError(f"Stream chunk {index} failed authentication (corrupted, reordered or truncated)")
+
+        self._run_segments(open_segment, count, workers)
+        return output
+
+    def _record_key(self, root_key, log_id, index):
+        return self._derive_key(root_key, log_id + index.to_bytes(8, 'big'), self.LOG_RECORD_INFO)
+
+    def _seal_record(self, root_key, log_id, index, record):
+        # Writers resuming the same log (or an older copy of it) seal different records at one index
+        # under the same key, so every frame carries its own random nonce
+        nonce = get_random_bytes(12)
+        frame = self.LOG_FRAME.pack(index, len(record), nonce)
+        cipher = AES.new(self._record_key(root_key, log_id, index), AES.MODE_GCM, nonce=nonce)
+        cipher.update(frame)
+        ciphertext, tag = cipher.encrypt_and_digest(record)
+        return frame + ciphertext + tag
+
+    def _open_record(self, root_key, log_id, sealed):
+        index, length, nonce = self.LOG_FRAME.unpack_from(sealed)
+        frame, body = sealed[:self.LOG_FRAME.size], memoryview(sealed)[self.LOG_FRAME.size:-self.STREAM_TAG_SIZE]
+        cipher = AES.new(self._record_key(root_key, log_id, index), AES.MODE_GCM, nonce=nonce)
+        cipher.update(frame)
+        try:
+            return index, cipher.decrypt_and_verify(body, sealed[-self.STREAM_TAG_SIZE:])
+        except ValueError:
+            raise ValueError(f"Log record {index} failed authentication")
+
+    def _log_frames(self, reader, max_record):
+        """Complete (index, sealed frame) pairs from reader; stops before a partially written frame"""
+        while reader.has(self.LOG_FRAME.size):
+            index, length, _ = self.LOG_FRAME.unpack(reader.peek(self.LOG_FRAME.size))
+            if length > max_record:
+                raise ValueError(f"Log record {index} exceeds the maximum record size")
+            frame_size = self.LOG_FRAME.size + length + self.STREAM_TAG_SIZE
+            if not reader.has(frame_size):
+                return
+            yield index, reader.read(frame_size)
+
+    def open_log(self, policy, key_wrap=None):
+        """Start an append-only record log under policy; see RecordLogWriter"""
+        if not self.public_key:
+            raise RuntimeError("CPABEScheme not initialized. Call setup() first")
+
+        compiled_policy = self.compile_policy(policy)
+        root_key, header_fields = self._encapsulate(compiled_policy, binary=True, key_wrap=key_wrap)
+        log_id = get_random_bytes(self.STREAM_NONCE_PREFIX_SIZE)
+        # The chunk size field bounds the record size readers accept
+        header = self._stream_prelude(self.ENVELOPE_FLAG_STREAM | self.ENVELOPE_FLAG_LOG,
+                                      header_fields, log_id, self.MAX_PLAINTEXT_SIZE)
+        return RecordLogWriter(self, root_key, log_id, header)
+
+    def decrypt_log(self, secret_key_dict, log, offset=None):
+        """Decrypt the records of a log object (bytes-like or seekable file) from byte offset on.
+
+        Returns ([(index, plaintext), ...], next_offset); pass next_offset back later to read only
+        the records appended since. A partially written final record is left for the next call.
+        """
+        sk_components = self._validate_secret_key(secret_key_dict)
+        reader = ChunkReader(self._open_source(log))
+        fields, log_id, max_record, _, header_length = self._read_stream_header(reader, log=True)
+        if offset is not None and offset < header_length:
+            raise ValueError("Offset points into the log header")
+        root_key = self._stream_root_key(sk_components, fields)
+
+        position = header_length if offset is None else offset
+        if offset is not None:
+            reader = ChunkReader(self._open_source(log, position))
+        # Indices are authenticated, so gaps and reordering show up as an unexpected index
+        expected = 0 if offset is None else None
+        records = []
+        for _, sealed in self._log_frames(reader, max_record):
+            index, plaintext = self._open_record(root_key, log_id, sealed)
+            if expected is not None and index != expected:
+                raise ValueError(f"Log record {expected} is missing or out of order")
+            records.append((index, plaintext))
+            expected = index + 1
+            position += len(sealed)
+        return records, position
+
+    def resume_log(self, secret_key_dict, log):
+        """RecordLogWriter continuing an existing log, for a holder of a key satisfying its policy.
+
+        Only the frame headers are scanned and the last record authenticated; no record is decrypted.
+        """
+        sk_components = self._validate_secret_key(secret_key_dict)
+        reader = ChunkReader(self._open_source(log))
+        fields, log_id, max_record, _, header_length = self._read_stream_header(reader, log=True)
+        root_key = self._stream_root_key(sk_components, fields)
+
+        position, next_index, last = header_length, 0, None
+        for index, sealed in self._log_frames(reader, max_record):
+            if index != next_index:
+                raise ValueError(f"Log record {next_index} is missing or out of order")
+            position += len(sealed)
+            next_index, last = index + 1, sealed
+        if position != self._object_size(log):
+            raise ValueError("Log ends in a partially written record")
+        if last is not None:
+            self._open_record(root_key, log_id, last)
+
+        header = bytes(self._read_at(log, 0, header_length))
+        return RecordLogWriter(self, root_key, log_id, header, next_index, position)
+
+
+    def decrypt_data(self, secret_key_dict: dict, encrypted_dict: dict, in_place: bool = False) -> bytes:
+        """
+        Decrypts data that was encrypted using the `encrypt_data` method.
+        The process involves:
+        1. Deserializing and validating the provided secret key.
+        2. Deserializing the CP-ABE ciphertext from the encrypted dictionary.
+        3. Decrypting the session key (GT element) using the secret key.
+        4. Rebuilding the same AES key from the recovered session key with the envelope's key wrap.
+        5. Decrypting the actual data with the envelope's data cipher (AES-256-GCM if unrecorded).
+
+        Args:
+            secret_key_dict (dict): The serialized secret key dictionary
+                                    (as returned by keygen, under "secret_key").
+            encrypted_dict (dict): The dictionary containing encrypted data components
+                                   (nonce, ciphertext, tag, cpabe_cipher, policy,
+                                   key_wrap, data_cipher).
+            in_place (bool): Decrypt a writable raw ciphertext buffer (e.g. from `b64decode_buffer`)
+                             over itself and return that buffer instead of new bytes.
+
+        Returns:
+            bytes: The original decrypted plaintext data.
+
+        Raises:
+            ValueError: If input dictionaries are invalid, components are missing,
+                        or decryption fails at any stage (e.g., policy not satisfied,
+                        invalid AES tag).
+            RuntimeError: For unexpected errors during the decryption process.
+        """
+        try:
+            # 1. Validate input secret key dictionary structure
+            if not isinstance(secret_key_dict, dict) or "secret_key" not in secret_key_dict:
+                raise ValueError("Secret key dictionary must be a dictionary and contain a 'secret_key' field.")
+            
+            # Binary envelopes are read straight into raw fields
+            if isinstance(encrypted_dict, (bytes, bytearray, memoryview)):
+                encrypted_dict = self.parse_envelope(encrypted_dict)
+
+            sk_components_serialized = secret_key_dict["secret_key"]
+            if not isinstance(sk_components_serialized, dict):
+                raise ValueError("'secret_key' field in secret key dictionary must be a dictionary of components.")
+
+            # Required components for the Charm-Crypto secret key
+            required_sk_components = {'D', 'Dj', 'Djp'}
+            missing_sk_comps = required_sk_components - set(sk_components_serialized.keys())
+            if missing_sk_comps:
+                raise ValueError(f"Missing required secret key components: {missing_sk_comps}.")
+
+            return self._decrypt_envelope(sk_components_serialized, encrypted_dict, in_place)
+
+        except ValueError as ve:
+            logger.error(f"Decryption input validation error: {str(ve)}")
+            raise # Re-raise ValueErrors for clear input issues
+        except RuntimeError as re:
+            logger.error(f"Decryption runtime error: {str(re)}")
+            raise # Re-raise RuntimeErrors for critical operational failures
+        except Exception as e:
+            logger.error(f"An unexpected error occurred during the overall decryption process: {str(e)}")
+            raise RuntimeError(f"Unexpected error during decryption: {str(e)}")
+
+    def _decrypt_envelope(self, sk_components, encrypted_dict, in_place=False, sk=None, header_keys=None):
+        """Decrypt one parsed envelope with a validated serialized key; None if the key's attributes do not
+        satisfy its policy. sk is the already deserialized key, and header_keys a dict of header keys
+        recovered earlier in the same batch, keyed by header digest."""
+        # Reject keys whose attributes cannot satisfy the policy before any group element is touched.
+        # Multi-header envelopes carry one header per policy; pick the one this key satisfies.
+        headers = encrypted_dict.get('headers')
+        if headers is not None:
+            header = self.select_header(sk_components, headers)
+        elif self.key_satisfies_policy(sk_components, encrypted_dict):
+            header = encrypted_dict
+        else:
+            header = None
+        if header is None:
+            logger.info("CP-ABE decryption skipped: policy not satisfied by the provided attributes.")
+            return None # Indicate decryption failure due to policy mismatch
+
+        # Recover the header's key, from the batch's recovered keys or the session key cache when possible
+        header_digest = aes_key = None
+        if header_keys is not None:
+            header_digest = self._session_cache_key(None, header)[1]
+            aes_key = header_keys.get(header_digest)
+        if aes_key is None:
+            aes_key = self._header_key(sk_components, header, sk)
+            if aes_key is None:
+                return None # Indicate decryption failure due to policy mismatch
+            if header_digest is not None:
+                header_keys[header_digest] = aes_key
+
+        # The header's key only wraps the data key in a multi-header envelope
+        if headers is not None:
+            aes_key = self._unwrap_data_key(aes_key, header)
+
+        # Payloads of an encapsulation session each use their own key under the session root
+        session_counter = encrypted_dict.get('session_counter')
+        if session_counter is not None:
+            if type(session_counter) is not int or not 0 <= session_counter < 2 ** 64:
+                raise ValueError("Invalid 'session_counter' in encrypted dictionary.")
+            aes_key = self.derive_payload_key(aes_key, session_counter)
+
+        # 5. Decode AES parameters and perform AES-GCM decryption
+        try:
+            nonce_b64 = encrypted_dict.get('nonce')
+            tag_b64 = encrypted_dict.get('tag')
+            ciphertext_b64 = encrypted_dict.get('ciphertext')
+
+            if not (nonce_b64 and tag_b64 and ciphertext_b64):
+                raise ValueError("Missing one or more AES components (nonce, tag, or ciphertext) in encrypted_dict.")
+
+            nonce = self._envelope_bytes(nonce_b64)
+            tag = self._envelope_bytes(tag_b64)
+            ciphertext = self._envelope_bytes(ciphertext_b64)
+
+            # Envelopes predating the data_cipher field are AES-256-GCM
+            data_cipher = encrypted_dict.get('data_cipher') or AESGCMCipher.NAME
+            decrypted_plaintext = self._open_payload(aes_key, nonce, ciphertext, tag, in_place, data_cipher)
+            logger.debug("AES-GCM data decryption successful.")
+            return decrypted_plaintext
+
+        except Exception as e:
+            logger.error(f"AES-GCM data decryption failed. This could be due to an incorrect key, "
+                         f"invalid authentication tag, or corrupted ciphertext: {str(e)}")
+            raise ValueError(f"AES-GCM decryption failed: {str(e)}")
+
+    def decrypt_many(self, secret_key_dict, envelopes):
+        """Decrypt envelopes under one secret key, returning plaintext, None or the exception for each
+
+        The key is deserialized once for the whole call and each distinct CP-ABE header is decrypted
+        once, so envelopes sharing a header (e.g. from encrypt_batch) cost one pairing evaluation.
+        """
+        sk_components = self._validate_secret_key(secret_key_dict)
+        sk = self.load_secret_key(sk_components)
+        header_keys = {}
+        results = []
+        for envelope in envelopes:
+            try:
+                if isinstance(envelope, (bytes, bytearray, memoryview)):
+                    envelope = self.parse_envelope(envelope)
+                results.append(self._decrypt_envelope(sk_components, envelope, sk=sk, header_keys=header_keys))
+            except Exception as e:
+                logger.error(f"Batch item decryption failed: {str(e)}")
+                results.append(e)
+        return results
+
+    def decrypt_batch(self, secret_key_dict, envelopes):
+        """Decrypt envelopes under one secret key; a list of plaintext, None (policy not satisfied) or
+        the exception for each envelope, in input order
+
+        Every envelope's policy is checked against the key's attributes first, without pairings. The
+        satisfiable ones are split over the batch pool, one chunk per worker, with all envelopes of a
+        header in the same chunk; each worker deserializes the key once for its chunk.
+        """
+        sk_components = self._validate_secret_key(secret_key_dict)
+        results = [None] * len(envelopes)
+        chunks = [([], []) for _ in range(self.batch_workers)]
+        header_chunks = {}
+
+        for index, envelope in enumerate(envelopes):
+            # What goes to the pool: parsed binary envelopes hold memoryviews, which do not pickle
+            raw = envelope
+            try:
+                if isinstance(envelope, (bytes, bytearray, memoryview)):
+                    raw = bytes(envelope)
+                    envelope = self.parse_envelope(raw)
+                if not isinstance(envelope, dict):
+                    raise ValueError("Encrypted data must be a dictionary")
+                headers = envelope.get('headers')
+                if headers is not None:
+                    header = self.select_header(sk_components, headers)
+                elif self.key_satisfies_policy(sk_components, envelope):
+                    header = envelope
+                else:
+                    header = None
+            except Exception as e:
+                results[index] = e
+                continue
+            if header is None:
+                continue
+
+            # Spread distinct headers round-robin over the chunks
+            header_digest = self._session_cache_key(None, header)[1]
+            chunk = header_chunks.get(header_digest)
+            if chunk is None:
+                chunk = header_chunks[header_digest] = chunks[len(header_chunks) % len(chunks)]
+            chunk[0].append(index)
+            chunk[1].append(raw)
+
+        futures = [(indices, self.batch_submit('decrypt_many', secret_key_dict, chunk_envelopes))
+                   for indices, chunk_envelopes in chunks if indices]
+        for indices, future in futures:
+            try:
+                chunk_results = future.result()
+            except Exception as e:
+                logger.error(f"Batch decryption chunk failed: {str(e)}")
+                chunk_results = [e] * len(indices)
+            for index, result in zip(indices, chunk_results):
+                results[index] = result
+        return results
+
+    def key_fingerprint(self, sk_components):
+        """Stable SHA-256 fingerprint of a serialized secret key"""
+        canonical = json.dumps(sk_components, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def _session_cache_key(self, fingerprint, encrypted_dict):
+        """Cache key for a recovered AES key: (secret key fingerprint, header digest)"""
+        header = hashlib.sha256()
+        for field in self.SESSION_KEY_FIELDS:
+            value = encrypted_dict.get(field, '')
+            header.update(value if isinstance(value, bytes) else str(value).encode('utf-8'))
+            header.update(b'\0')
+        return (fingerprint, header.hexdigest())
+
+    def _deserialize_secret_key(self, sk_components):
+        """Deserialize a serialized secret key, leaving Dj/Djp entries encoded until used"""
+        try:
+            return self.codec.decode(SchemaCodec.SECRET_KEY_SCHEMA, sk_components)
+        except Exception as e:
+            logger.error(f"Failed to deserialize secret key: {str(e)}")
+            raise ValueError(f"Failed to deserialize secret key: {str(e)}")
+
+    def load_secret_key(self, sk_components, fingerprint=None):
+        """Return the deserialized secret key, served from the secret key cache when possible"""
+        if self.secret_key_cache is None:
+            return self._deserialize_secret_key(sk_components)
+
+        if fingerprint is None:
+            fingerprint = self.key_fingerprint(sk_components)
+        sk = self.secret_key_cache.get(fingerprint)
+        if sk is None:
+            sk = self._deserialize_secret_key(sk_components)
+            self.secret_key_cache.put(fingerprint, sk)
+            logger.debug("Secret key deserialized and cached")
+        return sk
+
+    def secret_key_cache_stats(self):
+        """Return hit/miss counters of the secret key cache"""
+        if self.secret_key_cache is None:
+            return {"enabled": False}
+        stats = self.secret_key_cache.stats()
+        stats["enabled"] = True
+        return stats
+
+    def session_key_cache_stats(self):
+        """Return hit ratio and eviction counters of the session key cache"""
+        if self.session_key_cache is None:
+            return {"enabled": False}
+        stats = self.session_key_cache.stats()
+        stats["enabled"] = True
+        return stats
+
+    def _recover_aes_key(self, sk_components_serialized: dict, encrypted_dict: dict, fingerprint=None,
+                         sk=None) -> bytes:
+        """Deserialize the key and CP-ABE header, decrypt the session key and derive the AES key"""
+        # Deserialize the secret key components, reusing a cached copy when possible
+        if sk is None:
+            sk = self.load_secret_key(sk_components_serialized, fingerprint)
+
+        # 2. Decode and deserialize the CP-ABE ciphertext from the encrypted_dict
+        cpabe_cipher_b64 = encrypted_dict.get('cpabe_cipher')
+        if not cpabe_cipher_b64:
+            raise ValueError("Encrypted dictionary missing 'cpabe_cipher' component.")
+
+        try:
+            if isinstance(cpabe_cipher_b64, bytes):
+                # Binary envelope header, already free of base64/JSON
+                cpabe_cipher_elements = self.unpack_cpabe_header(cpabe_cipher_b64)
+            else:
+                cpabe_cipher_json_bytes = base64.b64decode(cpabe_cipher_b64)
+                serialized_cpabe_cipher = json.loads(cpabe_cipher_json_bytes.decode('utf-8'))
+                cpabe_cipher_elements = self.deserialize_cpabe_cipher(serialized_cpabe_cipher)
+            logger.debug("CP-ABE ciphertext successfully decoded and deserialized.")
+        except Exception as e:
+            logger.error(f"Failed to decode or deserialize CP-ABE cipher from input: {str(e)}")
+            raise ValueError(f"Failed to decode or deserialize CP-ABE cipher: {str(e)}")
+
+        # 3. Decrypt the session key (GT element) using the CP-ABE scheme
+        try:
+            # Need the public key for decryption as well
+            if not self.public_key:
+                raise RuntimeError("Public key not loaded. Cannot perform CP-ABE decryption.")
+
+            session_key_gt = self._bsw07_decrypt(sk, cpabe_cipher_elements)
+
+            # Decryption returns None if policy is not satisfied
+            if session_key_gt is None:
+                logger.info("CP-ABE decryption failed: policy not satisfied by the provided attributes.")
+                return None # Indicate decryption failure due to policy mismatch
+            logger.debug("CP-ABE decryption successful, session key (GT element) recovered.")
+        except Exception as e:
+            # Catch specific exceptions from Charm-Crypto for policy issues
+            if "insufficient attributes" in str(e).lower() or "policy not satisfied" in str(e).lower():
+                logger.info(f"CP-ABE decryption failed due to policy mismatch: {str(e)}")
+                return None
+            else:
+                logger.error(f"CP-ABE decryption failed with an unexpected error: {str(e)}")
+                raise ValueError(f"CP-ABE decryption failed: {str(e)}")
+
+        # 4. Rebuild the AES key from the recovered session key with the envelope's key wrap
+        try:
+            if not hasattr(session_key_gt, 'initPP'):
+                logger.error("Recovered session key is not a valid Charm group element (GT).")
+                return None # Invalid session key format
+
+            session_key_bytes = self.group.serialize(session_key_gt)
+            if not session_key_bytes:
+                logger.error("Serialization of decrypted session key resulted in empty bytes.")
+                return None
+
+            wrap = self.envelope_key_wrap(encrypted_dict)
+            key_material = self._envelope_bytes(encrypted_dict[wrap.KEY_FIELD]) if wrap.KEY_FIELD else b''
+            aes_key = wrap.unwrap(session_key_bytes, key_material)
+            logger.debug(f"AES key successfully rebuilt with the '{wrap.NAME}' key wrap.")
+
+        except Exception as e:
+            logger.error(f"Failed to reconstruct AES key from decrypted session key: {str(e)}")
+            raise ValueError(f"Failed to reconstruct AES key: {str(e)}")
+
+        return aes_key
+
+# --- Batch pool processes ---
+_batch_scheme = None
+
+def _init_batch_worker(options):
+    """Load the keys once in a batch pool process"""
+    global _batch_scheme
+    scheme = CPABEScheme(**options)
+    # Never let a pool process run setup() and replace the parent's keys
+    if not os.path.exists(scheme.PUBLIC_KEY_FILE) or not scheme.load_keys():
+        raise RuntimeError("Batch worker failed to load CP-ABE keys")
+    _batch_scheme = scheme
+
+def _batch_call(method, *args):
+    # Another process may have run setup() since this one loaded the keys
+    _batch_scheme.reload_keys_if_changed()
+    return getattr(_batch_scheme, method)(*args)
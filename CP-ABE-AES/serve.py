@@ -0,0 +1,251 @@
+import argparse
+import gc
+import logging
+import os
+import select
+import signal
+import socket
+import threading
+import time
+
+from werkzeug.serving import ThreadedWSGIServer, WSGIRequestHandler
+
+# Importing the app loads the keys, precomputation tables and attribute hashes once, in the master
+from app import app, cpabe_instance
+
+logger = logging.getLogger(__name__)
+
+class WorkerRequestHandler(WSGIRequestHandler):
+    # One request per connection: a busy worker never holds idle keep-alive connections,
+    # so every new request goes back to the shared accept queue
+    protocol_version = "HTTP/1.0"
+
+class WorkerServer(ThreadedWSGIServer):
+    """WSGI server on the inherited listening socket that serves one request at a time
+
+    The worker's CPABEScheme shares its keys, caches and reload state between requests and is not
+    safe under concurrent ones; pairing work holds the GIL anyway, so concurrency comes from workers.
+    The request still runs on its own thread, so stop() can let it finish.
+    """
+
+    # Let server_close() wait for the request in flight instead of abandoning it
+    daemon_threads = False
+    block_on_close = True
+
+    def __init__(self, host, port, app, fd, max_requests=0):
+        super().__init__(host, port, app, handler=WorkerRequestHandler, fd=fd)
+        # Recycle the worker after this many requests (0: never)
+        self.max_requests = max_requests
+        self.requests_served = 0
+        self._idle = threading.BoundedSemaphore(1)
+        self._stopping = threading.Event()
+
+    def process_request(self, request, client_address):
+        # Block the accept loop until the current request is done, so idle siblings take new connections
+        self._idle.acquire()
+        try:
+            super().process_request(request, client_address)
+        except BaseException:
+            self._idle.release()
+            raise
+        self.requests_served += 1
+        if self.max_requests and self.requests_served >= self.max_requests:
+            logger.info(f"Worker {os.getpid()} served {self.requests_served} requests, recycling")
+            self.stop()
+
+    def process_request_thread(self, request, client_address):
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            self._idle.release()
+
+    def stop(self):
+        """Stop accepting and let the request in flight finish; safe to call from a signal handler"""
+        if not self._stopping.is_set():
+            self._stopping.set()
+            # shutdown() waits for serve_forever(), so it cannot run on the serving thread itself
+            threading.Thread(target=self.shutdown, daemon=True).start()
+
+class PreforkServer:
+    """Master process that loads CP-ABE state once and serves it from N forked workers
+
+    Workers share the master's keys, precomputed tables and attribute hashes copy-on-write, accept
+    from one listening socket and serve one request at a time each. SIGHUP reloads the keys and
+    replaces the workers without dropping connections; SIGTERM/SIGINT stop them gracefully.
+    """
+
+    def __init__(self, app, scheme, host='0.0.0.0', port=6000, workers=None, max_requests=0,
+                 graceful_timeout=30, batch_workers=0):
+        self.app = app
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.num_workers = workers or os.cpu_count() or 1
+        # Each worker starts its own batch pool on first use, so split the CPUs between them
+        # instead of giving every worker one batch process per CPU (0: CPUs / workers, 1: in-process)
+        scheme.batch_workers = batch_workers or max(1, (os.cpu_count() or 1) // self.num_workers)
+        self.max_requests = max_requests
+        self.graceful_timeout = graceful_timeout
+        self.socket = None
+        # pid -> generation; a reload bumps the generation and retires the older workers
+        self.workers = {}
+        self.generation = 0
+        self._pending_signals = []
+        self._stop_deadline = None
+        self._wakeup_r = self._wakeup_w = None
+
+    # --- Master ---
+    def run(self):
+        self.socket = socket.create_server((self.host, self.port), backlog=1024)
+        # Workers race for each connection; the losers must get EAGAIN instead of blocking in accept()
+        self.socket.setblocking(False)
+        self._install_signals()
+        logger.info(f"Master {os.getpid()} listening on {self.host}:{self.port} with {self.num_workers} workers")
+
+        try:
+            self._spawn_workers()
+            while self.workers or self._stop_deadline is None:
+                self._wait_for_signal(timeout=1.0)
+                self._handle_signals()
+                self._reap_workers()
+                if self._stop_deadline is None:
+                    self._spawn_workers()
+                elif time.monotonic() > self._stop_deadline:
+                    self._signal_workers(signal.SIGKILL, self.workers)
+        finally:
+            self.socket.close()
+            signal.set_wakeup_fd(-1)
+            os.close(self._wakeup_r)
+            os.close(self._wakeup_w)
+        logger.info(f"Master {os.getpid()} stopped")
+
+    def _install_signals(self):
+        # Signals only queue work; the master loop wakes up on the self-pipe and handles them
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        os.set_blocking(self._wakeup_r, False)
+        os.set_blocking(self._wakeup_w, False)
+        signal.set_wakeup_fd(self._wakeup_w)
+        for sig in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT, signal.SIGCHLD):
+            signal.signal(sig, self._on_signal)
+
+    def _on_signal(self, signum, frame):
+        self._pending_signals.append(signum)
+
+    def _wait_for_signal(self, timeout):
+        if not self._pending_signals:
+            select.select([self._wakeup_r], [], [], timeout)
+        try:
+            while os.read(self._wakeup_r, 4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def _handle_signals(self):
+        while self._pending_signals:
+            signum = self._pending_signals.pop(0)
+            if signum == signal.SIGHUP and self._stop_deadline is None:
+                self.reload()
+            elif signum in (signal.SIGTERM, signal.SIGINT) and self._stop_deadline is None:
+                logger.info(f"Master {os.getpid()} stopping, waiting up to {self.graceful_timeout}s for workers")
+                self._stop_deadline = time.monotonic() + self.graceful_timeout
+                self._signal_workers(signal.SIGTERM, self.workers)
+
+    def reload(self):
+        """Reload the keys in the master, start a new generation of workers and retire the old one"""
+        if not self.scheme.load_keys():
+            logger.error("Reload failed to load keys, keeping the current workers")
+            return False
+        old_workers = list(self.workers)
+        self.generation += 1
+        # New workers start accepting before the old ones stop, so no connection is refused
+        self._spawn_workers()
+        self._signal_workers(signal.SIGTERM, old_workers)
+        logger.info(f"Reloaded keys, generation {self.generation} replaces {len(old_workers)} workers")
+        return True
+
+    def _signal_workers(self, signum, pids):
+        for pid in list(pids):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def _reap_workers(self):
+        while self.workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self.workers.clear()
+                return
+            if pid == 0:
+                return
+            generation = self.workers.pop(pid, None)
+            if generation == self.generation and self._stop_deadline is None and status != 0:
+                logger.warning(f"Worker {pid} exited unexpectedly (status {status}), respawning")
+
+    def _spawn_workers(self):
+        current = sum(1 for generation in self.workers.values() if generation == self.generation)
+        if current >= self.num_workers:
+            return
+        self._prepare_fork()
+        for _ in range(self.num_workers - current):
+            pid = os.fork()
+            if pid == 0:
+                self._run_worker()
+            self.workers[pid] = self.generation
+
+    def _prepare_fork(self):
+        # Background threads do not survive fork() and could leave their locks held in the child;
+        # workers restart the encryption pool themselves and create the AEAD and batch pools on demand
+        self.scheme.stop_encryption_pool()
+        self.scheme.stop_aead_pool()
+        self.scheme.stop_batch_pool()
+        # Move the loaded state out of the collector's reach so garbage collection in the workers
+        # does not write to, and thereby copy, the shared pages
+        gc.collect()
+        gc.freeze()
+
+    # --- Worker ---
+    def _run_worker(self):
+        exit_code = 0
+        try:
+            signal.set_wakeup_fd(-1)
+            os.close(self._wakeup_r)
+            os.close(self._wakeup_w)
+            for sig in (signal.SIGHUP, signal.SIGCHLD):
+                signal.signal(sig, signal.SIG_DFL)
+            # Ctrl+C reaches the whole process group; only the master decides how to stop
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+            server = WorkerServer(self.host, self.port, self.app, self.socket.fileno(),
+                                  max_requests=self.max_requests)
+            signal.signal(signal.SIGTERM, lambda signum, frame: server.stop())
+            self.scheme.start_encryption_pool()
+            logger.info(f"Worker {os.getpid()} (generation {self.generation}) started")
+            server.serve_forever()
+            logger.info(f"Worker {os.getpid()} stopped after {server.requests_served} requests")
+        except BaseException as e:
+            logger.error(f"Worker {os.getpid()} failed: {str(e)}")
+            exit_code = 1
+        finally:
+            # Skip the master's atexit handlers and never return into the master's loop
+            os._exit(exit_code)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Pre-fork production server for the CP-ABE API")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=6000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument("--max-requests", type=int, default=0,
+                        help="Recycle a worker after this many requests (0: never)")
+    parser.add_argument("--graceful-timeout", type=float, default=30,
+                        help="Seconds workers get to finish their current request on stop")
+    parser.add_argument("--batch-workers", type=int, default=int(os.environ.get('CPABE_BATCH_WORKERS', '0')),
+                        help="Batch pool processes per worker (0: the CPUs split over the workers)")
+    parser.add_argument("--log-level", default="INFO")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(args.log_level.upper())
+    PreforkServer(app, cpabe_instance, host=args.host, port=args.port, workers=args.workers,
+                  max_requests=args.max_requests,
+                  graceful_timeout=args.graceful_timeout, batch_workers=args.batch_workers).run()
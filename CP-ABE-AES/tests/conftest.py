@@ -0,0 +1,29 @@
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("charm")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cpabe_schemes import CPABEScheme
+
+@pytest.fixture(scope="module")
+def keys_dir(tmp_path_factory):
+    """Keys of a fresh CP-ABE system, shared by the tests of one module"""
+    path = str(tmp_path_factory.mktemp("keys"))
+    assert CPABEScheme(keys_dir=path, batch_workers=1).setup()
+    return path
+
+@pytest.fixture(scope="module")
+def scheme(keys_dir):
+    scheme = CPABEScheme(keys_dir=keys_dir, batch_workers=1)
+    assert scheme.load_keys()
+    yield scheme
+    scheme.stop_encryption_pool()
+    scheme.stop_aead_pool()
+
+@pytest.fixture(scope="module")
+def key_data(scheme):
+    return scheme.keygen(["admin", "it"])
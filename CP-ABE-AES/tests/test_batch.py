@@ -0,0 +1,38 @@
+import pytest
+
+from cpabe_schemes import CPABEScheme
+
+@pytest.fixture(scope="module")
+def pooled_scheme(keys_dir):
+    scheme = CPABEScheme(keys_dir=keys_dir, batch_workers=2)
+    assert scheme.load_keys()
+    yield scheme
+    scheme.stop_batch_pool()
+
+def test_decrypt_batch_mixed_binary_and_json(scheme, pooled_scheme, key_data):
+    envelopes = [
+        scheme.encrypt_data("admin and it", b"json record"),
+        scheme.encrypt_data("admin and it", b"binary record", binary=True),
+        scheme.encrypt_data("hr", b"not for this key"),
+        scheme.encrypt_data("it", b"another binary record", binary=True),
+        "not an envelope",
+    ]
+    for batch_scheme in (scheme, pooled_scheme):
+        results = batch_scheme.decrypt_batch(key_data, envelopes)
+        assert results[:4] == [b"json record", b"binary record", None, b"another binary record"]
+        assert isinstance(results[4], ValueError)
+
+def test_decrypt_batch_shared_headers(pooled_scheme, key_data):
+    items = [("admin or hr", f"record {i}".encode()) for i in range(10)]
+    envelopes = [envelope for _, envelope in pooled_scheme.encrypt_batch(items)]
+    assert pooled_scheme.decrypt_batch(key_data, envelopes) == [plaintext for _, plaintext in items]
+
+def test_decrypt_batch_rejects_invalid_key(scheme):
+    with pytest.raises(ValueError):
+        scheme.decrypt_batch({"secret_key": {}}, [])
+
+def test_keygen_batch_reports_every_item(pooled_scheme):
+    results = dict(pooled_scheme.keygen_batch([["admin"], ValueError("bad item"), ["it", "hr"]]))
+    assert sorted(results) == [0, 1, 2]
+    assert isinstance(results[1], ValueError)
+    assert sorted(results[2]["secret_key"]["Dj"]) == ["HR", "IT"]
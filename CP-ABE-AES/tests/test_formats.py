@@ -0,0 +1,162 @@
+import base64
+
+import pytest
+
+PAYLOAD = bytes(range(256)) * 40
+
+def tamper(data, position):
+    data = bytearray(data)
+    data[position] ^= 0x01
+    return data
+
+def test_stream_round_trip(scheme, key_data):
+    pieces = list(scheme.encrypt_stream("admin and it", [PAYLOAD], chunk_size=1000))
+    assert b"".join(scheme.decrypt_stream(key_data, pieces)) == PAYLOAD
+    empty = list(scheme.encrypt_stream("admin", [], chunk_size=1000))
+    assert b"".join(scheme.decrypt_stream(key_data, empty)) == b""
+
+def test_stream_truncation_reordering_and_tampering(scheme, key_data):
+    # The prelude comes first, then one sealed chunk per piece
+    pieces = list(scheme.encrypt_stream("admin and it", [PAYLOAD], chunk_size=1000))
+    truncated = pieces[:-1]
+    reordered = [pieces[0], pieces[2], pieces[1]] + pieces[3:]
+    tampered = pieces[:2] + [tamper(pieces[2], 10)] + pieces[3:]
+    for source in (truncated, reordered, tampered, pieces[:1]):
+        with pytest.raises(ValueError):
+            b"".join(scheme.decrypt_stream(key_data, source))
+
+def test_stream_requires_satisfying_key(scheme, key_data):
+    pieces = list(scheme.encrypt_stream("hr", [PAYLOAD]))
+    with pytest.raises(ValueError):
+        list(scheme.decrypt_stream(key_data, pieces))
+
+def test_decrypt_range(scheme, key_data):
+    obj = b"".join(scheme.encrypt_stream("admin", [PAYLOAD], chunk_size=1000, seekable=True))
+    for offset, length in ((0, 10), (995, 10), (2500, 3000), (len(PAYLOAD) - 5, 100), (len(PAYLOAD), 10)):
+        assert scheme.decrypt_range(key_data, obj, offset, length) == PAYLOAD[offset:offset + length]
+
+def test_decrypt_range_truncation_and_tampering(scheme, key_data):
+    obj = b"".join(scheme.encrypt_stream("admin", [PAYLOAD], chunk_size=1000, seekable=True))
+    with pytest.raises(ValueError):
+        scheme.decrypt_range(key_data, obj[:-1], 0, 10)
+    with pytest.raises(ValueError):
+        scheme.decrypt_range(key_data, obj[:-1024], 0, 10)
+    # Flip a byte in the last chunk, which the range below covers
+    with pytest.raises(ValueError):
+        scheme.decrypt_range(key_data, tamper(obj, len(obj) - 40), len(PAYLOAD) - 10, 10)
+    unindexed = b"".join(scheme.encrypt_stream("admin", [PAYLOAD]))
+    with pytest.raises(ValueError):
+        scheme.decrypt_range(key_data, unindexed, 0, 10)
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_parallel_round_trip(scheme, key_data, workers):
+    obj = scheme.encrypt_parallel("admin and it", PAYLOAD, segment_size=1000, workers=workers)
+    assert scheme.decrypt_parallel(key_data, obj, workers=workers) == PAYLOAD
+    # The result is an ordinary seekable streamed object
+    assert b"".join(scheme.decrypt_stream(key_data, [obj])) == PAYLOAD
+    assert scheme.decrypt_range(key_data, obj, 1500, 1000) == PAYLOAD[1500:2500]
+
+def test_parallel_truncation_reordering_and_tampering(scheme, key_data):
+    obj = scheme.encrypt_parallel("admin", PAYLOAD, segment_size=1000, workers=2)
+    sealed_size = 1000 + scheme.STREAM_TAG_SIZE
+    header_length = len(obj) - len(PAYLOAD) - 11 * scheme.STREAM_TAG_SIZE - scheme.STREAM_FOOTER.size
+    first, second = header_length, header_length + sealed_size
+    reordered = bytearray(obj)
+    reordered[first:second], reordered[second:second + sealed_size] = obj[second:second + sealed_size], obj[first:second]
+    for bad in (obj[:-1], reordered, tamper(obj, header_length + 5)):
+        with pytest.raises(ValueError):
+            scheme.decrypt_parallel(key_data, bad, workers=2)
+
+def test_log_round_trip_and_incremental_reads(scheme, key_data):
+    writer = scheme.open_log("admin or hr")
+    log = bytearray(writer.header)
+    log += writer.append(b"first") + writer.append(b"second")
+    records, offset = scheme.decrypt_log(key_data, log)
+    assert records == [(0, b"first"), (1, b"second")]
+    assert offset == len(log) == writer.size
+
+    log += writer.append(b"third")
+    assert scheme.decrypt_log(key_data, log, offset) == ([(2, b"third")], len(log))
+    writer.close()
+
+def test_log_partial_record_and_resume(scheme, key_data):
+    writer = scheme.open_log("admin")
+    log = bytearray(writer.header) + writer.append(b"one")
+    frame = writer.append(b"two")
+    partial = log + frame[:-3]
+    # A partially written record is left for the next read, but cannot be resumed after
+    assert scheme.decrypt_log(key_data, partial) == ([(0, b"one")], len(log))
+    with pytest.raises(ValueError):
+        scheme.resume_log(key_data, partial)
+
+    log += frame
+    resumed = scheme.resume_log(key_data, log)
+    assert (resumed.next_index, resumed.size) == (2, len(log))
+    log += resumed.append(b"three")
+    assert [record for _, record in scheme.decrypt_log(key_data, log)[0]] == [b"one", b"two", b"three"]
+
+def test_log_resumed_twice_never_reuses_a_nonce(scheme, key_data):
+    writer = scheme.open_log("admin")
+    log = bytes(writer.header) + writer.append(b"one")
+    first, second = scheme.resume_log(key_data, log), scheme.resume_log(key_data, log)
+    frame_a, frame_b = first.append(b"same"), second.append(b"same")
+    nonce_start = scheme.LOG_FRAME.size - 12
+    assert frame_a[:nonce_start] == frame_b[:nonce_start]
+    assert frame_a[nonce_start:scheme.LOG_FRAME.size] != frame_b[nonce_start:scheme.LOG_FRAME.size]
+    assert frame_a != frame_b
+    for frame in (frame_a, frame_b):
+        assert scheme.decrypt_log(key_data, log + frame)[0] == [(0, b"one"), (1, b"same")]
+
+def test_log_reordering_and_tampering(scheme, key_data):
+    writer = scheme.open_log("admin")
+    frames = [writer.append(record) for record in (b"aaaa", b"bbbb", b"cccc")]
+    reordered = writer.header + frames[1] + frames[0] + frames[2]
+    dropped = writer.header + frames[0] + frames[2]
+    tampered = writer.header + frames[0] + bytes(tamper(frames[1], len(frames[1]) - 20)) + frames[2]
+    for bad in (reordered, dropped, tampered):
+        with pytest.raises(ValueError):
+            scheme.decrypt_log(key_data, bad)
+    # Resuming checks the frame order but only authenticates the last record
+    tampered_last = writer.header + frames[0] + bytes(tamper(frames[1], len(frames[1]) - 20))
+    for bad in (reordered, dropped, tampered_last):
+        with pytest.raises(ValueError):
+            scheme.resume_log(key_data, bad)
+
+def test_parse_envelope_round_trip(scheme, key_data):
+    data = scheme.encrypt_data("admin and it", b"binary record", binary=True)
+    envelope = scheme.parse_envelope(data)
+    assert envelope["policy"] == "ADMIN AND IT"
+    assert scheme.decrypt_data(key_data, envelope) == b"binary record"
+
+def test_parse_envelope_truncation_and_tampering(scheme, key_data):
+    data = scheme.encrypt_data("admin and it", b"binary record", binary=True)
+    for size in (0, 2, 10, len(data) - len(b"binary record") - 20):
+        with pytest.raises(ValueError):
+            scheme.parse_envelope(data[:size])
+    with pytest.raises(ValueError):
+        scheme.parse_envelope(tamper(data, 0))
+    with pytest.raises(ValueError):
+        scheme.decrypt_data(key_data, scheme.parse_envelope(tamper(data, len(data) - 1)))
+    stream = b"".join(scheme.encrypt_stream("admin", [b"streamed"]))
+    with pytest.raises(ValueError):
+        scheme.parse_envelope(stream)
+
+def test_b64decode_buffer_accepts_what_b64decode_accepts(scheme):
+    wrapped = base64.encodebytes(PAYLOAD)
+    assert b"\n" in wrapped
+    assert scheme.b64decode_buffer(wrapped.decode("ascii")) == PAYLOAD
+    assert scheme.b64decode_buffer(" " + base64.b64encode(b"abcd").decode("ascii") + "\r\n") == b"abcd"
+    for text in ("abc", "a===", "QUJD\nR"):
+        with pytest.raises(ValueError):
+            scheme.b64decode_buffer(text)
+
+def test_json_envelope_with_wrapped_ciphertext(scheme, key_data):
+    envelope = scheme.encrypt_data("admin", PAYLOAD)
+    envelope["ciphertext"] = base64.encodebytes(base64.b64decode(envelope["ciphertext"])).decode("ascii")
+    assert scheme.decrypt_data(key_data, envelope) == PAYLOAD
+
+def test_encrypt_data_base64_buffer(scheme, key_data):
+    envelope = scheme.encrypt_data("admin", PAYLOAD, base64_buffer=True)
+    assert isinstance(envelope["ciphertext"], bytearray)
+    envelope["ciphertext"] = envelope["ciphertext"].decode("ascii")
+    assert scheme.decrypt_data(key_data, envelope) == PAYLOAD
@@ -0,0 +1,43 @@
+import os
+import shutil
+
+from cpabe_schemes import CPABEScheme
+
+def new_scheme(path):
+    return CPABEScheme(keys_dir=str(path), batch_workers=1, encryption_pool_size=0)
+
+def test_saved_keys_load_in_another_process(tmp_path):
+    writer = new_scheme(tmp_path)
+    assert writer.setup()
+    reader = new_scheme(tmp_path)
+    assert reader.load_keys()
+    assert CPABEScheme.KEY_STAMP_FIELD not in reader.public_key
+    assert CPABEScheme.KEY_STAMP_FIELD not in reader.master_key
+    key_data = reader.keygen(["admin"])
+    assert reader.decrypt_data(key_data, writer.encrypt_data("admin", b"record")) == b"record"
+    # Files are replaced through temporary files, none of which are left behind
+    assert sorted(os.listdir(tmp_path)) == ["attribute_hashes.json", "master_key.pem", "public_key.pem"]
+
+def test_key_files_from_different_setups_are_rejected(tmp_path):
+    first, second = tmp_path / "first", tmp_path / "second"
+    assert new_scheme(first).setup()
+    assert new_scheme(second).setup()
+    reader = new_scheme(first)
+    assert reader.load_keys()
+    public_key = reader.public_key
+
+    # A public key written by one setup next to the master key of another is never paired up
+    shutil.copy(second / "master_key.pem", first / "master_key.pem")
+    assert not reader.reload_keys_if_changed()
+    assert not reader.load_keys()
+    assert reader.public_key is public_key
+
+def test_reload_with_missing_files_keeps_current_keys(tmp_path):
+    reader = new_scheme(tmp_path)
+    assert reader.setup()
+    public_key = reader.public_key
+    os.remove(tmp_path / "public_key.pem")
+    assert not reader.load_keys()
+    assert reader.public_key is public_key
+    # No fresh setup ran behind the caller's back
+    assert not os.path.exists(tmp_path / "public_key.pem")
@@ -0,0 +1,39 @@
+import pytest
+
+def test_header_policies_do_not_grow_attribute_table(scheme, key_data):
+    sk_components = key_data["secret_key"]
+    before = len(scheme._attribute_ids)
+    for i in range(100):
+        assert not scheme.key_satisfies_policy(sk_components, {"policy": f"(attacker{i} and noise{i})"})
+    assert len(scheme._attribute_ids) == before
+
+def test_key_satisfies_header_policy(scheme, key_data):
+    sk_components = key_data["secret_key"]
+    envelope = scheme.encrypt_data("(admin and it) or hr", b"record")
+    assert scheme.key_satisfies_policy(sk_components, envelope)
+    # The outer policy field is only a hint; the header's own policy is checked when it is missing
+    assert scheme.key_satisfies_policy(sk_components, dict(envelope, policy=None))
+    assert not scheme.key_satisfies_policy(sk_components, scheme.encrypt_data("hr and it", b"record"))
+
+def test_mixed_operators_must_be_parenthesized(scheme):
+    for policy in ("admin or it and now", "admin and it or now", "(admin or it and now)"):
+        with pytest.raises(ValueError):
+            scheme.compile_policy(policy)
+    grouped = scheme.compile_policy("(admin or it) and now")
+    assert scheme.evaluate_compiled_policy(grouped, ["NOW", "IT"])
+    assert not scheme.evaluate_compiled_policy(grouped, ["ADMIN"])
+    assert scheme.parse_policy("admin or (it and now)")["type"] == "OR"
+
+def test_repeated_attribute_pre_check_agrees_with_decryption(scheme, key_data):
+    envelope = scheme.encrypt_data("admin and (admin or hr)", b"record")
+    compiled = scheme.compile_header_policy(envelope["policy"])
+    # Charm labels the repeated leaves, but the names checked are the ones keys hold
+    assert sorted(compiled.leaves) == ["ADMIN_0", "ADMIN_1", "HR"]
+    assert compiled.attribute_ids == {"ADMIN", "HR"}
+    assert scheme._expression_attributes(compiled.expression) == compiled.attribute_ids
+
+    assert scheme.key_satisfies_policy(key_data["secret_key"], envelope)
+    assert scheme.decrypt_data(key_data, envelope) == b"record"
+    hr_key = scheme.keygen(["hr"])
+    assert not scheme.key_satisfies_policy(hr_key["secret_key"], envelope)
+    assert scheme.decrypt_data(hr_key, envelope) is None
@@ -0,0 +1,62 @@
+import http.client
+import json
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+@pytest.fixture(scope="module")
+def serve(keys_dir):
+    # Importing serve imports the app, which loads the keys of CPABE_KEYS_DIR in this process
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setenv("CPABE_KEYS_DIR", keys_dir)
+        import serve
+    return serve
+
+def test_worker_serves_one_request_at_a_time(serve):
+    active, peak = 0, 0
+    lock = threading.Lock()
+
+    def counting_app(environ, start_response):
+        nonlocal active, peak
+        with lock:
+            active += 1
+            peak = max(peak, active)
+        try:
+            # Leave the other clients time to connect while this request is in flight
+            time.sleep(0.05)
+            return serve.app(environ, start_response)
+        finally:
+            with lock:
+                active -= 1
+
+    # The worker accepts from a non-blocking listening socket it inherits, as under PreforkServer
+    listener = socket.create_server(("127.0.0.1", 0))
+    listener.setblocking(False)
+    port = listener.getsockname()[1]
+    server = serve.WorkerServer("127.0.0.1", port, counting_app, listener.fileno())
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05})
+    thread.start()
+
+    def keygen(_):
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        connection.request("POST", "/keygen", json.dumps({"attributes": ["admin", "it"]}),
+                           {"Content-Type": "application/json"})
+        response = connection.getresponse()
+        body = json.loads(response.read())
+        connection.close()
+        return response.status, body["status"]
+
+    try:
+        with ThreadPoolExecutor(max_workers=6) as pool:
+            results = list(pool.map(keygen, range(6)))
+    finally:
+        server.stop()
+        thread.join(timeout=10)
+        server.server_close()
+        listener.close()
+
+    assert results == [(200, "success")] * 6
+    assert peak == 1